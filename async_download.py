@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+asyncio下载引擎 - 单个事件循环线程承载大量并发下载
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from threading import Thread
+
+try:
+    import aiohttp
+except ImportError:  # 未安装 aiohttp 时只能使用线程池引擎
+    aiohttp = None
+
+from download_manager import DownloadManager, DownloadTask, DEFAULT_HEADERS
+from download_scheduler import DownloadScheduler
+from file_writer import preallocate
+from hls_downloader import HlsDownloader, parse_playlist, slice_byterange
+from resumable import ResumeState, IncompleteTransfer, ResourceChanged, parse_content_range, backoff_delay
+from utils import is_hls_url
+
+logger = logging.getLogger(__name__)
+
+
+def is_available():
+    """是否可以使用asyncio引擎"""
+    return aiohttp is not None
+
+
+class AsyncScheduler(DownloadScheduler):
+    """在事件循环里运行任务的调度器
+
+    排队、优先级、暂停等逻辑沿用 DownloadScheduler，只是把“工作线程”换成
+    事件循环里的协程，max_workers 即同时运行的下载数。
+    """
+
+    def __init__(self, loop, max_workers=100):
+        self.loop = loop
+        super().__init__(max_workers)
+
+    def submit(self, task, priority=0):
+        """提交任务"""
+        super().submit(task, priority)
+        self._wakeup()
+        return task
+
+    def resume(self, task):
+        """恢复暂停的任务"""
+        resumed = super().resume(task)
+        self._wakeup()
+        return resumed
+
+    def reprioritize(self, task, priority):
+        """调整排队中任务的优先级"""
+        changed = super().reprioritize(task, priority)
+        self._wakeup()
+        return changed
+
+    def set_workers(self, count):
+        """调整同时运行的下载数"""
+        with self.cond:
+            self.max_workers = max(1, int(count))
+        self._wakeup()
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """关闭调度器"""
+        super().shutdown(wait=False, cancel_pending=cancel_pending)
+        if wait:
+            with self.cond:
+                while self.running or (self.queued and not cancel_pending):
+                    self.cond.wait()
+
+    def _wakeup(self):
+        """在事件循环中派发任务"""
+        self.loop.call_soon_threadsafe(self._dispatch)
+
+    def _dispatch(self):
+        """启动排队的任务直到达到并发上限（在事件循环线程中调用）"""
+        with self.cond:
+            while len(self.running) < self.max_workers:
+                task = self._next_task()
+                if not task:
+                    break
+                self.running.add(task)
+                self.loop.create_task(self._run(task))
+
+    async def _run(self, task):
+        """运行一个任务"""
+        try:
+            await task.start_async()
+        finally:
+            with self.cond:
+                self.running.discard(task)
+                self.cond.notify_all()
+            self._dispatch()
+
+
+class AsyncDownloadTask(DownloadTask):
+    """在事件循环中执行的下载任务，状态和 get_info() 与 DownloadTask 相同
+
+    写文件、续传记录、sha256、媒体索引和完成回调（写数据库）都是阻塞操作，
+    用 asyncio.to_thread 放到线程池中执行，不让一个任务卡住事件循环里的其他下载。
+    """
+
+    def __init__(self, *args, session=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = session
+
+    async def start_async(self):
+        """开始下载"""
+        self._on_start()
+        try:
+            state = None
+            for _ in range(2):
+                try:
+                    if is_hls_url(self.url):
+                        await self._download_hls_async()
+                    else:
+                        state = await self._download_async()
+                    break
+                except ResourceChanged as e:
+                    logger.warning(f"🔄 文件已变化，重新下载: {os.path.basename(self.save_path)} - {e}")
+                    await asyncio.to_thread(self._discard_part)
+                    self.hints = None
+            else:
+                raise IOError("服务器文件反复变化，放弃下载")
+            await asyncio.to_thread(self._finish_part, state)
+            self._on_finish()
+        except asyncio.CancelledError:
+            # 引擎关闭，续传记录已保存
+            self.cancelled = True
+            self._on_finish()
+            raise
+        except Exception as e:
+            self._on_error(e)
+        finally:
+            await asyncio.to_thread(self._run_callback)
+
+    async def _throttle_async(self, size):
+        """按限速等待（不阻塞事件循环）"""
+        if self.limiter and not self.cancelled:
+            delay = self.limiter.reserve(self, self.host, size)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def _with_retries_async(self, func, *args):
+        """出现可重试的错误时按指数退避重试"""
+        attempt = 0
+        while True:
+            try:
+                return await func(*args)
+            except Exception as e:
+                if self.cancelled or attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt, self.retry_delay)
+                attempt += 1
+                logger.warning(f"🔁 {delay:.1f}秒后重试({attempt}/{self.max_retries}): "
+                               f"{os.path.basename(self.save_path)} - {e}")
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _is_retryable(e):
+        """网络错误、5xx/429 和未下载完整可以重试"""
+        if isinstance(e, aiohttp.ClientResponseError):
+            return e.status >= 500 or e.status == 429
+        if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+            return True
+        return DownloadTask._is_retryable(e)
+
+    async def _download_async(self):
+        """普通HTTP下载：可以时分段并发，否则单连接；每次重试都从已确认的偏移继续"""
+        state, reused = await asyncio.to_thread(self._prepare_state)
+        if state is None:
+            state = await self._probe_async()
+            reused = await asyncio.to_thread(self._reuse_known, state)
+        if reused:
+            return state
+        if state.segments:
+            await self._download_segmented_async(state)
+        else:
+            await self._with_retries_async(self._transfer_async, state)
+        return state
+
+    def _prepare_state(self):
+        """读取续传记录，没有时按抓包信息新建并检查是否已下载过，返回 (续传记录, 是否复用)
+
+        没有抓包信息又可以分段时返回 (None, False)，由调用方先探测。
+        """
+        if os.path.exists(self.part_path):
+            state = ResumeState.load(self.state_path, self.url)
+            if state is not None:
+                return state, False
+        self._discard_part()
+        state = self._state_from_hints()
+        if state is None:
+            if self.segments > 1:
+                return None, False
+            state = ResumeState(self.state_path, self.url)
+        return state, self._reuse_known(state)
+
+    async def _probe_async(self):
+        """用 Range: bytes=0-0 探测大小、ETag 和Range支持，返回新的续传状态"""
+        state = ResumeState(self.state_path, self.url)
+        headers = self._headers()
+        headers['Range'] = 'bytes=0-0'
+        try:
+            async with self.session.get(self.url, headers=headers) as response:
+                self._apply_probe(state, response.status, response.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        return state
+
+    async def _download_segmented_async(self, state):
+        """分段并发下载：每段一个协程，写入文件各自的位置"""
+        segments = state.segments
+        self.total_size = state.total_size
+        self._reset_progress(sum(seg[2] for seg in segments))
+        # 分段乱序写入，完成后再整体计算sha256
+        self.hasher = None
+
+        if not os.path.exists(self.part_path):
+            await asyncio.to_thread(self._create_part, state)
+
+        errors = []
+        try:
+            await asyncio.gather(*[
+                self._fetch_segment_async(seg, state, errors)
+                for seg in segments if seg[0] + seg[2] <= seg[1]
+            ])
+        finally:
+            await asyncio.to_thread(self._save_segments, state)
+        if errors:
+            raise errors[0]
+
+    async def _fetch_segment_async(self, seg, state, errors):
+        """下载一个分段，失败时从该段已确认的位置重试"""
+        try:
+            await self._with_retries_async(self._transfer_segment_async, seg, state, errors)
+        except Exception as e:
+            errors.append(e)
+
+    async def _transfer_segment_async(self, seg, state, errors):
+        """传输一个分段并写入文件对应位置"""
+        start, end = seg[0] + seg[2], seg[1]
+        headers = self._headers()
+        headers['Range'] = f'bytes={start}-{end}'
+        validator = state.validator()
+        if validator:
+            headers['If-Range'] = validator
+
+        async with self.session.get(self.url, headers=headers) as response:
+            response.raise_for_status()
+            if response.status != 206:
+                raise ResourceChanged(f"服务器未返回分段内容: HTTP {response.status}")
+
+            last_save = time.time()
+            f = await asyncio.to_thread(self._open_segment, start)
+            with f:
+                async for chunk in response.content.iter_chunked(1024 * 1024):
+                    if self.cancelled or errors:
+                        break
+                    chunk = chunk[:seg[1] - seg[0] - seg[2] + 1]
+                    # 分段记录只在 flush 之后更新，保证都是已确认的数据
+                    await asyncio.to_thread(self._write_flushed, f, chunk)
+                    seg[2] += len(chunk)
+                    self._add_progress(len(chunk))
+                    await self._throttle_async(len(chunk))
+                    if seg[0] + seg[2] > seg[1]:
+                        break
+
+                    if time.time() - last_save >= 1:
+                        await asyncio.to_thread(self._save_segments, state)
+                        last_save = time.time()
+
+        if not self.cancelled and not errors and seg[0] + seg[2] <= seg[1]:
+            raise IncompleteTransfer(f"分段未下载完整: {seg[0]}-{seg[1]}")
+
+    def _open_segment(self, start):
+        """打开 .part 文件并定位到分段的写入位置"""
+        f = open(self.part_path, 'r+b')
+        f.seek(start)
+        return f
+
+    @staticmethod
+    def _write_flushed(f, data):
+        """写入并 flush"""
+        f.write(data)
+        f.flush()
+
+    def _open_part(self, offset, total=0):
+        """打开 .part 文件，截掉 offset 之后未确认的部分，知道大小时预分配"""
+        f = open(self.part_path, 'r+b' if offset > 0 else 'wb')
+        try:
+            f.truncate(offset)
+            if total:
+                preallocate(f, total)
+            f.seek(offset)
+        except BaseException:
+            f.close()
+            raise
+        return f
+
+    def _write_chunk(self, f, data):
+        """写入一块数据并按顺序更新sha256"""
+        f.write(data)
+        self._update_hash(data)
+
+    @staticmethod
+    def _flush_and_save(f, save, *args):
+        """数据写到文件后再保存续传记录"""
+        f.flush()
+        save(*args)
+
+    async def _transfer_async(self, state):
+        """单连接传输一次"""
+        self.hasher = None
+        offset = 0
+        if os.path.exists(self.part_path):
+            offset = min(state.offset, os.path.getsize(self.part_path))
+
+        headers = self._headers()
+        if offset > 0:
+            headers['Range'] = f'bytes={offset}-'
+            validator = state.validator()
+            if validator:
+                headers['If-Range'] = validator
+
+        async with self.session.get(self.url, headers=headers) as response:
+            if response.status == 416 and offset and offset == state.total_size:
+                return
+            response.raise_for_status()
+
+            if offset > 0 and response.status == 206:
+                content_range = parse_content_range(response.headers.get('Content-Range'))
+                if not content_range or content_range[0] != offset:
+                    raise ResourceChanged(f"Content-Range不匹配: {response.headers.get('Content-Range')}")
+                total = content_range[2]
+            else:
+                # 服务器忽略了Range或文件已变化，从头下载
+                offset = 0
+                state.update_validators(response.headers)
+                total = response.content_length or 0
+                # 没有单独的探测请求，拿到响应头后再按大小和ETag查一次
+                state.total_size = total
+                if await asyncio.to_thread(self._reuse_known, state):
+                    return
+
+            state.total_size = total
+            state.offset = offset
+            await asyncio.to_thread(state.save)
+
+            self.total_size = total
+            self._reset_progress(offset)
+            await asyncio.to_thread(self._start_hash, offset)
+            last_save = time.time()
+            f = await asyncio.to_thread(self._open_part, offset, total)
+            with f:
+                try:
+                    async for chunk in response.content.iter_chunked(1024 * 1024):
+                        if self.cancelled:
+                            break
+                        await asyncio.to_thread(self._write_chunk, f, chunk)
+                        offset += len(chunk)
+                        self._add_progress(len(chunk))
+                        await self._throttle_async(len(chunk))
+
+                        if time.time() - last_save >= 1:
+                            state.offset = offset
+                            await asyncio.to_thread(self._flush_and_save, f, state.save)
+                            last_save = time.time()
+                finally:
+                    state.offset = offset
+                    await asyncio.to_thread(self._flush_and_save, f, state.save)
+
+        if not self.cancelled and total and offset < total:
+            raise IncompleteTransfer(f"下载不完整: {offset}/{total}")
+
+    async def _download_hls_async(self):
+        """HLS下载：分片并发下载、按顺序写入"""
+        hls = HlsDownloader(self, concurrency=self.hls_concurrency)
+        media_url, playlist = await self._resolve_playlist(hls)
+        segments = hls.media_segments(playlist)
+
+        # 先取好密钥，避免 _decrypt 里发起同步请求
+        for segment in segments:
+            key = segment.get('key')
+            if key and key['uri'] not in hls.keys:
+                hls.keys[key['uri']] = await self._fetch(key['uri'])
+
+        next_index, offset = await asyncio.to_thread(hls._load_state, media_url)
+
+        total = len(segments)
+        self._reset_progress(offset)
+        await asyncio.to_thread(self._start_hash, offset)
+        self.progress = int(next_index / total * 100)
+
+        f = await asyncio.to_thread(self._open_part, offset)
+        with f:
+            if next_index == 0 and playlist['init_map']:
+                data = await self._fetch(playlist['init_map'])
+                await asyncio.to_thread(self._write_chunk, f, data)
+                offset += len(data)
+                self._add_progress(len(data))
+
+            pending = deque()
+            submit_index = next_index
+            try:
+                while next_index < total and not self.cancelled:
+                    while submit_index < total and len(pending) < hls.window:
+                        pending.append(asyncio.ensure_future(
+                            self._fetch_segment(hls, segments[submit_index])
+                        ))
+                        submit_index += 1
+
+                    data = await pending.popleft()
+                    if self.cancelled:
+                        break
+                    await asyncio.to_thread(self._write_chunk, f, data)
+                    offset += len(data)
+                    next_index += 1
+                    self.progress = int(next_index / total * 100)
+                    self._add_progress(len(data))
+
+                    await asyncio.to_thread(self._flush_and_save, f, hls._save_state,
+                                            media_url, next_index, offset)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        await asyncio.to_thread(hls._finish, next_index, total, offset)
+
+    async def _resolve_playlist(self, hls):
+        """下载播放列表，遇到主播放列表时选择一个码率"""
+        url = self.url
+        for _ in range(3):
+            async with self.session.get(url, headers=self._headers()) as response:
+                response.raise_for_status()
+                playlist = parse_playlist(await response.text(), str(response.url))
+            if playlist['type'] == 'media':
+                return url, playlist
+
+            variants = sorted(playlist['variants'], key=lambda v: v['bandwidth'])
+            url = variants[0 if hls.variant == 'worst' else -1]['uri']
+        raise IOError("播放列表嵌套过深")
+
+    async def _fetch(self, url, byterange=None):
+        """下载一个资源，网络错误时重试"""
+        return await self._with_retries_async(self._fetch_once, url, byterange)
+
+    async def _fetch_once(self, url, byterange=None):
+        """下载一个资源（不重试）"""
+        headers = self._headers()
+        if byterange:
+            headers['Range'] = f'bytes={byterange[0]}-{byterange[1]}'
+        async with self.session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            data = await response.read()
+            if byterange:
+                return slice_byterange(response.status, response.headers.get('Content-Range'),
+                                       data, byterange)
+            return data
+
+    async def _fetch_segment(self, hls, segment):
+        """下载并解密一个分片"""
+        data = await self._fetch(segment['uri'], segment.get('byterange'))
+        await self._throttle_async(len(data))
+        if segment.get('key'):
+            data = await asyncio.to_thread(hls._decrypt, data, segment['key'], segment['sequence'])
+        return data
+
+
+class AsyncDownloadManager(DownloadManager):
+    """asyncio下载引擎
+
+    所有下载运行在一个事件循环线程里，适合大量小文件（封面、HLS分片）并发。
+    对外接口与 DownloadManager 相同；max_workers 表示同时运行的下载数。
+    """
+
+    def __init__(self, max_workers=100, max_per_host=8, **kwargs):
+        if aiohttp is None:
+            raise RuntimeError("asyncio引擎需要安装 aiohttp")
+
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+
+        self.connection_stats = {
+            'requests': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'tls_handshakes_avoided': 0
+        }
+        self.session = asyncio.run_coroutine_threadsafe(
+            self._create_session(max_workers, max_per_host), self.loop
+        ).result()
+
+        super().__init__(max_workers=max_workers, max_per_host=max_per_host, **kwargs)
+
+    async def _create_session(self, limit, limit_per_host):
+        """创建共享的 aiohttp 会话"""
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_connection_create_end.append(self._on_connection_create)
+        trace.on_connection_reuseconn.append(self._on_connection_reuse)
+
+        connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers=DEFAULT_HEADERS,
+            timeout=aiohttp.ClientTimeout(sock_connect=30, sock_read=30),
+            trace_configs=[trace]
+        )
+
+    async def _on_request_start(self, session, context, params):
+        self.connection_stats['requests'] += 1
+        context.https = params.url.scheme == 'https'
+
+    async def _on_connection_create(self, session, context, params):
+        self.connection_stats['connections_opened'] += 1
+
+    async def _on_connection_reuse(self, session, context, params):
+        self.connection_stats['connections_reused'] += 1
+        if getattr(context, 'https', False):
+            self.connection_stats['tls_handshakes_avoided'] += 1
+
+    def _create_scheduler(self, max_workers):
+        """创建在事件循环中运行任务的调度器"""
+        return AsyncScheduler(self.loop, max_workers=max_workers)
+
+    def _create_task(self, video_id, url, save_path, callback=None, **kwargs):
+        """创建异步下载任务"""
+        return AsyncDownloadTask(video_id, url, save_path, callback, http=self.http,
+                                 limiter=self.limiter, session=self.session,
+                                 media_index=self.media_index, progress_bus=self.progress_bus,
+                                 max_retries=self.max_retries, retry_delay=self.retry_delay,
+                                 **kwargs)
+
+    def get_http_stats(self):
+        """获取连接复用统计"""
+        return dict(self.connection_stats)
+
+    def shutdown(self, wait=False):
+        """停止下载并关闭会话和事件循环（wait=False 时不等待关闭完成）"""
+        super().shutdown(wait=wait)
+        future = asyncio.run_coroutine_threadsafe(self._close(), self.loop)
+        # 关闭完成（结果已传回 future）后再停止事件循环
+        future.add_done_callback(lambda _: self.loop.call_soon_threadsafe(self.loop.stop))
+        if wait:
+            future.result()
+            self.loop_thread.join()
+
+    async def _close(self):
+        """取消还在运行的下载（续传记录会保存），关闭会话"""
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.session.close()
\ No newline at end of file
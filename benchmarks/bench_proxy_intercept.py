@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+TLS解密范围基准测试
+
+在本机启动一个HTTPS服务器（代表手机访问的其他网站），分别在
+  selective: 只解密视频域名（这个服务器的连接直接转发）
+  all:       解密全部连接
+两种模式下运行 ProxyServer，每个请求新建一个连接（握手成本和手机上打开新网站时一样），
+比较代理进程消耗的CPU时间和相对直连增加的延迟。代理在单独的子进程中运行，CPU时间互不影响。
+
+用法: python benchmarks/bench_proxy_intercept.py [--requests 300] [--body-kb 16]
+"""
+
+import argparse
+import datetime
+import http.server
+import ipaddress
+import json
+import os
+import socket
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ('selective', 'all')
+
+
+class DataHandler(http.server.BaseHTTPRequestHandler):
+    """返回 body 字节的数据"""
+
+    protocol_version = 'HTTP/1.1'
+    body = b''
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(self.body)
+
+
+def make_certificate(directory):
+    """生成 127.0.0.1 的自签名证书，返回 (证书路径, 私钥路径)"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, '127.0.0.1')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]),
+                       critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, 'cert.pem')
+    key_path = os.path.join(directory, 'key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+def serve_https(body, cert_path, key_path):
+    """在后台线程中启动HTTPS服务器，返回端口"""
+    DataHandler.body = body
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), DataHandler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def wait_port(port, timeout=15):
+    """等待端口开始监听"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def run_child(mode, port):
+    """子进程：运行代理，stdin 关闭后输出这段时间消耗的CPU时间"""
+    from proxy_server import ProxyServer
+
+    proxy = ProxyServer(port=port, selective=mode == 'selective')
+    proxy.start()
+    if not wait_port(port):
+        raise RuntimeError('代理没有启动')
+    cpu = time.process_time()
+    print('ready', flush=True)
+    sys.stdin.read()
+    cpu = time.process_time() - cpu
+    proxy.stop()
+    print(json.dumps({'cpu': cpu}), flush=True)
+
+
+def fetch_all(url, count, proxy_port=None):
+    """每个请求一个新连接，返回每个请求的耗时"""
+    import requests
+    import urllib3
+    urllib3.disable_warnings()
+
+    proxies = None
+    if proxy_port:
+        proxies = {'https': f'http://127.0.0.1:{proxy_port}'}
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        with requests.Session() as session:
+            response = session.get(url, proxies=proxies, verify=False, timeout=30)
+            response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TLS解密范围基准测试')
+    parser.add_argument('--requests', type=int, default=300, help='每种模式的请求数')
+    parser.add_argument('--body-kb', type=int, default=16, help='每个响应的大小(KB)')
+    parser.add_argument('--port', type=int, default=18732, help='代理端口')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.port)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert_path, key_path = make_certificate(tmp)
+        server_port = serve_https(os.urandom(args.body_kb * 1024), cert_path, key_path)
+        url = f'https://127.0.0.1:{server_port}/api'
+
+        direct = statistics.median(fetch_all(url, args.requests))
+        print(f"{args.requests} 个请求，每个 {args.body_kb}KB，每个请求新建连接")
+        print(f"直连延迟中位数 {direct * 1000:.2f}ms")
+        print(f"{'模式':<12}{'代理CPU毫秒/请求':>18}{'增加延迟(ms)':>16}{'p95(ms)':>10}")
+        for mode in MODES:
+            child = subprocess.Popen(
+                [sys.executable, __file__, '--child', mode, '--port', str(args.port)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+            )
+            try:
+                if child.stdout.readline().strip() != 'ready':
+                    raise RuntimeError(f'{mode} 模式的代理启动失败')
+                latencies = fetch_all(url, args.requests, args.port)
+                child.stdin.close()
+                result = json.loads(child.stdout.read().strip().splitlines()[-1])
+            finally:
+                child.wait(30)
+            added = statistics.median(latencies) - direct
+            p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+            print(f"{mode:<12}{result['cpu'] * 1000 / args.requests:>18.2f}"
+                  f"{added * 1000:>16.2f}{p95 * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
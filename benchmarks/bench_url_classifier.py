@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+URL分类基准测试
+
+生成一批接近真实代理流量的URL（大部分是其他网站、应用接口和微信的非视频请求，
+少量视频号视频），分别用原来的 is_video_url 写法和 UrlClassifier 分类，比较每秒分类的URL数。
+
+用法: python benchmarks/bench_url_classifier.py [--count 200000] [--hosts 500] [--video-ratio 0.02]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from url_classifier import UrlClassifier
+
+OTHER_DOMAINS = (
+    'google.com', 'gstatic.com', 'apple.com', 'icloud.com', 'baidu.com', 'bdstatic.com',
+    'taobao.com', 'alicdn.com', 'douyin.com', 'bytecdn.cn', 'amap.com', 'jd.com'
+)
+WEIXIN_HOSTS = ('mp.weixin.qq.com', 'res.wx.qq.com', 'mmbiz.qpic.cn', 'wx.qlogo.cn')
+VIDEO_HOSTS = ('finder.video.qq.com', 'findermp.video.qq.com', 'wxsnsdy.tc.qq.com')
+PATHS = ('/api/v1/report', '/static/js/app.js', '/img/banner.png', '/favicon.ico',
+         '/cgi-bin/mmwebwx-bin/synccheck', '/v2/feed?page=2&size=20')
+
+
+def is_video_url_legacy(url):
+    """原来的写法：每次调用都重建列表，正则不预编译，域名用子串匹配"""
+    weixin_domains = [
+        'channels.weixin.qq.com',
+        'finder.video.qq.com',
+        'findermp.video.qq.com',
+        'wxsnsdy.tc.qq.com',
+        'wxsnsdythumb.tc.qq.com',
+        'v.qq.com'
+    ]
+    video_patterns = [
+        r'\.mp4(\?.*)?$',
+        r'\.m4v(\?.*)?$',
+        r'\.m3u8(\?.*)?$',
+        r'/findersnsvideo/',
+        r'/findermp/',
+        r'video_id=',
+        r'media_id='
+    ]
+    try:
+        domain = urlparse(url).hostname
+        if any(d in domain for d in weixin_domains):
+            if any(re.search(p, url, re.IGNORECASE) for p in video_patterns):
+                if not any(x in url.lower() for x in ['thumb', 'cover', 'avatar']):
+                    return True
+    except:
+        pass
+    return False
+
+
+def make_corpus(count, hosts, video_ratio, seed=1):
+    """生成URL列表"""
+    rng = random.Random(seed)
+    other_hosts = [f'{rng.choice(("www", "api", "cdn", "img", "s"))}{i}.{rng.choice(OTHER_DOMAINS)}'
+                   for i in range(hosts)]
+    urls = []
+    for _ in range(count):
+        r = rng.random()
+        if r < video_ratio:
+            urls.append(f'https://{rng.choice(VIDEO_HOSTS)}/251/20302/findersnsvideo/'
+                        f'{rng.getrandbits(64):x}.mp4?token={rng.getrandbits(64):x}&idx=1')
+        elif r < video_ratio + 0.15:
+            urls.append(f'https://{rng.choice(WEIXIN_HOSTS)}{rng.choice(PATHS)}')
+        else:
+            urls.append(f'https://{rng.choice(other_hosts)}{rng.choice(PATHS)}')
+    return urls
+
+
+def measure(classify, urls):
+    """返回 (每秒分类数, 判为视频的数量)"""
+    start = time.perf_counter()
+    matched = sum(1 for url in urls if classify(url))
+    return len(urls) / (time.perf_counter() - start), matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='URL分类基准测试')
+    parser.add_argument('--count', type=int, default=200000, help='URL数量')
+    parser.add_argument('--hosts', type=int, default=500, help='其他网站的主机名数量')
+    parser.add_argument('--video-ratio', type=float, default=0.02, help='视频URL所占比例')
+    args = parser.parse_args()
+
+    urls = make_corpus(args.count, args.hosts, args.video_ratio)
+    classifier = UrlClassifier()
+
+    print(f"{args.count} 个URL，{args.hosts} 个其他主机名，视频占 {args.video_ratio:.0%}")
+    print(f"{'方式':<14}{'URL/秒':>14}{'视频数':>10}")
+    for name, classify in (('legacy', is_video_url_legacy), ('classifier', classifier.is_video_url)):
+        rate, matched = measure(classify, urls)
+        print(f"{name:<14}{rate:>14,.0f}{matched:>10}")
+    info = classifier.cache_info()
+    print(f"主机名缓存: 命中 {info.hits}，未命中 {info.misses}")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
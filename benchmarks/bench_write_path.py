@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载写入路径基准测试
+
+在本机启动一个HTTP服务器，分别用旧的 iter_content 循环和新的块写入路径下载同一份数据，
+比较每GB消耗的CPU时间和峰值内存(RSS)。每种方式在单独的子进程中运行，峰值RSS互不影响。
+
+用法: python benchmarks/bench_write_path.py [--size-mb 512] [--block-kb 1024] [--dir /dev/shm]
+--dir 指向内存文件系统时只比较网络读取和内存分配的开销，不受磁盘速度影响。
+"""
+
+import argparse
+import http.server
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只统计CPU时间
+    resource = None
+
+MODES = ('legacy', 'block', 'block+writer')
+BLOCK = os.urandom(4 * 1024 * 1024)
+
+
+class DataHandler(http.server.BaseHTTPRequestHandler):
+    """返回 size 字节的数据（重复发送同一块随机数据）"""
+
+    protocol_version = 'HTTP/1.1'
+    size = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(self.size))
+        self.send_header('Content-Type', 'video/mp4')
+        self.end_headers()
+        view = memoryview(BLOCK)
+        remaining = self.size
+        while remaining > 0:
+            n = min(remaining, len(view))
+            self.wfile.write(view[:n])
+            remaining -= n
+
+
+def serve(port, size):
+    """服务器进程"""
+    DataHandler.size = size
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), DataHandler)
+    server.serve_forever()
+
+
+def download_legacy(url, path):
+    """原来的写法：iter_content 每块分配新的bytes对象，追加写入，每块都更新进度
+
+    进度和速度和原来一样写到任务的属性上（这里是 info），返回 info。
+    """
+    import requests
+
+    response = requests.get(url, stream=True, timeout=30)
+    response.raise_for_status()
+    total = int(response.headers.get('Content-Length', 0))
+    downloaded = 0
+    last_time = time.time()
+    last_downloaded = 0
+    info = {'progress': 0, 'speed': 0}
+    with open(path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            if chunk:
+                f.write(chunk)
+                downloaded += len(chunk)
+                info['progress'] = int(downloaded / total * 100) if total else 0
+                current_time = time.time()
+                if current_time - last_time >= 1:
+                    info['speed'] = (downloaded - last_downloaded) / (current_time - last_time)
+                    last_time = current_time
+                    last_downloaded = downloaded
+    return info
+
+
+def download_block(url, path, block_size, writer_thread):
+    """新的写入路径：DownloadTask 单连接下载"""
+    from download_manager import DownloadTask
+
+    task = DownloadTask(0, url, path, write_block_size=block_size,
+                        writer_thread=writer_thread, max_retries=0)
+    task.start()
+    if task.status != 'completed':
+        raise RuntimeError(task.error)
+
+
+def run_child(mode, url, block_size, directory):
+    """在子进程中下载一次，输出CPU时间和峰值RSS"""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        path = os.path.join(tmp, 'video.mp4')
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if mode == 'legacy':
+            download_legacy(url, path)
+        else:
+            download_block(url, path, block_size, mode == 'block+writer')
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        size = os.path.getsize(path)
+
+    peak_rss = None
+    if resource:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为KB，macOS 为字节
+        peak_rss = peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+    print(json.dumps({'size': size, 'cpu': cpu, 'wall': wall, 'peak_rss': peak_rss}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='下载写入路径基准测试')
+    parser.add_argument('--size-mb', type=int, default=512, help='下载的数据大小(MB)')
+    parser.add_argument('--block-kb', type=int, default=1024, help='块写入路径的块大小(KB)')
+    parser.add_argument('--dir', help='下载文件存放的目录（默认系统临时目录）')
+    parser.add_argument('--port', type=int, default=18731)
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    block_size = args.block_kb * 1024
+    if args.child:
+        run_child(args.child, args.url, block_size, args.dir)
+        return
+
+    size = args.size_mb * 1024 * 1024
+    server = Process(target=serve, args=(args.port, size), daemon=True)
+    server.start()
+    time.sleep(0.5)
+    url = f'http://127.0.0.1:{args.port}/video.mp4'
+
+    print(f"下载 {args.size_mb}MB，块大小 {args.block_kb}KB")
+    print(f"{'方式':<14}{'CPU秒/GB':>12}{'MB/s':>10}{'峰值RSS(MB)':>14}")
+    try:
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', mode, '--url', url,
+                 '--block-kb', str(args.block_kb)] + (['--dir', args.dir] if args.dir else []),
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            gb = result['size'] / 1024 ** 3
+            rss = f"{result['peak_rss'] / 1024 ** 2:.1f}" if result['peak_rss'] else '-'
+            print(f"{mode:<14}{result['cpu'] / gb:>12.2f}"
+                  f"{result['size'] / 1024 ** 2 / result['wall']:>10.0f}{rss:>14}")
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
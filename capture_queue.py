@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+捕获队列模块 - 代理线程只入队，由消费线程写数据库
+"""
+
+import time
+import logging
+from collections import deque
+from threading import Condition, Thread
+from metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = 'drop_oldest'   # 队列满时丢弃最早的捕获（新捕获的签名更新，更有价值）
+DROP_NEWEST = 'drop_newest'   # 队列满时丢弃新来的捕获
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST)
+
+QUEUE_DEPTH = gauge('capture_queue_depth', '捕获队列中等待处理的数量')
+ENQUEUED = counter('capture_queue_enqueued_total', '进入捕获队列的数量')
+DROPPED = counter('capture_queue_dropped_total', '捕获队列满时丢弃的数量')
+HANDLER_ERRORS = counter('capture_handler_errors_total', '处理捕获出错的次数')
+HANDLER_SECONDS = histogram('capture_handler_seconds', '处理一个捕获的耗时（秒）')
+
+
+class CaptureQueue:
+    """有界捕获队列
+
+    put() 在 mitmproxy 的事件循环里调用，只做一次加锁入队，从不等待；
+    消费线程成批取出后调用 handler(url, headers, meta)（例如写数据库），
+    存储再慢也只会让队列变长，队列满时按 overflow 策略丢弃并计数。
+    """
+
+    def __init__(self, handler, maxsize=1000, overflow=DROP_OLDEST):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow}")
+        self.handler = handler
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.items = deque()
+        self.cond = Condition()
+        self.running = False
+        self.thread = None
+
+        # 统计
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        QUEUE_DEPTH.set_function(self.depth)
+
+    def start(self):
+        """启动消费线程"""
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = Thread(target=self._consume, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """处理完队列中剩余的捕获后停止"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def put(self, url, headers=None, meta=None, handler=None):
+        """放入一个捕获（meta 为响应信息），返回是否入队（不会阻塞）
+
+        handler 不为None时用它代替默认的 handler 处理这一项，与其他捕获按入队顺序处理。
+        """
+        with self.cond:
+            if len(self.items) >= self.maxsize:
+                self.dropped += 1
+                DROPPED.inc()
+                if self.overflow == DROP_NEWEST:
+                    return False
+                self.items.popleft()
+            self.items.append((url, headers, meta, handler))
+            self.enqueued += 1
+            ENQUEUED.inc()
+            depth = len(self.items)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self.cond.notify()
+        return True
+
+    def depth(self):
+        """当前队列长度"""
+        return len(self.items)
+
+    def get_stats(self):
+        """获取统计信息"""
+        with self.cond:
+            return {
+                'depth': len(self.items),
+                'max_depth': self.max_depth,
+                'enqueued': self.enqueued,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors
+            }
+
+    def _consume(self):
+        """消费线程：一次取出全部待处理的捕获"""
+        while True:
+            with self.cond:
+                while self.running and not self.items:
+                    self.cond.wait()
+                if not self.items:
+                    return
+                batch = list(self.items)
+                self.items.clear()
+
+            for url, headers, meta, handler in batch:
+                start = time.perf_counter()
+                try:
+                    (handler or self.handler)(url, headers, meta)
+                except Exception as e:
+                    self.errors += 1
+                    HANDLER_ERRORS.inc()
+                    logger.error(f"❌ 处理捕获失败: {e}")
+                HANDLER_SECONDS.observe(time.perf_counter() - start)
+                self.processed += 1
\ No newline at end of file
@@ -1,170 +1,792 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-下载管理器模块
-"""
-
-import os
-import time
-import requests
-from threading import Thread
-from concurrent.futures import ThreadPoolExecutor
-from utils import format_size, format_speed
-
-
-class DownloadManager:
-    def __init__(self, max_workers=3):
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        self.tasks = {}  # {video_id: DownloadTask}
-        self.download_dir = 'downloads'
-        self.video_dir = os.path.join(self.download_dir, 'videos')
-        self.cover_dir = os.path.join(self.download_dir, 'covers')
-        
-        # 创建目录
-        os.makedirs(self.video_dir, exist_ok=True)
-        os.makedirs(self.cover_dir, exist_ok=True)
-    
-    def download_video(self, video_id, url, filename, callback=None):
-        """下载视频"""
-        save_path = os.path.join(self.video_dir, filename)
-        task = DownloadTask(video_id, url, save_path, callback)
-        self.tasks[video_id] = task
-        self.executor.submit(task.start)
-        return task
-    
-    def download_cover(self, video_id, url, filename, callback=None):
-        """下载封面"""
-        save_path = os.path.join(self.cover_dir, filename)
-        task = DownloadTask(video_id, url, save_path, callback)
-        self.executor.submit(task.start)
-        return task
-    
-    def get_task(self, video_id):
-        """获取下载任务"""
-        return self.tasks.get(video_id)
-    
-    def cancel_task(self, video_id):
-        """取消下载任务"""
-        task = self.tasks.get(video_id)
-        if task:
-            task.cancel()
-
-
-class DownloadTask:
-    def __init__(self, video_id, url, save_path, callback=None):
-        self.video_id = video_id
-        self.url = url
-        self.save_path = save_path
-        self.callback = callback
-        
-        self.status = 'pending'  # pending, downloading, completed, failed, cancelled
-        self.progress = 0
-        self.total_size = 0
-        self.downloaded_size = 0
-        self.speed = 0
-        self.error = None
-        self.cancelled = False
-        
-        self.start_time = None
-        self.end_time = None
-    
-    def start(self):
-        """开始下载"""
-        self.status = 'downloading'
-        self.start_time = time.time()
-        
-        try:
-            self._download()
-            
-            if not self.cancelled:
-                self.status = 'completed'
-                self.progress = 100
-                self.end_time = time.time()
-                print(f"✅ 下载完成: {os.path.basename(self.save_path)}")
-            else:
-                self.status = 'cancelled'
-                print(f"⏹️ 下载取消: {os.path.basename(self.save_path)}")
-            
-        except Exception as e:
-            self.status = 'failed'
-            self.error = str(e)
-            print(f"❌ 下载失败: {os.path.basename(self.save_path)} - {e}")
-        
-        finally:
-            if self.callback:
-                try:
-                    self.callback(self)
-                except:
-                    pass
-    
-    def _download(self):
-        """执行下载"""
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': '*/*',
-            'Connection': 'keep-alive'
-        }
-        
-        # 支持断点续传
-        downloaded = 0
-        if os.path.exists(self.save_path):
-            downloaded = os.path.getsize(self.save_path)
-            headers['Range'] = f'bytes={downloaded}-'
-        
-        response = requests.get(self.url, headers=headers, stream=True, timeout=30)
-        response.raise_for_status()
-        
-        # 获取总大小
-        if 'Content-Length' in response.headers:
-            self.total_size = int(response.headers['Content-Length'])
-            if downloaded > 0:
-                self.total_size += downloaded
-        
-        # 下载文件
-        mode = 'ab' if downloaded > 0 else 'wb'
-        chunk_size = 1024 * 1024  # 1MB
-        
-        last_time = time.time()
-        last_downloaded = downloaded
-        
-        with open(self.save_path, mode) as f:
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                if self.cancelled:
-                    break
-                
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    self.downloaded_size = downloaded
-                    
-                    # 更新进度
-                    if self.total_size > 0:
-                        self.progress = int(downloaded / self.total_size * 100)
-                    
-                    # 计算速度
-                    current_time = time.time()
-                    if current_time - last_time >= 1:
-                        time_diff = current_time - last_time
-                        size_diff = downloaded - last_downloaded
-                        self.speed = size_diff / time_diff
-                        last_time = current_time
-                        last_downloaded = downloaded
-    
-    def cancel(self):
-        """取消下载"""
-        self.cancelled = True
-    
-    def get_info(self):
-        """获取下载信息"""
-        return {
-            'video_id': self.video_id,
-            'status': self.status,
-            'progress': self.progress,
-            'total_size': self.total_size,
-            'downloaded_size': self.downloaded_size,
-            'speed': self.speed,
-            'speed_text': format_speed(self.speed),
-            'size_text': format_size(self.total_size),
-            'error': self.error
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载管理器模块
+"""
+
+import os
+import time
+import hashlib
+import http.client
+import logging
+import requests
+from threading import Thread, Lock, Event
+from urllib.parse import urlparse
+from download_scheduler import DownloadScheduler, PRIORITY_MANUAL, PRIORITY_COVER
+from http_pool import HostSessionPool
+from file_writer import BlockWriter, preallocate, open_reader, release_reader, fill
+from hls_downloader import HlsDownloader
+from media_index import MediaIndex, hash_file, link_file
+from metrics import counter, gauge, histogram
+from progress_events import ProgressBus, SpeedMeter
+from rate_limiter import BandwidthLimiter, TokenBucket
+from resumable import ResumeState, IncompleteTransfer, ResourceChanged, parse_content_range, backoff_delay
+from utils import format_size, format_speed, format_time, is_hls_url, canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_BYTES = counter('download_bytes_total', '下载的字节数')
+DOWNLOADS_ACTIVE = gauge('downloads_active', '正在下载的任务数')
+DOWNLOADS_FINISHED = counter('downloads_finished_total', '结束的下载任务数', ['status'])
+DOWNLOAD_SECONDS = histogram('download_duration_seconds', '下载完成的任务耗时（秒）',
+                             buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': '*/*',
+    'Connection': 'keep-alive'
+}
+
+
+class DownloadManager:
+    def __init__(self, max_workers=3, segments=4, segment_min_size=8 * 1024 * 1024,
+                 pool_connections=4, max_per_host=8, hls_concurrency=4,
+                 global_rate=0, host_rate=0, task_rate=0, max_retries=5, retry_delay=1.0,
+                 write_block_size=1024 * 1024, writer_thread=False, progress_rate=10,
+                 download_dir='downloads'):
+        self.scheduler = self._create_scheduler(max_workers)
+        self.tasks = {}  # {video_id: DownloadTask}
+        self.http = HostSessionPool(pool_connections=pool_connections,
+                                    max_per_host=max_per_host,
+                                    headers=DEFAULT_HEADERS)
+        self.segments = segments                    # 分段并发数，1表示单连接
+        self.segment_min_size = segment_min_size    # 小于该大小不分段
+        self.hls_concurrency = hls_concurrency      # HLS同时下载的分片数
+        self.max_retries = max_retries              # 网络错误自动重试次数
+        self.retry_delay = retry_delay              # 首次重试等待秒数
+        self.write_block_size = write_block_size    # 每次写盘的块大小（按64KB对齐）
+        self.writer_thread = writer_thread          # 单连接下载使用独立的写入线程
+        self.limiter = BandwidthLimiter(global_rate, host_rate, task_rate)
+        self.progress_bus = ProgressBus(progress_rate)  # 每个任务每秒最多 progress_rate 个进度事件
+        self.download_dir = download_dir
+        self.video_dir = os.path.join(self.download_dir, 'videos')
+        self.cover_dir = os.path.join(self.download_dir, 'covers')
+
+        # 创建目录
+        os.makedirs(self.video_dir, exist_ok=True)
+        os.makedirs(self.cover_dir, exist_ok=True)
+
+        # 按内容去重，同一个视频换了签名URL也不会重复下载
+        self.media_index = MediaIndex(os.path.join(self.download_dir, 'media_index.json'))
+
+        gauge('download_speed_bytes', '所有下载任务的当前速度（字节/秒）').set_function(self.get_total_speed)
+
+    def download_video(self, video_id, url, filename, callback=None, headers=None,
+                       priority=PRIORITY_MANUAL, hints=None):
+        """下载视频
+
+        headers 为抓包时记录的 Referer/User-Agent，
+        hints 为抓包时记录的响应信息（total_size、etag、last_modified、accept_ranges）。
+        """
+        # 已在排队的任务只调整优先级，不重复下载
+        task = self.tasks.get(video_id)
+        if task and task.status in ('pending', 'paused'):
+            current = self.scheduler.priority_of(task)
+            if current is not None and priority < current:
+                self.scheduler.reprioritize(task, priority)
+            return task
+        if task and task.status == 'downloading':
+            return task
+
+        if is_hls_url(url):
+            # HLS分片合并成一个TS文件
+            filename = os.path.splitext(filename)[0] + '.ts'
+        save_path = os.path.join(self.video_dir, filename)
+        task = self._create_task(video_id, url, save_path, callback, headers=headers,
+                                 segments=self.segments, segment_min_size=self.segment_min_size,
+                                 hls_concurrency=self.hls_concurrency, hints=hints)
+        self.tasks[video_id] = task
+        self.scheduler.submit(task, priority)
+        return task
+
+    def download_cover(self, video_id, url, filename, callback=None, headers=None):
+        """下载封面"""
+        save_path = os.path.join(self.cover_dir, filename)
+        task = self._create_task(video_id, url, save_path, callback, headers=headers)
+        self.scheduler.submit(task, PRIORITY_COVER)
+        return task
+
+    def _create_scheduler(self, max_workers):
+        """创建调度器（线程池引擎）"""
+        return DownloadScheduler(max_workers=max_workers)
+
+    def _create_task(self, video_id, url, save_path, callback=None, **kwargs):
+        """创建下载任务"""
+        return DownloadTask(video_id, url, save_path, callback, http=self.http,
+                            limiter=self.limiter, media_index=self.media_index,
+                            max_retries=self.max_retries, retry_delay=self.retry_delay,
+                            write_block_size=self.write_block_size,
+                            writer_thread=self.writer_thread,
+                            progress_bus=self.progress_bus, **kwargs)
+
+    def get_task(self, video_id):
+        """获取下载任务"""
+        return self.tasks.get(video_id)
+
+    def subscribe_progress(self, callback):
+        """订阅下载进度事件，callback(event) 在下载线程中调用"""
+        return self.progress_bus.subscribe(callback)
+
+    def unsubscribe_progress(self, callback):
+        """取消订阅下载进度事件"""
+        self.progress_bus.unsubscribe(callback)
+
+    def cancel_task(self, video_id):
+        """取消下载任务（排队中和下载中的都可以取消）"""
+        task = self.tasks.get(video_id)
+        if task:
+            self.scheduler.cancel(task)
+
+    def pause_task(self, video_id):
+        """暂停排队中的任务"""
+        task = self.tasks.get(video_id)
+        return bool(task) and self.scheduler.pause(task)
+
+    def resume_task(self, video_id):
+        """恢复暂停的任务"""
+        task = self.tasks.get(video_id)
+        return bool(task) and self.scheduler.resume(task)
+
+    def reprioritize_task(self, video_id, priority):
+        """调整排队中任务的优先级"""
+        task = self.tasks.get(video_id)
+        return bool(task) and self.scheduler.reprioritize(task, priority)
+
+    def set_max_workers(self, count):
+        """运行时调整同时下载数"""
+        self.scheduler.set_workers(count)
+
+    def get_total_speed(self):
+        """所有正在下载的任务的速度之和"""
+        return sum(task.speed for task in list(self.tasks.values()) if task.status == 'downloading')
+
+    def get_scheduler_stats(self):
+        """获取调度统计"""
+        return self.scheduler.get_stats()
+
+    def shutdown(self, wait=False):
+        """停止下载：取消排队中和正在下载的任务（续传记录会保存），wait=True 时等待任务结束"""
+        with self.scheduler.cond:
+            running = list(self.scheduler.running)
+        for task in running:
+            task.cancel()
+        self.scheduler.shutdown(wait=wait, cancel_pending=True)
+
+    def set_global_rate(self, rate):
+        """设置全局限速（字节/秒，0为不限速）"""
+        self.limiter.set_global_rate(rate)
+
+    def set_host_rate(self, rate, host=None):
+        """设置主机限速，host为None时设置所有主机的默认值"""
+        self.limiter.set_host_rate(rate, host)
+
+    def set_task_rate(self, video_id, rate):
+        """设置单个任务的限速"""
+        task = self.tasks.get(video_id)
+        if task:
+            self.limiter.set_task_rate(task, rate)
+
+    def set_proxy_headroom(self, link_rate, reserve_rate):
+        """代理优先模式：代理有流量时为其预留 reserve_rate 带宽"""
+        self.limiter.set_proxy_headroom(link_rate, reserve_rate)
+
+    def get_http_stats(self):
+        """获取连接池统计"""
+        return self.http.get_stats()
+
+
+def create_download_manager(engine='thread', max_downloads=None, **kwargs):
+    """按引擎创建下载管理器（engine 为 thread 或 async）"""
+    if engine == 'async':
+        from async_download import AsyncDownloadManager, is_available
+        if is_available():
+            return AsyncDownloadManager(max_workers=max_downloads or 100, **kwargs)
+        logger.warning("⚠️ 未安装 aiohttp，改用线程池下载引擎")
+    return DownloadManager(max_workers=max_downloads or 3, **kwargs)
+
+
+class DownloadTask:
+    def __init__(self, video_id, url, save_path, callback=None, headers=None, http=None,
+                 segments=1, segment_min_size=8 * 1024 * 1024, hls_concurrency=4, limiter=None,
+                 media_index=None, max_retries=5, retry_delay=1.0,
+                 write_block_size=1024 * 1024, writer_thread=False, progress_bus=None, hints=None):
+        self.video_id = video_id
+        self.url = url
+        self.save_path = save_path
+        self.callback = callback
+        self.headers = {k: v for k, v in (headers or {}).items() if v}
+        self.http = http or HostSessionPool(headers=DEFAULT_HEADERS)
+        self.segments = segments
+        self.segment_min_size = segment_min_size
+        self.hls_concurrency = hls_concurrency
+        self.part_path = save_path + '.part'            # 下载中的数据
+        self.state_path = save_path + '.part.json'      # 续传记录
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay                  # 首次重试等待秒数，之后指数增长
+        self.write_block_size = write_block_size
+        self.writer_thread = writer_thread
+        self.host = urlparse(url).hostname or ''
+        self.limiter = limiter
+        self.rate_bucket = limiter.new_task_bucket() if limiter else TokenBucket()
+        self.media_index = media_index
+        self.canonical_url = canonicalize_url(url)
+        self.hints = hints          # 抓包时记录的响应信息，文件变化后作废
+        self.sha256 = None
+        self.hasher = None          # 顺序写入时边下载边计算sha256
+        self.duplicate_of = None    # 复用的已下载文件
+
+        self._status = 'pending'  # pending, paused, downloading, completed, failed, cancelled
+        self.progress = 0
+        self.total_size = 0
+        self.downloaded_size = 0
+        self.speed = 0
+        self.eta = None             # 预计剩余秒数
+        self.error = None
+        self.cancelled = False
+        self.cancel_event = Event()     # 用于打断限速等待
+
+        self.start_time = None
+        self.end_time = None
+
+        self.lock = Lock()
+        self.state_lock = Lock()    # 各分段线程共用一个续传记录文件
+        self.meter = SpeedMeter()
+        self.progress_bus = progress_bus
+        self.last_publish = 0
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        """状态变化时发布事件（调度器也会直接修改状态）"""
+        previous = self._status
+        self._status = value
+        if value != previous:
+            if value == 'downloading':
+                DOWNLOADS_ACTIVE.inc()
+            elif previous == 'downloading':
+                DOWNLOADS_ACTIVE.dec()
+            if value in ('completed', 'failed', 'cancelled'):
+                DOWNLOADS_FINISHED.labels(value).inc()
+                if value == 'completed' and self.start_time:
+                    DOWNLOAD_SECONDS.observe(time.time() - self.start_time)
+            self._publish(force=True)
+
+    def start(self):
+        """开始下载"""
+        self._on_start()
+        try:
+            self._download()
+            self._on_finish()
+        except Exception as e:
+            self._on_error(e)
+        finally:
+            self._run_callback()
+
+    def _on_start(self):
+        """标记开始"""
+        self.status = 'downloading'
+        self.start_time = time.time()
+
+    def _on_finish(self):
+        """下载结束（完成或取消）"""
+        if not self.cancelled:
+            self.progress = 100
+            self.end_time = time.time()
+            self.status = 'completed'
+            logger.info(f"✅ 下载完成: {os.path.basename(self.save_path)}")
+        else:
+            self.status = 'cancelled'
+            logger.info(f"⏹️ 下载取消: {os.path.basename(self.save_path)}")
+
+    def _on_error(self, e):
+        """下载失败"""
+        self.error = str(e)
+        self.status = 'failed'
+        logger.error(f"❌ 下载失败: {os.path.basename(self.save_path)} - {e}")
+
+    def _run_callback(self):
+        """通知回调"""
+        if self.callback:
+            try:
+                self.callback(self)
+            except:
+                pass
+
+    def _headers(self):
+        """请求头（抓包记录的请求头优先）"""
+        return dict(self.headers)
+
+    def _download(self):
+        """执行下载：先写入 .part 文件，完成后原子重命名"""
+        state = None
+        for _ in range(2):
+            try:
+                if is_hls_url(self.url):
+                    # 下载前不知道合并后的大小，不能按URL复用；完成后按内容去重
+                    HlsDownloader(self, concurrency=self.hls_concurrency).run()
+                else:
+                    state = self._download_http()
+                break
+            except ResourceChanged as e:
+                # 服务器文件已变化，丢弃已下载部分从头开始
+                logger.warning(f"🔄 文件已变化，重新下载: {os.path.basename(self.save_path)} - {e}")
+                self._discard_part()
+                self.hints = None
+        else:
+            raise IOError("服务器文件反复变化，放弃下载")
+        self._finish_part(state)
+
+    def _finish_part(self, state=None):
+        """下载完整后把 .part 文件原子地改名为目标文件，并登记到媒体索引"""
+        if self.cancelled:
+            return
+        if self.save_path != self.duplicate_of:
+            # 直接引用已有文件时没有 .part 文件
+            os.replace(self.part_path, self.save_path)
+        ResumeState(self.state_path, self.url).remove()
+        self._register_media(state)
+
+    def _download_http(self):
+        """普通HTTP下载：有续传记录时继续，已下载过时复用，可以时分段
+
+        只有分段下载需要先探测大小；单连接下载从第一个响应的头部取得大小和ETag。
+        """
+        state = None
+        if os.path.exists(self.part_path):
+            state = ResumeState.load(self.state_path, self.url)
+        if state is None:
+            self._discard_part()
+            state = self._state_from_hints()
+            if state is None:
+                state = self._probe() if self.segments > 1 else ResumeState(self.state_path, self.url)
+            if self._reuse_known(state):
+                return state
+
+        if state.segments:
+            self._download_segmented(state)
+        else:
+            self._download_single(state)
+        return state
+
+    def _reuse_known(self, state):
+        """内容已经下载过时复用已有文件（硬链接，不支持时直接引用），返回是否复用"""
+        if not self.media_index:
+            return False
+        found = self.media_index.find(self.canonical_url, state.total_size, state.etag)
+        if not found:
+            return False
+
+        self.sha256, path = found
+        self.duplicate_of = path
+        if os.path.abspath(path) != os.path.abspath(self.save_path) and link_file(path, self.part_path):
+            mode = '硬链接'
+        else:
+            self.save_path = path
+            mode = '引用'
+        self.total_size = os.path.getsize(path)
+        self._reset_progress(self.total_size)
+        logger.info(f"♻️ 已下载过相同内容，{mode}: {os.path.basename(path)}")
+        return True
+
+    def _register_media(self, state=None):
+        """登记到媒体索引，内容与另一个已下载的文件相同时改为硬链接节省空间"""
+        if not self.media_index:
+            return
+        if not self.sha256:
+            self.sha256 = self.hasher.hexdigest() if self.hasher else hash_file(self.save_path)
+        existing = self.media_index.register(
+            self.sha256, self.save_path, os.path.getsize(self.save_path),
+            state.etag if state else None, self.canonical_url
+        )
+        if existing and not os.path.samefile(existing, self.save_path) \
+                and link_file(existing, self.save_path):
+            self.duplicate_of = existing
+            logger.info(f"♻️ 与已下载的文件内容相同，改为硬链接: {os.path.basename(existing)}")
+
+    def _start_hash(self, offset):
+        """开始边下载边计算sha256，续传时先读入已下载的部分"""
+        self.hasher = None
+        if not self.media_index:
+            return
+        hasher = hashlib.sha256()
+        if offset:
+            with open(self.part_path, 'rb') as f:
+                remaining = offset
+                while remaining:
+                    chunk = f.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    remaining -= len(chunk)
+        self.hasher = hasher
+
+    def _update_hash(self, data):
+        """按写入顺序更新sha256"""
+        if self.hasher:
+            self.hasher.update(data)
+
+    def _discard_part(self):
+        """删除 .part 文件和续传记录"""
+        for path in (self.part_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _with_retries(self, func, *args):
+        """出现可重试的错误时按指数退避重试"""
+        attempt = 0
+        while True:
+            try:
+                return func(*args)
+            except Exception as e:
+                if self.cancelled or attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt, self.retry_delay)
+                attempt += 1
+                logger.warning(f"🔁 {delay:.1f}秒后重试({attempt}/{self.max_retries}): "
+                               f"{os.path.basename(self.save_path)} - {e}")
+                self.cancel_event.wait(delay)
+
+    @staticmethod
+    def _is_retryable(e):
+        """网络错误、5xx/429 和未下载完整可以重试"""
+        if isinstance(e, requests.HTTPError):
+            status = e.response.status_code if e.response is not None else 0
+            return status >= 500 or status == 429
+        return isinstance(e, (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            # 直接从 http.client 读取响应体时的错误
+            http.client.HTTPException,
+            ConnectionError,
+            TimeoutError,
+            IncompleteTransfer
+        ))
+
+    def _download_single(self, state):
+        """单连接下载，每次重试都从已确认的偏移继续"""
+        self._with_retries(self._transfer_single, state)
+
+    def _transfer_single(self, state):
+        """单连接传输一次"""
+        self.hasher = None
+        offset = 0
+        if os.path.exists(self.part_path):
+            offset = min(state.offset, os.path.getsize(self.part_path))
+
+        headers = self._headers()
+        if offset > 0:
+            headers['Range'] = f'bytes={offset}-'
+            validator = state.validator()
+            if validator:
+                headers['If-Range'] = validator
+
+        response = self.http.get(self.url, headers=headers, stream=True, timeout=30)
+        with response:
+            if response.status_code == 416 and offset and offset == state.total_size:
+                # 上次已经下载完整
+                return
+            response.raise_for_status()
+
+            if offset > 0 and response.status_code == 206:
+                content_range = parse_content_range(response.headers.get('Content-Range'))
+                if not content_range or content_range[0] != offset:
+                    raise ResourceChanged(f"Content-Range不匹配: {response.headers.get('Content-Range')}")
+                total = content_range[2]
+            else:
+                # 200: 服务器不支持Range或文件已变化，从头开始
+                offset = 0
+                state.update_validators(response.headers)
+                total = int(response.headers.get('Content-Length', 0) or 0)
+                # 没有单独的探测请求，拿到响应头后再按大小和ETag查一次
+                state.total_size = total
+                if self._reuse_known(state):
+                    return
+
+            state.total_size = total
+            state.offset = offset
+            state.segments = None
+            state.save()
+
+            self.total_size = total
+            self._reset_progress(offset)
+            self._start_hash(offset)
+
+            readinto = open_reader(response)
+            last_save = time.time()
+            with open(self.part_path, 'r+b' if offset > 0 else 'wb') as f:
+                f.truncate(offset)
+                preallocate(f, total)
+                f.seek(offset)
+                writer = BlockWriter(f, self.write_block_size, threaded=self.writer_thread)
+                try:
+                    # 第一块补齐到块边界，之后每次写入都按块对齐
+                    want = writer.block_size - offset % writer.block_size
+                    while not self.cancelled:
+                        buffer = writer.acquire()
+                        view = memoryview(buffer)
+                        n = fill(readinto, view[:want])
+                        if not n:
+                            writer.release(buffer)
+                            release_reader(response)
+                            break
+
+                        self._update_hash(view[:n])
+                        writer.write(buffer, n)
+                        offset += n
+                        self._add_progress(n)
+                        self._throttle(n)
+                        if n < want:
+                            release_reader(response)
+                            break
+                        want = writer.block_size
+
+                        # 定期确认已写入的偏移
+                        if time.time() - last_save >= 1:
+                            writer.flush()
+                            state.offset = offset
+                            state.save()
+                            last_save = time.time()
+                finally:
+                    # 写入失败时不更新续传记录，保留上次确认的偏移
+                    writer.close()
+                    state.offset = offset
+                    state.save()
+
+        if not self.cancelled and total and offset < total:
+            raise IncompleteTransfer(f"下载不完整: {offset}/{total}")
+
+    def _state_from_hints(self):
+        """用抓包时记录的响应信息生成续传状态，不用再发探测请求
+
+        信息可能已经过期：分段请求带 If-Range，文件变化时会抛出 ResourceChanged 重新探测。
+        """
+        hints = self.hints
+        if not hints or not hints.get('total_size'):
+            return None
+        state = ResumeState(self.state_path, self.url)
+        state.etag = hints.get('etag')
+        state.last_modified = hints.get('last_modified')
+        state.total_size = hints['total_size']
+        if hints.get('accept_ranges') and self.segments > 1 and state.total_size >= self.segment_min_size:
+            state.segments = self._split(state.total_size, self.segments)
+        return state
+
+    def _probe(self):
+        """用 Range: bytes=0-0 探测大小、ETag 和Range支持，返回新的续传状态
+
+        支持Range且文件足够大时同时切分好分段。
+        """
+        state = ResumeState(self.state_path, self.url)
+        headers = self._headers()
+        headers['Range'] = 'bytes=0-0'
+        try:
+            response = self.http.get(self.url, headers=headers, stream=True, timeout=30)
+        except requests.RequestException:
+            return state
+        with response:
+            self._apply_probe(state, response.status_code, response.headers)
+        return state
+
+    def _apply_probe(self, state, status_code, headers):
+        """按探测响应填写大小和校验值，支持Range且文件足够大时切分好分段"""
+        if status_code not in (200, 206):
+            return
+        state.update_validators(headers)
+        content_range = parse_content_range(headers.get('Content-Range'))
+        accepts_ranges = status_code == 206 and content_range
+        if accepts_ranges:
+            state.total_size = content_range[2]
+        else:
+            state.total_size = int(headers.get('Content-Length', 0) or 0)
+
+        if accepts_ranges and self.segments > 1 and state.total_size >= self.segment_min_size:
+            state.segments = self._split(state.total_size, self.segments)
+
+    def _download_segmented(self, state):
+        """分段并发下载"""
+        segments = state.segments
+        self.total_size = state.total_size
+        self._reset_progress(sum(seg[2] for seg in segments))
+        # 分段乱序写入，完成后再整体计算sha256
+        self.hasher = None
+
+        if not os.path.exists(self.part_path):
+            self._create_part(state)
+
+        errors = []
+        threads = [
+            Thread(target=self._fetch_segment, args=(seg, state, errors), daemon=True)
+            for seg in segments if seg[0] + seg[2] <= seg[1]
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self._save_segments(state)
+        if errors:
+            raise errors[0]
+
+    def _create_part(self, state):
+        """预先分配完整大小的 .part 文件，各段原地写入"""
+        with open(self.part_path, 'wb') as f:
+            preallocate(f, state.total_size)
+        state.save()
+
+    @staticmethod
+    def _split(total, count):
+        """切分字节区间，每段为 [start, end, 已下载字节数]"""
+        size = -(-total // count)
+        return [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+
+    def _save_segments(self, state):
+        """保存分段续传记录
+
+        state.segments 是各分段线程正在更新的列表，保存时写入一份快照，之后仍指向原列表。
+        """
+        with self.state_lock:
+            segments = state.segments
+            with self.lock:
+                state.segments = [list(seg) for seg in segments]
+            try:
+                state.save()
+            finally:
+                state.segments = segments
+
+    def _fetch_segment(self, seg, state, errors):
+        """下载一个分段，失败时从该段已确认的位置重试"""
+        try:
+            self._with_retries(self._transfer_segment, seg, state, errors)
+        except Exception as e:
+            errors.append(e)
+
+    def _transfer_segment(self, seg, state, errors):
+        """传输一个分段并写入文件对应位置"""
+        start, end = seg[0] + seg[2], seg[1]
+        headers = self._headers()
+        headers['Range'] = f'bytes={start}-{end}'
+        validator = state.validator()
+        if validator:
+            headers['If-Range'] = validator
+
+        response = self.http.get(self.url, headers=headers, stream=True, timeout=30)
+        with response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise ResourceChanged(f"服务器未返回分段内容: HTTP {response.status_code}")
+
+            readinto = open_reader(response)
+            last_save = time.time()
+            with open(self.part_path, 'r+b') as f:
+                f.seek(start)
+                # 各分段线程各用一个缓冲区，同步写入
+                writer = BlockWriter(f, self.write_block_size)
+                try:
+                    while not (self.cancelled or errors):
+                        # 只读本段剩余的数据，第一块补齐到块边界
+                        remaining = seg[1] - seg[0] - seg[2] + 1
+                        position = seg[0] + seg[2]
+                        want = min(writer.block_size - position % writer.block_size, remaining)
+                        buffer = writer.acquire()
+                        n = fill(readinto, memoryview(buffer)[:want])
+                        if not n:
+                            writer.release(buffer)
+                            break
+
+                        writer.write(buffer, n)
+                        # 分段记录只在 flush 之后更新，保证都是已确认的数据
+                        writer.flush()
+                        with self.lock:
+                            seg[2] += n
+                        self._add_progress(n)
+                        self._throttle(n)
+                        if seg[0] + seg[2] > seg[1]:
+                            release_reader(response)
+                            break
+                        if n < want:
+                            break
+
+                        # 定期落盘续传记录
+                        if time.time() - last_save >= 1:
+                            self._save_segments(state)
+                            last_save = time.time()
+                finally:
+                    writer.close()
+
+        if not self.cancelled and not errors and seg[0] + seg[2] <= seg[1]:
+            raise IncompleteTransfer(f"分段未下载完整: {seg[0]}-{seg[1]}")
+
+    def _reset_progress(self, downloaded):
+        """重置进度统计"""
+        with self.lock:
+            self.downloaded_size = downloaded
+            self.meter.reset(downloaded, time.monotonic())
+        self._publish()
+
+    def _add_progress(self, size):
+        """累计已下载字节，更新进度、平滑后的速度和剩余时间，并发布事件"""
+        with self.lock:
+            self.downloaded_size += size
+            downloaded = self.downloaded_size
+
+            # 更新进度
+            if self.total_size > 0:
+                self.progress = int(downloaded / self.total_size * 100)
+
+            # 计算速度和剩余时间
+            if self.meter.update(downloaded, time.monotonic()):
+                self.speed = self.meter.speed
+                self.eta = self.meter.eta(self._remaining(downloaded))
+        DOWNLOAD_BYTES.inc(size)
+        self._publish()
+
+    def _remaining(self, downloaded):
+        """剩余字节数，HLS等不知道总大小时按进度估算"""
+        if self.total_size > 0:
+            return self.total_size - downloaded
+        if 0 < self.progress < 100:
+            return downloaded * (100 - self.progress) / self.progress
+        return 0
+
+    def _publish(self, force=False):
+        """发布进度事件，按总线的频率限制合并，状态变化总是发布"""
+        bus = self.progress_bus
+        if not bus:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.last_publish < bus.min_interval:
+                return
+            self.last_publish = now
+        bus.publish(self.get_info())
+
+    def _throttle(self, size):
+        """按限速等待"""
+        if self.limiter and not self.cancelled:
+            self.limiter.throttle(self, self.host, size, self.cancel_event)
+
+    def cancel(self):
+        """取消下载"""
+        self.cancelled = True
+        self.cancel_event.set()
+
+    def get_info(self):
+        """获取下载信息"""
+        return {
+            'video_id': self.video_id,
+            'status': self.status,
+            'progress': self.progress,
+            'total_size': self.total_size,
+            'downloaded_size': self.downloaded_size,
+            'speed': self.speed,
+            'speed_text': format_speed(self.speed),
+            'size_text': format_size(self.total_size),
+            'eta': self.eta,
+            'eta_text': format_time(self.eta) if self.eta is not None else '',
+            'error': self.error
         }
\ No newline at end of file
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载调度模块 - 优先级 + 按主机公平排队
+"""
+
+from collections import OrderedDict, deque
+from threading import Condition, Thread, current_thread
+from urllib.parse import urlparse
+
+# 优先级（数值越小越优先）
+PRIORITY_MANUAL = 0   # 手动点击下载
+PRIORITY_BATCH = 1    # 批量下载
+PRIORITY_COVER = 2    # 封面
+
+PRIORITIES = (PRIORITY_MANUAL, PRIORITY_BATCH, PRIORITY_COVER)
+
+
+class DownloadScheduler:
+    """下载调度器
+
+    每个优先级一个队列，队列内按主机分组轮转，避免单个CDN主机独占所有工作线程。
+    排队中的任务可以暂停、恢复、调整优先级和取消；工作线程数可在运行时调整。
+    """
+
+    def __init__(self, max_workers=3):
+        self.cond = Condition()
+        # {priority: OrderedDict{host: deque[task]}}，OrderedDict 的顺序即轮转顺序
+        self.queues = {p: OrderedDict() for p in PRIORITIES}
+        self.queued = {}        # {task: (priority, host)}
+        self.paused = {}        # {task: (priority, host)}
+        self.running = set()
+        self.max_workers = 0
+        self.workers = []
+        self.shutting_down = False
+        self.set_workers(max_workers)
+
+    def submit(self, task, priority=PRIORITY_MANUAL):
+        """提交任务"""
+        host = urlparse(task.url).hostname or ''
+        with self.cond:
+            if self.shutting_down:
+                raise RuntimeError("调度器已关闭")
+            self._enqueue(task, priority, host)
+            self.cond.notify()
+        return task
+
+    def cancel(self, task):
+        """取消任务，排队中的任务直接移出队列"""
+        with self.cond:
+            entry = self.queued.get(task)
+            if entry:
+                self._dequeue(task)
+            else:
+                entry = self.paused.pop(task, None)
+        task.cancel()
+        if entry:
+            task.status = 'cancelled'
+        return entry is not None
+
+    def pause(self, task):
+        """暂停排队中的任务"""
+        with self.cond:
+            entry = self.queued.get(task)
+            if not entry:
+                return False
+            self._dequeue(task)
+            self.paused[task] = entry
+            task.status = 'paused'
+            return True
+
+    def resume(self, task):
+        """恢复暂停的任务"""
+        with self.cond:
+            entry = self.paused.pop(task, None)
+            if not entry:
+                return False
+            task.status = 'pending'
+            self._enqueue(task, *entry)
+            self.cond.notify()
+            return True
+
+    def reprioritize(self, task, priority):
+        """调整排队中任务的优先级"""
+        with self.cond:
+            if task in self.paused:
+                self.paused[task] = (priority, self.paused[task][1])
+                return True
+            entry = self.queued.get(task)
+            if not entry:
+                return False
+            self._dequeue(task)
+            self._enqueue(task, priority, entry[1])
+            self.cond.notify()
+            return True
+
+    def priority_of(self, task):
+        """排队中或暂停任务的优先级，不在队列中返回None"""
+        with self.cond:
+            entry = self.queued.get(task) or self.paused.get(task)
+            return entry[0] if entry else None
+
+    def set_workers(self, count):
+        """调整工作线程数，多余的线程在当前任务结束后退出"""
+        count = max(1, int(count))
+        with self.cond:
+            self.max_workers = count
+            for _ in range(count - len(self.workers)):
+                worker = Thread(target=self._worker_loop, daemon=True)
+                self.workers.append(worker)
+                worker.start()
+            self.cond.notify_all()
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """关闭调度器"""
+        with self.cond:
+            self.shutting_down = True
+            if cancel_pending:
+                for task in list(self.queued) + list(self.paused):
+                    task.cancel()
+                    task.status = 'cancelled'
+                self.queues = {p: OrderedDict() for p in PRIORITIES}
+                self.queued = {}
+                self.paused = {}
+            self.cond.notify_all()
+            workers = list(self.workers)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def get_stats(self):
+        """获取调度统计"""
+        with self.cond:
+            return {
+                'workers': self.max_workers,
+                'running': len(self.running),
+                'queued': {p: sum(len(q) for q in self.queues[p].values()) for p in PRIORITIES},
+                'paused': len(self.paused)
+            }
+
+    def _enqueue(self, task, priority, host):
+        """加入队列（调用方持有锁）"""
+        if priority not in self.queues:
+            raise ValueError(f"未知的优先级: {priority}")
+        self.queues[priority].setdefault(host, deque()).append(task)
+        self.queued[task] = (priority, host)
+
+    def _dequeue(self, task):
+        """移出队列（调用方持有锁）"""
+        priority, host = self.queued.pop(task)
+        hosts = self.queues[priority]
+        hosts[host].remove(task)
+        if not hosts[host]:
+            del hosts[host]
+
+    def _next_task(self):
+        """取出最高优先级中轮到的主机的下一个任务（调用方持有锁）"""
+        for priority in PRIORITIES:
+            hosts = self.queues[priority]
+            if not hosts:
+                continue
+            host, tasks = next(iter(hosts.items()))
+            task = tasks.popleft()
+            del self.queued[task]
+            if tasks:
+                hosts.move_to_end(host)
+            else:
+                del hosts[host]
+            return task
+        return None
+
+    def _worker_loop(self):
+        """工作线程"""
+        while True:
+            with self.cond:
+                while True:
+                    if self._should_exit():
+                        self.workers.remove(current_thread())
+                        return
+                    task = self._next_task()
+                    if task:
+                        break
+                    if self.shutting_down:
+                        self.workers.remove(current_thread())
+                        return
+                    self.cond.wait()
+                self.running.add(task)
+
+            try:
+                task.start()
+            finally:
+                with self.cond:
+                    self.running.discard(task)
+
+    def _should_exit(self):
+        """工作线程数被调小时多余的线程退出（调用方持有锁）"""
+        return len(self.workers) > self.max_workers
\ No newline at end of file
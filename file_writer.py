@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+文件写入模块 - 复用缓冲区读取、预分配、按块对齐写入
+"""
+
+import os
+from queue import Queue
+from threading import Thread
+
+ALIGNMENT = 64 * 1024   # 写入块大小按64KB对齐（页大小和常见文件系统块大小的整数倍）
+
+
+def align_block_size(size):
+    """把写入块大小向上取整到 ALIGNMENT 的整数倍"""
+    size = max(int(size), ALIGNMENT)
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def preallocate(f, size):
+    """按最终大小预分配文件，避免边下载边扩展文件"""
+    if size <= 0 or os.fstat(f.fileno()).st_size >= size:
+        return
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError:
+            pass  # 文件系统不支持时退回 truncate
+    f.truncate(size)
+
+
+def open_reader(response):
+    """返回响应体的 readinto(buffer) 函数
+
+    没有内容编码时直接从底层 http.client 响应读进缓冲区，不为每块数据创建bytes对象；
+    gzip 等编码的响应仍然由 urllib3 解码。
+    """
+    fp = getattr(response.raw, '_fp', None)
+    encoding = response.headers.get('Content-Encoding', 'identity').lower()
+    if fp is not None and hasattr(fp, 'readinto') and encoding in ('', 'identity'):
+        return fp.readinto
+    return response.raw.readinto
+
+
+def release_reader(response):
+    """响应体读完后把连接还给连接池（绕过 urllib3 读取时它不知道已经读完）"""
+    release_conn = getattr(response.raw, 'release_conn', None)
+    if release_conn:
+        release_conn()
+
+
+def fill(readinto, view):
+    """尽量读满 view，返回读到的字节数（小于 len(view) 表示已经读完）"""
+    filled = 0
+    size = len(view)
+    while filled < size:
+        n = readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+class BlockWriter:
+    """按块写入文件
+
+    网络数据读进 block_size 大小的缓冲区，读满一块才写一次磁盘。
+    threaded=True 时由写入线程写盘，网络读取不用等待磁盘；
+    几个缓冲区在两个线程之间轮换使用，不会为每块数据分配新对象。
+    """
+
+    def __init__(self, f, block_size=1024 * 1024, threaded=False, buffers=4):
+        self.f = f
+        self.block_size = align_block_size(block_size)
+        self.threaded = threaded
+        self.error = None
+        self.free = Queue()
+        for _ in range(buffers if threaded else 1):
+            self.free.put(bytearray(self.block_size))
+
+        self.pending = None
+        self.thread = None
+        if threaded:
+            self.pending = Queue()
+            self.thread = Thread(target=self._write_loop, daemon=True)
+            self.thread.start()
+
+    def acquire(self):
+        """取一个空闲的缓冲区"""
+        self._check_error()
+        return self.free.get()
+
+    def write(self, buffer, length):
+        """写入缓冲区的前 length 字节，写完后缓冲区回到空闲队列"""
+        if self.threaded:
+            self._check_error()
+            self.pending.put((buffer, length))
+        else:
+            self._write(buffer, length)
+
+    def release(self, buffer):
+        """归还没有用到的缓冲区"""
+        self.free.put(buffer)
+
+    def flush(self):
+        """等待所有数据写入并 flush"""
+        if self.threaded:
+            self.pending.join()
+        self._check_error()
+        self.f.flush()
+
+    def close(self):
+        """写完剩余数据并停止写入线程"""
+        if self.threaded and self.thread.is_alive():
+            self.pending.put(None)
+            self.thread.join()
+        self._check_error()
+        self.f.flush()
+
+    def _write(self, buffer, length):
+        """写一块数据"""
+        try:
+            self.f.write(memoryview(buffer)[:length])
+        finally:
+            self.free.put(buffer)
+
+    def _write_loop(self):
+        """写入线程"""
+        while True:
+            item = self.pending.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    self._write(*item)
+                else:
+                    self.free.put(item[0])
+            except Exception as e:
+                self.error = e
+            finally:
+                self.pending.task_done()
+
+    def _check_error(self):
+        """写入线程出错时在下载线程里抛出"""
+        if self.error:
+            raise self.error
\ No newline at end of file
@@ -1,334 +1,380 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-GUI界面模块
-"""
-
-import os
-import sys
-from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
-    QProgressBar, QMessageBox, QFileDialog, QGroupBox, QTextEdit
-)
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QThread
-from PyQt5.QtGui import QFont, QColor
-from utils import format_size, format_speed
-
-
-class MainWindow(QMainWindow):
-    """主窗口"""
-    
-    # 自定义信号
-    video_captured = pyqtSignal(dict)
-    download_progress = pyqtSignal(int, dict)
-    
-    def __init__(self, db, download_manager, proxy_server):
-        super().__init__()
-        self.db = db
-        self.download_manager = download_manager
-        self.proxy_server = proxy_server
-        
-        self.init_ui()
-        self.setup_timer()
-        
-        # 连接信号
-        self.video_captured.connect(self.on_video_captured)
-        self.download_progress.connect(self.on_download_progress)
-    
-    def init_ui(self):
-        """初始化UI"""
-        self.setWindowTitle('微信视频号嗅探器 Pro')
-        self.setGeometry(100, 100, 1200, 800)
-        
-        # 主布局
-        main_widget = QWidget()
-        self.setCentralWidget(main_widget)
-        layout = QVBoxLayout(main_widget)
-        
-        # 顶部状态栏
-        layout.addWidget(self.create_status_panel())
-        
-        # 控制按钮
-        layout.addWidget(self.create_control_panel())
-        
-        # 视频列表
-        layout.addWidget(self.create_video_table())
-        
-        # 底部日志
-        layout.addWidget(self.create_log_panel())
-    
-    def create_status_panel(self):
-        """创建状态面板"""
-        group = QGroupBox("系统状态")
-        layout = QHBoxLayout()
-        
-        # 代理状态
-        self.proxy_status = QLabel("🟢 代理运行中")
-        self.proxy_status.setStyleSheet("color: green; font-weight: bold;")
-        layout.addWidget(self.proxy_status)
-        
-        layout.addStretch()
-        
-        # 统计信息
-        self.stats_label = QLabel("已捕获: 0 | 已下载: 0")
-        self.stats_label.setStyleSheet("font-size: 14px;")
-        layout.addWidget(self.stats_label)
-        
-        group.setLayout(layout)
-        return group
-    
-    def create_control_panel(self):
-        """创建控制面板"""
-        group = QGroupBox("操作控制")
-        layout = QHBoxLayout()
-        
-        # 刷新按钮
-        btn_refresh = QPushButton("🔄 刷新列表")
-        btn_refresh.clicked.connect(self.refresh_table)
-        layout.addWidget(btn_refresh)
-        
-        # 批量下载
-        btn_download_all = QPushButton("📥 下载全部")
-        btn_download_all.clicked.connect(self.download_all)
-        layout.addWidget(btn_download_all)
-        
-        # 打开下载目录
-        btn_open_folder = QPushButton("📁 打开下载目录")
-        btn_open_folder.clicked.connect(self.open_download_folder)
-        layout.addWidget(btn_open_folder)
-        
-        # 清空列表
-        btn_clear = QPushButton("🗑️ 清空列表")
-        btn_clear.clicked.connect(self.clear_list)
-        layout.addWidget(btn_clear)
-        
-        layout.addStretch()
-        
-        group.setLayout(layout)
-        return group
-    
-    def create_video_table(self):
-        """创建视频表格"""
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels([
-            'ID', '文件名', '域名', '捕获时间', '状态', '进度', '操作'
-        ])
-        
-        # 设置列宽
-        header = self.table.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(1, QHeaderView.Stretch)
-        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(4, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(5, QHeaderView.Fixed)
-        header.setSectionResizeMode(6, QHeaderView.ResizeToContents)
-        self.table.setColumnWidth(5, 150)
-        
-        # 设置样式
-        self.table.setAlternatingRowColors(True)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        
-        return self.table
-    
-    def create_log_panel(self):
-        """创建日志面板"""
-        group = QGroupBox("运行日志")
-        layout = QVBoxLayout()
-        
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
-        self.log_text.setMaximumHeight(150)
-        layout.addWidget(self.log_text)
-        
-        group.setLayout(layout)
-        return group
-    
-    def setup_timer(self):
-        """设置定时器"""
-        # 每2秒刷新一次
-        self.refresh_timer = QTimer()
-        self.refresh_timer.timeout.connect(self.refresh_table)
-        self.refresh_timer.start(2000)
-    
-    def refresh_table(self):
-        """刷新表格"""
-        videos = self.db.get_all()
-        self.table.setRowCount(len(videos))
-        
-        for row, video in enumerate(videos):
-            # ID
-            self.table.setItem(row, 0, QTableWidgetItem(str(video['id'])))
-            
-            # 文件名
-            self.table.setItem(row, 1, QTableWidgetItem(video['filename']))
-            
-            # 域名
-            self.table.setItem(row, 2, QTableWidgetItem(video['domain']))
-            
-            # 捕获时间
-            from datetime import datetime
-            capture_time = datetime.fromisoformat(video['capture_time'])
-            time_str = capture_time.strftime('%Y-%m-%d %H:%M:%S')
-            self.table.setItem(row, 3, QTableWidgetItem(time_str))
-            
-            # 状态
-            task = self.download_manager.get_task(video['id'])
-            if task:
-                status = task.status
-                if status == 'downloading':
-                    status_text = '⬇️ 下载中'
-                elif status == 'completed':
-                    status_text = '✅ 已完成'
-                elif status == 'failed':
-                    status_text = '❌ 失败'
-                else:
-                    status_text = '⏸️ 等待中'
-            elif video.get('downloaded'):
-                status_text = '✅ 已完成'
-            else:
-                status_text = '📭 未下载'
-            
-            self.table.setItem(row, 4, QTableWidgetItem(status_text))
-            
-            # 进度条
-            progress_widget = QWidget()
-            progress_layout = QVBoxLayout(progress_widget)
-            progress_layout.setContentsMargins(5, 5, 5, 5)
-            
-            progress_bar = QProgressBar()
-            if task and task.status == 'downloading':
-                progress_bar.setValue(task.progress)
-                progress_bar.setFormat(f"{task.progress}% - {format_speed(task.speed)}")
-            elif video.get('downloaded'):
-                progress_bar.setValue(100)
-                progress_bar.setFormat("100%")
-            else:
-                progress_bar.setValue(0)
-                progress_bar.setFormat("0%")
-            
-            progress_layout.addWidget(progress_bar)
-            self.table.setCellWidget(row, 5, progress_widget)
-            
-            # 操作按钮
-            btn_widget = QWidget()
-            btn_layout = QHBoxLayout(btn_widget)
-            btn_layout.setContentsMargins(2, 2, 2, 2)
-            
-            # 下载按钮
-            btn_download = QPushButton("⬇️ 下载")
-            btn_download.clicked.connect(lambda checked, v=video: self.download_video(v))
-            if task and task.status == 'downloading':
-                btn_download.setEnabled(False)
-            btn_layout.addWidget(btn_download)
-            
-            # 复制链接
-            btn_copy = QPushButton("📋")
-            btn_copy.clicked.connect(lambda checked, v=video: self.copy_url(v))
-            btn_layout.addWidget(btn_copy)
-            
-            self.table.setCellWidget(row, 6, btn_widget)
-        
-        # 更新统计
-        self.update_stats()
-    
-    def update_stats(self):
-        """更新统计信息"""
-        total = self.db.get_count()
-        downloaded = self.db.get_downloaded_count()
-        self.stats_label.setText(f"已捕获: {total} | 已下载: {downloaded}")
-    
-    def download_video(self, video):
-        """下载视频"""
-        def on_complete(task):
-            if task.status == 'completed':
-                self.db.update_video(video['id'], {
-                    'downloaded': True,
-                    'download_path': task.save_path,
-                    'file_size': task.total_size
-                })
-                self.add_log(f"✅ 下载完成: {video['filename']}")
-        
-        self.download_manager.download_video(
-            video['id'],
-            video['url'],
-            video['filename'],
-            callback=on_complete
-        )
-        
-        self.add_log(f"⬇️ 开始下载: {video['filename']}")
-    
-    def download_all(self):
-        """下载全部"""
-        videos = self.db.get_all()
-        undownloaded = [v for v in videos if not v.get('downloaded')]
-        
-        if not undownloaded:
-            QMessageBox.information(self, "提示", "没有未下载的视频")
-            return
-        
-        reply = QMessageBox.question(
-            self, '确认',
-            f"确定下载 {len(undownloaded)} 个视频吗？",
-            QMessageBox.Yes | QMessageBox.No
-        )
-        
-        if reply == QMessageBox.Yes:
-            for video in undownloaded:
-                self.download_video(video)
-    
-    def copy_url(self, video):
-        """复制链接"""
-        clipboard = QApplication.clipboard()
-        clipboard.setText(video['url'])
-        self.add_log(f"📋 已复制链接: {video['filename']}")
-    
-    def open_download_folder(self):
-        """打开下载目录"""
-        path = os.path.abspath(self.download_manager.video_dir)
-        if sys.platform == 'win32':
-            os.startfile(path)
-        elif sys.platform == 'darwin':
-            os.system(f'open "{path}"')
-        else:
-            os.system(f'xdg-open "{path}"')
-    
-    def clear_list(self):
-        """清空列表"""
-        reply = QMessageBox.question(
-            self, '确认',
-            "确定清空所有记录吗？",
-            QMessageBox.Yes | QMessageBox.No
-        )
-        
-        if reply == QMessageBox.Yes:
-            self.db.clear()
-            self.refresh_table()
-            self.add_log("🗑️ 已清空列表")
-    
-    def add_log(self, message):
-        """添加日志"""
-        from datetime import datetime
-        timestamp = datetime.now().strftime('%H:%M:%S')
-        self.log_text.append(f"[{timestamp}] {message}")
-        
-        # 滚动到底部
-        scrollbar = self.log_text.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
-    
-    def on_video_captured(self, video):
-        """视频捕获回调"""
-        self.add_log(f"✅ 捕获视频: {video['filename']}")
-        self.refresh_table()
-    
-    def on_download_progress(self, video_id, progress):
-        """下载进度回调"""
-        pass
-    
-    def closeEvent(self, event):
-        """关闭事件"""
-        self.proxy_server.stop()
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+GUI界面模块
+"""
+
+import os
+import sys
+import logging
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QLabel, QPushButton, QTableView, QHeaderView, QAbstractItemView,
+    QMessageBox, QFileDialog, QGroupBox, QPlainTextEdit, QSpinBox, QComboBox, QCheckBox
+)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QThread
+from PyQt5.QtGui import QFont, QColor
+from download_scheduler import PRIORITY_MANUAL, PRIORITY_BATCH
+from video_table import VideoTableModel, ProgressDelegate, ActionDelegate, COL_PROGRESS, COL_ACTIONS
+from logging_setup import get_buffer, setup_logging, set_level
+
+logger = logging.getLogger(__name__)
+
+LOG_MAX_LINES = 1000        # 日志面板最多保留的行数
+LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+
+
+class MainWindow(QMainWindow):
+    """主窗口"""
+
+    # 自定义信号
+    video_captured = pyqtSignal(dict)
+    download_progress = pyqtSignal(int, dict)
+
+    def __init__(self, db, download_manager, proxy_server):
+        super().__init__()
+        self.db = db
+        self.download_manager = download_manager
+        self.proxy_server = proxy_server
+
+        self.db_version = None  # 表格已经反映到的数据库版本
+        # 日志由各线程写入缓冲区，界面定时批量取出显示（未配置日志时使用默认配置）
+        self.log_buffer = get_buffer() or setup_logging()
+        self.log_seq = 0
+
+        self.init_ui()
+        self.setup_timer()
+
+        # 连接信号
+        self.video_captured.connect(self.on_video_captured)
+        self.download_progress.connect(self.on_download_progress)
+
+        # 进度事件在下载线程中发布，通过信号转到界面线程
+        self.download_manager.subscribe_progress(
+            lambda event: self.download_progress.emit(event['video_id'], event)
+        )
+
+    def init_ui(self):
+        """初始化UI"""
+        self.setWindowTitle('微信视频号嗅探器 Pro')
+        self.setGeometry(100, 100, 1200, 800)
+
+        # 主布局
+        main_widget = QWidget()
+        self.setCentralWidget(main_widget)
+        layout = QVBoxLayout(main_widget)
+
+        # 顶部状态栏
+        layout.addWidget(self.create_status_panel())
+
+        # 控制按钮
+        layout.addWidget(self.create_control_panel())
+
+        # 视频列表
+        layout.addWidget(self.create_video_table())
+
+        # 底部日志
+        layout.addWidget(self.create_log_panel())
+
+    def create_status_panel(self):
+        """创建状态面板"""
+        group = QGroupBox("系统状态")
+        layout = QHBoxLayout()
+
+        # 代理状态
+        self.proxy_status = QLabel("🟢 代理运行中")
+        self.proxy_status.setStyleSheet("color: green; font-weight: bold;")
+        layout.addWidget(self.proxy_status)
+
+        # 解密范围
+        self.selective_check = QCheckBox("只解密视频域名")
+        self.selective_check.setToolTip("其他网站的HTTPS连接直接转发，不做TLS解密")
+        self.selective_check.setChecked(getattr(self.proxy_server, 'selective', True))
+        self.selective_check.toggled.connect(self.on_selective_toggled)
+        layout.addWidget(self.selective_check)
+
+        layout.addStretch()
+
+        # 统计信息
+        self.stats_label = QLabel("已捕获: 0 | 已下载: 0")
+        self.stats_label.setStyleSheet("font-size: 14px;")
+        layout.addWidget(self.stats_label)
+
+        group.setLayout(layout)
+        return group
+
+    def create_control_panel(self):
+        """创建控制面板"""
+        group = QGroupBox("操作控制")
+        layout = QHBoxLayout()
+
+        # 刷新按钮
+        btn_refresh = QPushButton("🔄 刷新列表")
+        btn_refresh.clicked.connect(self.refresh_table)
+        layout.addWidget(btn_refresh)
+
+        # 批量下载
+        btn_download_all = QPushButton("📥 下载全部")
+        btn_download_all.clicked.connect(self.download_all)
+        layout.addWidget(btn_download_all)
+
+        # 打开下载目录
+        btn_open_folder = QPushButton("📁 打开下载目录")
+        btn_open_folder.clicked.connect(self.open_download_folder)
+        layout.addWidget(btn_open_folder)
+
+        # 清空列表
+        btn_clear = QPushButton("🗑️ 清空列表")
+        btn_clear.clicked.connect(self.clear_list)
+        layout.addWidget(btn_clear)
+
+        # 同时下载数
+        layout.addWidget(QLabel("同时下载:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 500)
+        self.workers_spin.setValue(self.download_manager.scheduler.max_workers)
+        self.workers_spin.valueChanged.connect(self.download_manager.set_max_workers)
+        layout.addWidget(self.workers_spin)
+
+        # 全局限速
+        layout.addWidget(QLabel("限速(KB/s):"))
+        self.rate_spin = QSpinBox()
+        self.rate_spin.setRange(0, 1024 * 1024)
+        self.rate_spin.setSingleStep(256)
+        self.rate_spin.setSpecialValueText("不限")
+        self.rate_spin.valueChanged.connect(
+            lambda kb: self.download_manager.set_global_rate(kb * 1024)
+        )
+        layout.addWidget(self.rate_spin)
+
+        layout.addStretch()
+
+        group.setLayout(layout)
+        return group
+
+    def create_video_table(self):
+        """创建视频表格"""
+        # 模型 + 视图：只绘制可见的行，进度条和按钮由委托绘制
+        self.model = VideoTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setItemDelegateForColumn(COL_PROGRESS, ProgressDelegate(self.table))
+        self.action_delegate = ActionDelegate(self.table)
+        self.action_delegate.clicked.connect(self.on_table_action)
+        self.table.setItemDelegateForColumn(COL_ACTIONS, self.action_delegate)
+
+        # 设置列宽（不用 ResizeToContents，否则每次数据变化都要扫描所有行）
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setSectionResizeMode(1, QHeaderView.Stretch)
+        header.setSectionResizeMode(COL_PROGRESS, QHeaderView.Fixed)
+        header.setSectionResizeMode(COL_ACTIONS, QHeaderView.Fixed)
+        for column, width in ((0, 60), (2, 180), (3, 170), (4, 90), (COL_PROGRESS, 220), (COL_ACTIONS, 130)):
+            self.table.setColumnWidth(column, width)
+
+        # 固定行高，滚动时不需要计算每一行的高度
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(32)
+
+        # 设置样式
+        self.table.setAlternatingRowColors(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        return self.table
+
+    def create_log_panel(self):
+        """创建日志面板"""
+        group = QGroupBox("运行日志")
+        layout = QVBoxLayout()
+
+        level_layout = QHBoxLayout()
+        level_layout.addWidget(QLabel("日志级别:"))
+        self.log_level_combo = QComboBox()
+        self.log_level_combo.addItems(LOG_LEVELS)
+        current = logging.getLevelName(logging.getLogger().getEffectiveLevel())
+        if current in LOG_LEVELS:
+            self.log_level_combo.setCurrentText(current)
+        self.log_level_combo.currentTextChanged.connect(set_level)
+        level_layout.addWidget(self.log_level_combo)
+        level_layout.addStretch()
+        layout.addLayout(level_layout)
+
+        # QPlainTextEdit 按行块存储，超过上限自动删除最旧的行
+        self.log_text = QPlainTextEdit()
+        self.log_text.setReadOnly(True)
+        self.log_text.setMaximumHeight(150)
+        self.log_text.setMaximumBlockCount(LOG_MAX_LINES)
+        layout.addWidget(self.log_text)
+
+        group.setLayout(layout)
+        return group
+
+    def setup_timer(self):
+        """设置定时器"""
+        # 下载进度由事件推送；定时器只拉取数据库的增量变更
+        self.refresh_timer = QTimer()
+        self.refresh_timer.timeout.connect(self.poll_changes)
+        self.refresh_timer.start(1000)
+
+        # 日志每200毫秒批量刷新一次
+        self.log_timer = QTimer()
+        self.log_timer.timeout.connect(self.flush_logs)
+        self.log_timer.start(200)
+
+    def poll_changes(self):
+        """把数据库的增量变更应用到表格，没有变化时什么都不做"""
+        if self.db.version == self.db_version:
+            return
+        changes = self.db.changes_since(self.db_version)
+        if changes['reset'] or not self.model.insert_videos(changes['inserted']):
+            self.refresh_table()
+            return
+        self.model.update_videos(changes['updated'])
+        self.db_version = changes['version']
+        self.show_stats(changes['count'], changes['downloaded'])
+
+    def refresh_table(self):
+        """重新读取全部记录"""
+        self.db_version = self.db.version
+        videos = self.db.get_all()
+        infos = {}
+        for video in videos:
+            task = self.download_manager.get_task(video['id'])
+            if task:
+                infos[video['id']] = task.get_info()
+        self.model.set_videos(videos, infos)
+
+        # 更新统计
+        self.update_stats()
+
+    def update_stats(self):
+        """更新统计信息"""
+        self.show_stats(self.db.get_count(), self.db.get_downloaded_count())
+
+    def show_stats(self, total, downloaded):
+        """显示统计数字"""
+        self.stats_label.setText(f"已捕获: {total} | 已下载: {downloaded}")
+
+    def download_video(self, video, priority=PRIORITY_MANUAL):
+        """下载视频"""
+        def on_complete(task):
+            if task.status == 'completed':
+                self.db.update_video(video['id'], {
+                    'downloaded': True,
+                    'download_path': task.save_path,
+                    'file_size': task.total_size
+                })
+
+        self.download_manager.download_video(
+            video['id'],
+            video['url'],
+            video['filename'],
+            callback=on_complete,
+            headers={
+                'Referer': video.get('referer', ''),
+                'User-Agent': video.get('user_agent', '')
+            },
+            priority=priority,
+            hints=video
+        )
+
+        self.add_log(f"⬇️ 开始下载: {video['filename']}")
+
+    def download_all(self):
+        """下载全部"""
+        undownloaded = self.db.query(downloaded=False)
+
+        if not undownloaded:
+            QMessageBox.information(self, "提示", "没有未下载的视频")
+            return
+
+        reply = QMessageBox.question(
+            self, '确认',
+            f"确定下载 {len(undownloaded)} 个视频吗？",
+            QMessageBox.Yes | QMessageBox.No
+        )
+
+        if reply == QMessageBox.Yes:
+            for video in undownloaded:
+                self.download_video(video, PRIORITY_BATCH)
+
+    def copy_url(self, video):
+        """复制链接"""
+        clipboard = QApplication.clipboard()
+        clipboard.setText(video['url'])
+        self.add_log(f"📋 已复制链接: {video['filename']}")
+
+    def open_download_folder(self):
+        """打开下载目录"""
+        path = os.path.abspath(self.download_manager.video_dir)
+        if sys.platform == 'win32':
+            os.startfile(path)
+        elif sys.platform == 'darwin':
+            os.system(f'open "{path}"')
+        else:
+            os.system(f'xdg-open "{path}"')
+
+    def clear_list(self):
+        """清空列表"""
+        reply = QMessageBox.question(
+            self, '确认',
+            "确定清空所有记录吗？",
+            QMessageBox.Yes | QMessageBox.No
+        )
+
+        if reply == QMessageBox.Yes:
+            self.db.clear()
+            self.refresh_table()
+            self.add_log("🗑️ 已清空列表")
+
+    def add_log(self, message, level=logging.INFO):
+        """添加日志（任何线程都可以调用）"""
+        logger.log(level, message)
+
+    def flush_logs(self):
+        """把缓冲区里的新日志一次性追加到日志面板"""
+        self.log_seq, lines = self.log_buffer.since(self.log_seq)
+        if not lines:
+            return
+
+        # 用户向上翻看时不自动滚动
+        scrollbar = self.log_text.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        self.log_text.appendPlainText('\n'.join(lines[-LOG_MAX_LINES:]))
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def on_video_captured(self, video):
+        """视频捕获回调"""
+        self.add_log(f"✅ 捕获视频: {video['filename']}")
+        self.poll_changes()
+
+    def on_download_progress(self, video_id, info):
+        """下载进度事件：只刷新对应行的单元格"""
+        previous = self.model.infos.get(video_id)
+        self.model.update_progress(video_id, info)
+        if info['status'] in ('completed', 'failed', 'cancelled') and \
+                (not previous or previous['status'] != info['status']):
+            self.update_stats()
+
+    def on_selective_toggled(self, checked):
+        """切换解密范围"""
+        self.proxy_server.set_intercept_scope(selective=checked)
+
+    def on_table_action(self, row, action):
+        """表格中的按钮被点击"""
+        video = self.model.video_at(row)
+        if action == 'download':
+            self.download_video(video)
+        elif action == 'copy':
+            self.copy_url(video)
+
+    def closeEvent(self, event):
+        """关闭事件"""
+        self.proxy_server.stop()
+        # 等下载任务结束后再关闭数据库，任务完成时还会写回数据库
+        self.download_manager.shutdown(wait=True)
+        self.db.close()
         event.accept()
\ No newline at end of file
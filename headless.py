@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+无界面模式 - 不加载 PyQt，作为服务在 Linux 服务器上运行
+
+用法: python headless.py [--config sniffer.json] [--port 8888] [--workers 2] [--download-dir downloads]
+配置文件为 JSON，键名与命令行参数相同（横线换成下划线），命令行参数优先。
+SIGINT/SIGTERM 时停止代理、处理完已捕获的视频并把数据库落盘后退出。
+"""
+
+import os
+import sys
+import json
+import signal
+import logging
+import argparse
+import threading
+from video_database import VideoDatabase
+from storage import STORES, DEFAULT_PATHS
+from download_manager import create_download_manager
+from download_scheduler import PRIORITY_BATCH
+from proxy_server import ProxyServer
+from logging_setup import setup_logging, shutdown_logging
+from tee_capture import TeeAdopter
+from metrics import MetricsServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'host': '0.0.0.0',
+    'port': 8888,
+    'workers': 1,
+    'download_dir': 'downloads',
+    'db_path': None,            # 为None时按存储引擎取默认文件名
+    'db_backend': 'journal',
+    'engine': 'thread',
+    'max_downloads': None,
+    'intercept': 'video',
+    'tee': False,
+    'auto_download': True,
+    'metrics_port': 9108,
+    'log_level': 'INFO'
+}
+
+
+def parse_args(argv=None):
+    """解析命令行参数（没有指定的为None，由配置文件或默认值补上）"""
+    parser = argparse.ArgumentParser(description='微信视频号嗅探器 Pro（无界面模式）', allow_abbrev=False)
+    parser.add_argument('--config', help='JSON 配置文件')
+    parser.add_argument('--host', help='代理监听地址（默认 0.0.0.0）')
+    parser.add_argument('--port', type=int, help='代理端口（默认 8888）')
+    parser.add_argument('--workers', type=int,
+                        help='代理进程数（默认 1）；多进程时各进程在同一个端口上接受连接')
+    parser.add_argument('--download-dir', help='下载目录（默认 downloads）')
+    parser.add_argument('--db-path', help='数据库文件（默认 journal 为 videos.json，sqlite 为 videos.db）')
+    parser.add_argument('--db-backend', choices=sorted(STORES), help='数据库存储引擎（默认 journal）')
+    parser.add_argument('--engine', choices=['thread', 'async'], help='下载引擎')
+    parser.add_argument('--max-downloads', type=int, help='同时下载数')
+    parser.add_argument('--intercept', choices=['video', 'all'], help='TLS解密范围')
+    parser.add_argument('--tee', action='store_true', default=None, help='旁路写盘')
+    parser.add_argument('--no-auto-download', dest='auto_download', action='store_false', default=None,
+                        help='捕获后不自动下载')
+    parser.add_argument('--metrics-port', type=int, help='Prometheus 监控指标端口，0为关闭')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], type=str.upper,
+                        help='日志级别')
+    return parser.parse_args(argv)
+
+
+def load_config(args):
+    """默认值 < 配置文件 < 命令行参数"""
+    config = dict(DEFAULTS)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        unknown = set(data) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"配置文件中有未知的键: {', '.join(sorted(unknown))}")
+        config.update(data)
+    config.update({k: v for k, v in vars(args).items() if k in DEFAULTS and v is not None})
+    if config['db_backend'] not in STORES:
+        raise ValueError(f"未知的存储引擎: {config['db_backend']}")
+    if not config['db_path']:
+        config['db_path'] = DEFAULT_PATHS[config['db_backend']]
+    return config
+
+
+class HeadlessService:
+    """把数据库、下载管理器、代理和监控指标连接起来，没有界面"""
+
+    def __init__(self, config):
+        self.config = config
+        self.stop_event = threading.Event()
+        self.db = None
+        self.download_manager = None
+        self.proxy_server = None
+        self.metrics_server = None
+        self.tee = None
+        # 旁路写盘时视频在播放的同时就保存了，不需要再自动下载
+        self.auto_download = config['auto_download'] and not config['tee']
+
+    def start(self):
+        """启动所有组件"""
+        config = self.config
+        self.db = VideoDatabase(config['db_path'], backend=config['db_backend'],
+                                durability='batched', commit_window=0.2)
+        self.download_manager = create_download_manager(
+            config['engine'], config['max_downloads'], download_dir=config['download_dir']
+        )
+        if config['tee']:
+            self.tee = TeeAdopter(self.db, self.download_manager)
+
+        proxy_options = dict(
+            port=config['port'],
+            host=config['host'],
+            callback=self.on_video_captured,
+            activity_callback=self.download_manager.limiter.note_proxy_activity,
+            selective=config['intercept'] == 'video',
+            tee_dir=os.path.join(config['download_dir'], 'tee') if self.tee else None,
+            tee_callback=self.tee.adopt if self.tee else None
+        )
+        if config['workers'] > 1:
+            # 只有多进程时才加载 multiprocessing 相关模块
+            from proxy_workers import ProxyWorkerPool
+            self.proxy_server = ProxyWorkerPool(workers=config['workers'], **proxy_options)
+        else:
+            self.proxy_server = ProxyServer(**proxy_options)
+        self.proxy_server.start()
+
+        if config['metrics_port']:
+            self.metrics_server = MetricsServer(config['metrics_port'])
+            self.metrics_server.start()
+
+        logger.info(f"✅ 无界面模式已启动，下载目录: {os.path.abspath(config['download_dir'])}")
+
+    def on_video_captured(self, url, headers, meta=None):
+        """视频捕获回调（在捕获队列的消费线程中调用）"""
+        video = self.db.add_video(url, headers, meta)
+        if not video:
+            return
+        logger.info(f"✅ 捕获视频: {video['filename']}")
+        if self.auto_download:
+            self.download_video(video)
+
+    def download_video(self, video):
+        """下载视频，完成后写回数据库"""
+        def on_complete(task):
+            if task.status == 'completed':
+                self.db.update_video(video['id'], {
+                    'downloaded': True,
+                    'download_path': task.save_path,
+                    'file_size': task.total_size
+                })
+
+        self.download_manager.download_video(
+            video['id'],
+            video['url'],
+            video['filename'],
+            callback=on_complete,
+            headers={
+                'Referer': video.get('referer', ''),
+                'User-Agent': video.get('user_agent', '')
+            },
+            priority=PRIORITY_BATCH,
+            hints=video
+        )
+
+    def request_stop(self, signum=None, frame=None):
+        """信号处理：只设置标志，在主线程中停止"""
+        if signum is not None:
+            logger.info(f"⏹️ 收到信号 {signal.Signals(signum).name}，正在停止...")
+        self.stop_event.set()
+
+    def run(self):
+        """阻塞直到收到停止信号"""
+        while not self.stop_event.wait(1.0):
+            pass
+
+    def stop(self):
+        """停止代理（处理完已捕获的视频），停止下载并把数据库落盘"""
+        if self.proxy_server:
+            self.proxy_server.stop()
+        if self.download_manager:
+            # 等下载线程结束，完成回调写完数据库后才能关闭数据库
+            self.download_manager.shutdown(wait=True)
+        if self.db:
+            self.db.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        logger.info("⏹️ 无界面模式已停止")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        config = load_config(args)
+    except (OSError, ValueError) as e:
+        print(f"❌ 读取配置失败: {e}", file=sys.stderr)
+        return 2
+    setup_logging(config['log_level'])
+
+    service = HeadlessService(config)
+    for name in ('SIGINT', 'SIGTERM'):
+        signal.signal(getattr(signal, name), service.request_stop)
+
+    try:
+        service.start()
+        service.run()
+    except Exception as e:
+        logger.error(f"❌ 运行失败: {e}")
+        return 1
+    finally:
+        service.stop()
+        shutdown_logging()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HLS(m3u8)下载模块
+"""
+
+import os
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from resumable import parse_content_range
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # 没有 cryptography 时不支持加密的流
+    Cipher = None
+
+
+def parse_attributes(text):
+    """解析 KEY=VALUE,KEY="VALUE" 形式的属性列表"""
+    attrs = {}
+    key, value, in_quotes, reading_key = '', '', False, True
+    for ch in text + ',':
+        if reading_key:
+            if ch == '=':
+                reading_key = False
+            elif ch != ',':
+                key += ch
+        elif ch == '"':
+            in_quotes = not in_quotes
+        elif ch == ',' and not in_quotes:
+            attrs[key.strip().upper()] = value.strip()
+            key, value, reading_key = '', '', True
+        else:
+            value += ch
+    return attrs
+
+
+def parse_playlist(text, base_url):
+    """解析m3u8，返回主播放列表(variants)或媒体播放列表(segments)"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or not lines[0].startswith('#EXTM3U'):
+        raise ValueError("不是有效的m3u8播放列表")
+
+    variants = []
+    segments = []
+    media_sequence = 0
+    key = None
+    init_map = None
+    endlist = False
+    pending = {}
+    byterange_next = 0
+
+    for line in lines[1:]:
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            pending = {
+                'bandwidth': int(attrs.get('BANDWIDTH', 0) or 0),
+                'resolution': attrs.get('RESOLUTION', '')
+            }
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            media_sequence = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-KEY:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            method = attrs.get('METHOD', 'NONE')
+            key = None if method == 'NONE' else {
+                'method': method,
+                'uri': urljoin(base_url, attrs.get('URI', '')),
+                'iv': attrs.get('IV')
+            }
+        elif line.startswith('#EXT-X-MAP:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            init_map = urljoin(base_url, attrs.get('URI', ''))
+        elif line.startswith('#EXTINF:'):
+            pending['duration'] = float(line.split(':', 1)[1].split(',')[0] or 0)
+        elif line.startswith('#EXT-X-BYTERANGE:'):
+            length, _, offset = line.split(':', 1)[1].partition('@')
+            start = int(offset) if offset else byterange_next
+            pending['byterange'] = (start, start + int(length) - 1)
+            byterange_next = start + int(length)
+        elif line.startswith('#EXT-X-ENDLIST'):
+            endlist = True
+        elif not line.startswith('#'):
+            uri = urljoin(base_url, line)
+            if 'bandwidth' in pending:
+                variants.append(dict(pending, uri=uri))
+            else:
+                segments.append(dict(
+                    pending,
+                    uri=uri,
+                    sequence=media_sequence + len(segments),
+                    key=key
+                ))
+            pending = {}
+
+    if variants:
+        return {'type': 'master', 'variants': variants}
+    return {
+        'type': 'media',
+        'segments': segments,
+        'init_map': init_map,
+        'endlist': endlist
+    }
+
+
+def slice_byterange(status_code, content_range, data, byterange):
+    """取出 #EXT-X-BYTERANGE 分片的数据
+
+    206 响应必须正好从请求的起点开始；服务器忽略 Range 返回 200 时从完整资源中截取。
+    """
+    start, end = byterange
+    if status_code == 206:
+        parsed = parse_content_range(content_range)
+        if not parsed or parsed[0] != start:
+            raise IOError(f"分片 Content-Range 不匹配: {content_range}")
+        return data[:end - start + 1]
+    if len(data) <= end:
+        raise IOError(f"分片数据不完整: 需要 {start}-{end}，只有 {len(data)} 字节")
+    return data[start:end + 1]
+
+
+class HlsDownloader:
+    """HLS下载器
+
+    并发下载分片，但按顺序写入任务的 .part 文件；最多只有 window 个分片在内存中。
+    续传记录保存下一个分片序号和对应的文件偏移。
+    """
+
+    def __init__(self, task, concurrency=4, window=8, variant='best'):
+        self.task = task
+        self.concurrency = concurrency
+        self.window = max(window, concurrency)
+        self.variant = variant  # best / worst
+        self.state_path = task.save_path + '.hls.json'
+        self.keys = {}          # {key_uri: bytes}
+
+    @staticmethod
+    def media_segments(playlist):
+        """可以下载的分片列表；直播（没有 #EXT-X-ENDLIST）的播放列表不完整，不下载"""
+        if not playlist['endlist']:
+            raise IOError("直播流（播放列表没有 #EXT-X-ENDLIST）不支持下载")
+        if not playlist['segments']:
+            raise IOError("播放列表中没有分片")
+        return playlist['segments']
+
+    def run(self):
+        """下载整个播放列表"""
+        media_url, playlist = self._resolve_playlist()
+        segments = self.media_segments(playlist)
+
+        next_index, offset = self._load_state(media_url)
+        mode = 'r+b' if next_index > 0 else 'wb'
+        if next_index > 0:
+            # 截掉上次未确认写完的部分
+            with open(self.task.part_path, 'r+b') as f:
+                f.truncate(offset)
+
+        total = len(segments)
+        self.task._reset_progress(offset)
+        self.task._start_hash(offset)
+        self.task.progress = int(next_index / total * 100)
+
+        with open(self.task.part_path, mode) as f, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            f.seek(offset)
+            if next_index == 0 and playlist['init_map']:
+                data = self._fetch(playlist['init_map'])
+                f.write(data)
+                self.task._update_hash(data)
+                offset += len(data)
+                self.task._add_progress(len(data))
+
+            futures = deque()
+            submit_index = next_index
+            while next_index < total:
+                if self.task.cancelled:
+                    break
+                # 保持窗口内的分片在下载
+                while submit_index < total and len(futures) < self.window:
+                    futures.append(executor.submit(self._fetch_segment, segments[submit_index]))
+                    submit_index += 1
+
+                data = futures.popleft().result()
+                if self.task.cancelled:
+                    # 取消后拿到的可能是空数据，不能记入续传位置
+                    break
+                f.write(data)
+                self.task._update_hash(data)
+                offset += len(data)
+                next_index += 1
+                self.task.progress = int(next_index / total * 100)
+                self.task._add_progress(len(data))
+
+                f.flush()
+                self._save_state(media_url, next_index, offset)
+
+            for future in futures:
+                future.cancel()
+
+        self._finish(next_index, total, offset)
+
+    def _finish(self, next_index, total, offset):
+        """全部分片写完后删除续传记录，以实际写入的字节数作为任务的大小"""
+        if next_index < total:
+            return
+        self.task.total_size = offset
+        self.task._reset_progress(offset)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def _resolve_playlist(self):
+        """下载播放列表，遇到主播放列表时选择一个码率"""
+        url = self.task.url
+        for _ in range(3):
+            response = self.task.http.get(url, headers=self.task._headers(), timeout=30)
+            with response:
+                response.raise_for_status()
+                playlist = parse_playlist(response.text, response.url)
+            if playlist['type'] == 'media':
+                return url, playlist
+
+            variants = sorted(playlist['variants'], key=lambda v: v['bandwidth'])
+            url = variants[0 if self.variant == 'worst' else -1]['uri']
+        raise IOError("播放列表嵌套过深")
+
+    def _fetch(self, url, byterange=None):
+        """下载一个资源，网络错误时按任务的重试设置重试"""
+        return self.task._with_retries(self._fetch_once, url, byterange)
+
+    def _fetch_once(self, url, byterange=None):
+        """下载一个资源（不重试）"""
+        headers = self.task._headers()
+        if byterange:
+            headers['Range'] = f'bytes={byterange[0]}-{byterange[1]}'
+        response = self.task.http.get(url, headers=headers, timeout=30)
+        with response:
+            response.raise_for_status()
+            if byterange:
+                return slice_byterange(response.status_code, response.headers.get('Content-Range'),
+                                       response.content, byterange)
+            return response.content
+
+    def _fetch_segment(self, segment):
+        """下载并解密一个分片"""
+        if self.task.cancelled:
+            return b''
+        data = self._fetch(segment['uri'], segment.get('byterange'))
+        self.task._throttle(len(data))
+        key = segment.get('key')
+        if key:
+            data = self._decrypt(data, key, segment['sequence'])
+        return data
+
+    def _decrypt(self, data, key, sequence):
+        """AES-128 解密"""
+        if key['method'] != 'AES-128':
+            raise IOError(f"不支持的加密方式: {key['method']}")
+        if Cipher is None:
+            raise IOError("解密需要安装 cryptography")
+
+        if key['uri'] not in self.keys:
+            self.keys[key['uri']] = self._fetch(key['uri'])
+        if key['iv']:
+            iv = bytes.fromhex(key['iv'][2:] if key['iv'].lower().startswith('0x') else key['iv'])
+        else:
+            iv = sequence.to_bytes(16, 'big')
+
+        decryptor = Cipher(algorithms.AES(self.keys[key['uri']]), modes.CBC(iv)).decryptor()
+        data = decryptor.update(data) + decryptor.finalize()
+        # 去掉 PKCS7 填充
+        return data[:-data[-1]] if data else data
+
+    def _load_state(self, media_url):
+        """读取续传记录，返回 (下一个分片序号, 文件偏移)"""
+        if not os.path.exists(self.state_path) or not os.path.exists(self.task.part_path):
+            return 0, 0
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception:
+            return 0, 0
+        if state.get('url') != self.task.url or state.get('media_url') != media_url:
+            return 0, 0
+        if os.path.getsize(self.task.part_path) < state['offset']:
+            return 0, 0
+        return state['next_index'], state['offset']
+
+    def _save_state(self, media_url, next_index, offset):
+        """保存续传记录"""
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': self.task.url,
+                'media_url': media_url,
+                'next_index': next_index,
+                'offset': offset
+            }, f)
+        os.replace(tmp_path, self.state_path)
\ No newline at end of file
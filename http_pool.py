@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HTTP连接池模块 - 按主机复用keep-alive连接
+"""
+
+from threading import Lock
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HostSessionPool:
+    """按主机划分的 requests.Session 池
+
+    每个主机一个Session，连接池大小即该主机的最大并发连接数；
+    连接用完时阻塞等待，而不是新建连接。
+    """
+
+    def __init__(self, pool_connections=4, max_per_host=8, headers=None):
+        self.pool_connections = pool_connections  # 每个Session缓存的连接池数（重定向到其他主机时用到）
+        self.max_per_host = max_per_host          # 每个主机的最大连接数
+        self.headers = headers or {}              # 所有请求的默认请求头
+        self.sessions = {}                        # {(scheme, host, port): Session}
+        self.lock = Lock()
+
+    def session_for(self, url):
+        """获取URL所在主机的Session"""
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(self.headers)
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.max_per_host,
+                    pool_block=True
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[key] = session
+            return session
+
+    def get(self, url, **kwargs):
+        """发送GET请求"""
+        return self.session_for(url).get(url, **kwargs)
+
+    def head(self, url, **kwargs):
+        """发送HEAD请求"""
+        return self.session_for(url).head(url, **kwargs)
+
+    def get_stats(self):
+        """统计连接复用情况"""
+        stats = {
+            'hosts': 0,
+            'requests': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'tls_handshakes_avoided': 0
+        }
+        with self.lock:
+            sessions = list(self.sessions.values())
+        stats['hosts'] = len(sessions)
+
+        for session in sessions:
+            adapter = session.get_adapter('https://')
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                opened = pool.num_connections
+                reused = max(pool.num_requests - opened, 0)
+                stats['requests'] += pool.num_requests
+                stats['connections_opened'] += opened
+                stats['connections_reused'] += reused
+                if pool.scheme == 'https':
+                    stats['tls_handshakes_avoided'] += reused
+        return stats
+
+    def close(self):
+        """关闭所有连接"""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
\ No newline at end of file
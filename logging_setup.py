@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+日志模块 - 队列转发 + 环形缓冲区
+"""
+
+import sys
+import atexit
+import logging
+import logging.handlers
+from collections import deque
+from queue import Queue, Full
+from threading import Lock
+
+LOG_FORMAT = '[%(asctime)s] %(message)s'
+DETAIL_FORMAT = '[%(asctime)s] %(levelname)s %(name)s: %(message)s'
+DATE_FORMAT = '%H:%M:%S'
+
+_listener = None
+_buffer = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """写入有界队列的日志处理器
+
+    调用线程只把记录放进队列，控制台、界面的输出都在监听线程里完成；
+    队列满时直接丢弃并计数，代理、下载线程不会因为日志而阻塞。
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+
+class LogBuffer:
+    """最近 capacity 条日志的环形缓冲区
+
+    每条日志有递增的序号，界面按序号增量读取，读取慢了只会丢掉最旧的日志。
+    """
+
+    def __init__(self, capacity=2000):
+        self.capacity = capacity
+        self.lines = deque(maxlen=capacity)
+        self.seq = 0
+        self.lock = Lock()
+
+    def append(self, line):
+        """追加一条日志"""
+        with self.lock:
+            self.lines.append(line)
+            self.seq += 1
+
+    def since(self, seq):
+        """返回 (最新序号, seq 之后还在缓冲区里的日志)"""
+        with self.lock:
+            count = min(self.seq - seq, len(self.lines))
+            if count <= 0:
+                return self.seq, []
+            return self.seq, list(self.lines)[-count:]
+
+
+class BufferHandler(logging.Handler):
+    """把格式化后的日志写入 LogBuffer"""
+
+    def __init__(self, buffer):
+        super().__init__()
+        self.buffer = buffer
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def parse_level(level):
+    """'debug' / 'INFO' / 数字 转换为日志级别"""
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"未知的日志级别: {level}")
+    return value
+
+
+def setup_logging(level='INFO', console=True, capacity=2000, queue_size=10000):
+    """配置日志，返回界面使用的 LogBuffer
+
+    所有模块用 logging.getLogger(__name__) 记录日志，
+    记录经有界队列交给监听线程，再写到控制台和环形缓冲区。
+    """
+    global _listener, _buffer
+    shutdown_logging()
+
+    _buffer = LogBuffer(capacity)
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    handlers = []
+
+    buffer_handler = BufferHandler(_buffer)
+    buffer_handler.setFormatter(formatter)
+    handlers.append(buffer_handler)
+
+    if console:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter(DETAIL_FORMAT, DATE_FORMAT))
+        handlers.append(stream_handler)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(Queue(queue_size)))
+    root.setLevel(parse_level(level))
+
+    _listener = logging.handlers.QueueListener(
+        root.handlers[0].queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    return _buffer
+
+
+def set_level(level):
+    """运行时修改日志级别"""
+    logging.getLogger().setLevel(parse_level(level))
+
+
+def get_buffer():
+    """当前的 LogBuffer（未调用 setup_logging 时为None）"""
+    return _buffer
+
+
+def get_dropped():
+    """队列满被丢弃的日志条数"""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            return handler.dropped
+    return 0
+
+
+def shutdown_logging():
+    """输出队列里剩余的日志并停止监听线程"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
\ No newline at end of file
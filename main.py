@@ -1,105 +1,164 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-主程序入口
-"""
-
-import sys
-import socket
-from PyQt5.QtWidgets import QApplication, QMessageBox, QSplashScreen
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QPixmap, QFont
-
-from video_database import VideoDatabase
-from download_manager import DownloadManager
-from proxy_server import ProxyServer
-from gui_window import MainWindow
-
-
-def get_local_ip():
-    """获取本机IP"""
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(('8.8.8.8', 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
-        return '127.0.0.1'
-
-
-def main():
-    print("=" * 60)
-    print("🎯 微信视频号嗅探器 Pro")
-    print("=" * 60)
-    
-    # 创建应用
-    app = QApplication(sys.argv)
-    app.setStyle('Fusion')
-    
-    # 显示启动画面
-    splash = QSplashScreen()
-    splash.showMessage(
-        "正在启动...",
-        Qt.AlignCenter | Qt.AlignBottom,
-        Qt.white
-    )
-    splash.show()
-    app.processEvents()
-    
-    try:
-        # 初始化数据库
-        splash.showMessage("初始化数据库...", Qt.AlignCenter | Qt.AlignBottom, Qt.white)
-        db = VideoDatabase()
-        
-        # 初始化下载管理器
-        splash.showMessage("初始化下载管理器...", Qt.AlignCenter | Qt.AlignBottom, Qt.white)
-        download_manager = DownloadManager(max_workers=3)
-        
-        # 初始化代理服务器
-        splash.showMessage("启动代理服务器...", Qt.AlignCenter | Qt.AlignBottom, Qt.white)
-        
-        def on_video_captured(url, headers):
-            """视频捕获回调"""
-            video = db.add_video(url, headers)
-            if video and hasattr(window, 'video_captured'):
-                window.video_captured.emit(video)
-        
-        proxy_server = ProxyServer(port=8888, callback=on_video_captured)
-        proxy_server.start()
-        
-        # 创建主窗口
-        splash.showMessage("加载界面...", Qt.AlignCenter | Qt.AlignBottom, Qt.white)
-        window = MainWindow(db, download_manager, proxy_server)
-        
-        # 显示使用说明
-        local_ip = get_local_ip()
-        window.add_log("=" * 40)
-        window.add_log("🎯 微信视频号嗅探器 Pro 已启动")
-        window.add_log("=" * 40)
-        window.add_log(f"📡 代理服务器: {local_ip}:8888")
-        window.add_log("📱 手机设置步骤:")
-        window.add_log("   1. WiFi设置 → 代理 → 手动")
-        window.add_log(f"   2. 服务器: {local_ip}")
-        window.add_log("   3. 端口: 8888")
-        window.add_log("   4. 安装证书: http://mitm.it")
-        window.add_log("=" * 40)
-        window.add_log("✅ 准备就绪，等待捕获视频...")
-        
-        # 关闭启动画面
-        splash.finish(window)
-        
-        # 显示主窗口
-        window.show()
-        
-        # 运行应用
-        sys.exit(app.exec_())
-        
-    except Exception as e:
-        QMessageBox.critical(None, "错误", f"启动失败: {e}")
-        sys.exit(1)
-
-
-if __name__ == '__main__':
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+主程序入口
+"""
+
+import os
+import sys
+import socket
+import logging
+import argparse
+import multiprocessing
+from PyQt5.QtWidgets import QApplication, QMessageBox, QSplashScreen
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPixmap, QFont
+
+from video_database import VideoDatabase
+from storage import STORES, DEFAULT_PATHS
+from download_manager import create_download_manager
+from proxy_server import ProxyServer
+from gui_window import MainWindow
+from logging_setup import setup_logging
+from tee_capture import TeeAdopter
+from metrics import MetricsServer
+
+logger = logging.getLogger(__name__)
+
+
+def get_local_ip():
+    """获取本机IP"""
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(('8.8.8.8', 80))
+        ip = s.getsockname()[0]
+        s.close()
+        return ip
+    except:
+        return '127.0.0.1'
+
+
+def parse_args():
+    """解析命令行参数"""
+    # 不接受缩写，拼错的参数（例如 --proxy-worker）直接报错
+    parser = argparse.ArgumentParser(description='微信视频号嗅探器 Pro', allow_abbrev=False)
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread',
+                        help='下载引擎: thread=线程池, async=asyncio单线程高并发')
+    parser.add_argument('--max-downloads', type=int, default=None,
+                        help='同时下载数（默认 thread=3, async=100）')
+    parser.add_argument('--intercept', choices=['video', 'all'], default='video',
+                        help='TLS解密范围: video=只解密视频域名, all=解密全部连接')
+    parser.add_argument('--proxy-workers', type=int, default=1,
+                        help='代理进程数，大于1时多个 mitmproxy 进程在同一个端口上接受连接，'
+                             '分担TLS和HTTP解析（多核CPU）')
+    parser.add_argument('--db-backend', choices=sorted(STORES), default='journal',
+                        help='数据库存储引擎: journal=追加日志(videos.json), sqlite=SQLite(videos.db)')
+    parser.add_argument('--tee', action='store_true',
+                        help='旁路写盘：手机播放视频时同时保存，不用再下载一遍')
+    parser.add_argument('--metrics-port', type=int, default=9108,
+                        help='Prometheus 监控指标端口（只监听127.0.0.1），0为关闭')
+    parser.add_argument('--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], type=str.upper,
+                        help='日志级别，DEBUG 会记录每一次捕获')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_logging(args.log_level)
+
+    logger.info("=" * 60)
+    logger.info("🎯 微信视频号嗅探器 Pro")
+    logger.info("=" * 60)
+
+    # 创建应用
+    app = QApplication(sys.argv)
+    app.setStyle('Fusion')
+
+    # 显示启动画面
+    splash = QSplashScreen()
+    splash.showMessage(
+        "正在启动...",
+        Qt.AlignCenter | Qt.AlignBottom,
+        Qt.white
+    )
+    splash.show()
+    app.processEvents()
+
+    try:
+        # 初始化数据库
+        splash.showMessage("初始化数据库...", Qt.AlignCenter | Qt.AlignBottom, Qt.white)
+        db = VideoDatabase(DEFAULT_PATHS[args.db_backend], backend=args.db_backend,
+                           durability='batched', commit_window=0.2)
+
+        # 初始化下载管理器
+        splash.showMessage("初始化下载管理器...", Qt.AlignCenter | Qt.AlignBottom, Qt.white)
+        download_manager = create_download_manager(args.engine, args.max_downloads)
+
+        # 初始化代理服务器
+        splash.showMessage("启动代理服务器...", Qt.AlignCenter | Qt.AlignBottom, Qt.white)
+
+        def on_video_captured(url, headers, meta=None):
+            """视频捕获回调"""
+            video = db.add_video(url, headers, meta)
+            if video and hasattr(window, 'video_captured'):
+                window.video_captured.emit(video)
+
+        tee = TeeAdopter(db, download_manager) if args.tee else None
+        proxy_options = dict(
+            port=8888,
+            callback=on_video_captured,
+            activity_callback=download_manager.limiter.note_proxy_activity,
+            selective=args.intercept == 'video',
+            tee_dir=os.path.join(download_manager.download_dir, 'tee') if tee else None,
+            tee_callback=tee.adopt if tee else None
+        )
+        if args.proxy_workers > 1:
+            # 只有多进程时才加载 multiprocessing 相关模块
+            from proxy_workers import ProxyWorkerPool
+            proxy_server = ProxyWorkerPool(workers=args.proxy_workers, **proxy_options)
+        else:
+            proxy_server = ProxyServer(**proxy_options)
+        proxy_server.start()
+
+        # 监控指标
+        if args.metrics_port:
+            MetricsServer(args.metrics_port).start()
+
+        # 创建主窗口
+        splash.showMessage("加载界面...", Qt.AlignCenter | Qt.AlignBottom, Qt.white)
+        window = MainWindow(db, download_manager, proxy_server)
+
+        # 显示使用说明
+        local_ip = get_local_ip()
+        window.add_log("=" * 40)
+        window.add_log("🎯 微信视频号嗅探器 Pro 已启动")
+        window.add_log("=" * 40)
+        window.add_log(f"📡 代理服务器: {local_ip}:8888")
+        window.add_log("📱 手机设置步骤:")
+        window.add_log("   1. WiFi设置 → 代理 → 手动")
+        window.add_log(f"   2. 服务器: {local_ip}")
+        window.add_log("   3. 端口: 8888")
+        window.add_log("   4. 安装证书: http://mitm.it")
+        window.add_log("=" * 40)
+        window.add_log("✅ 准备就绪，等待捕获视频...")
+
+        # 关闭启动画面
+        splash.finish(window)
+
+        # 显示主窗口
+        window.show()
+
+        # 运行应用
+        sys.exit(app.exec_())
+
+    except Exception as e:
+        QMessageBox.critical(None, "错误", f"启动失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    # 打包成exe后多进程代理用 spawn 启动子进程，必须最先调用
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
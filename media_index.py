@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+媒体去重模块 - 按内容(sha256)索引已下载的文件
+"""
+
+import os
+import json
+import hashlib
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """计算文件的sha256"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def link_file(src, dst):
+    """把 dst 原子地替换为 src 的硬链接，不支持硬链接时返回False"""
+    tmp_path = dst + '.link'
+    try:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        os.link(src, tmp_path)
+        os.replace(tmp_path, dst)
+        return True
+    except OSError:
+        return False
+
+
+def same_file(size, etag, other_size, other_etag):
+    """两次看到的大小/ETag 是否属于同一个文件：大小已知且相同，两边都有ETag时ETag也相同"""
+    if not size or size != other_size:
+        return False
+    return not (etag and other_etag and etag != other_etag)
+
+
+class MediaIndex:
+    """内容寻址的媒体索引
+
+    files 记录 sha256 → 文件；另外把 (大小, ETag) 和规范化URL映射到 sha256，
+    下载前据此判断是不是已经下载过的同一个文件，不必再下载一次。
+    规范化URL相同还要大小一致（两边都有ETag时ETag也一致）才复用，
+    避免只差被忽略参数的两个不同视频共用一个文件。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.files = {}     # {sha256: {'path': ..., 'size': ..., 'etag': ...}}
+        self.probes = {}    # {'大小:ETag': sha256}
+        self.urls = {}      # {规范化URL: sha256}
+        self.load()
+
+    def load(self):
+        """加载索引"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = data.get('files', {})
+            self.probes = data.get('probes', {})
+            self.urls = data.get('urls', {})
+        except Exception as e:
+            logger.error(f"❌ 加载媒体索引失败: {e}")
+
+    def save(self):
+        """原子地保存索引（调用方持有锁）"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'files': self.files,
+                'probes': self.probes,
+                'urls': self.urls
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def probe_key(size, etag):
+        """大小 + 强ETag 才足以认定是同一个文件"""
+        if not size or not etag or etag.startswith('W/'):
+            return None
+        return f'{size}:{etag}'
+
+    @staticmethod
+    def _same_probe(entry, size, etag):
+        """探测到的大小/ETag 与索引中的文件一致（大小未知时不能确认）"""
+        return same_file(size, etag, entry['size'], entry.get('etag'))
+
+    def find(self, canonical_url=None, size=0, etag=None):
+        """查找已下载的同一文件，返回 (sha256, 路径)，没有时返回None"""
+        with self.lock:
+            sha256 = self.urls.get(canonical_url) if canonical_url else None
+            if sha256 and sha256 in self.files and not self._same_probe(self.files[sha256], size, etag):
+                sha256 = None
+            if not sha256:
+                sha256 = self.probes.get(self.probe_key(size, etag))
+            entry = self.files.get(sha256) if sha256 else None
+            if not entry:
+                return None
+
+            # 文件被删除或改动过就不能复用
+            path = entry['path']
+            if not os.path.exists(path) or os.path.getsize(path) != entry['size']:
+                del self.files[sha256]
+                self.save()
+                return None
+            return sha256, path
+
+    def register(self, sha256, path, size, etag=None, canonical_url=None):
+        """记录下载完成的文件，内容已经存在于另一个文件时返回那个文件的路径"""
+        with self.lock:
+            entry = self.files.get(sha256)
+            existing = None
+            if entry and entry['path'] != path and os.path.exists(entry['path']) \
+                    and os.path.getsize(entry['path']) == entry['size']:
+                existing = entry['path']
+            else:
+                self.files[sha256] = {'path': path, 'size': size, 'etag': etag}
+
+            key = self.probe_key(size, etag)
+            if key:
+                self.probes[key] = sha256
+            if canonical_url:
+                self.urls[canonical_url] = sha256
+            self.save()
+            return existing
+
+    def get_stats(self):
+        """获取索引统计"""
+        with self.lock:
+            return {
+                'files': len(self.files),
+                'probes': len(self.probes),
+                'urls': len(self.urls)
+            }
\ No newline at end of file
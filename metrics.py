@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+监控指标模块 - 计数器、仪表、直方图，Prometheus 文本格式输出
+"""
+
+import logging
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 代理钩子、回调的耗时分布（秒）
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values, extra=None):
+    """{a="1",b="2"}"""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """指标基类：按标签值保存子指标，没有标签时就是自己"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.children = {}
+
+    def labels(self, *values):
+        """取标签值对应的子指标（按 labels 的顺序传值）"""
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} 需要标签 {self.label_names}")
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        """[(名称后缀, 标签文本, 值)]"""
+        if not self.label_names:
+            return self._child_samples(self, ())
+        result = []
+        for values, child in sorted(self.children.items()):
+            result += self._child_samples(child, values)
+        return result
+
+    def values(self):
+        """{标签值: 当前值}"""
+        if not self.label_names:
+            return {(): self._value(self)}
+        return {values: self._value(child) for values, child in list(self.children.items())}
+
+    def _new_child(self):
+        return type(self)(self.name, self.help)
+
+    def _value(self, child):
+        return child.get()
+
+    def _child_samples(self, child, values):
+        return [('', _format_labels(self.label_names, values), child.get())]
+
+
+class Counter(Metric):
+    """只增不减的计数"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        return self.value
+
+
+class Gauge(Metric):
+    """可增可减的当前值，也可以在导出时调用函数取值"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set_function(self, function):
+        """导出时调用 function() 取值（例如队列长度），平时没有开销"""
+        self.function = function
+
+    def get(self):
+        if self.function:
+            try:
+                return self.function()
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class Histogram(Metric):
+    """按桶累计的分布（例如耗时）"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)     # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self):
+        return Histogram(self.name, self.help, buckets=self.buckets)
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def merge(self, counts, total, count):
+        """加上另一个进程同样分桶的直方图增量"""
+        with self.lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.sum += total
+            self.count += count
+
+    def _value(self, child):
+        with child.lock:
+            return tuple(child.counts), child.sum, child.count
+
+    def _child_samples(self, child, values):
+        with child.lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        result = []
+        cumulative = 0
+        for bound, n in zip(child.buckets + (math.inf,), counts):
+            cumulative += n
+            labels = _format_labels(self.label_names, values, ('le', _format_value(float(bound))))
+            result.append(('_bucket', labels, cumulative))
+        labels = _format_labels(self.label_names, values)
+        result.append(('_sum', labels, total))
+        result.append(('_count', labels, count))
+        return result
+
+
+class Registry:
+    """指标注册表，同名指标只创建一次"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, labels, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, labels, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已经注册为 {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._get_or_create(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+    def export(self, prefixes=()):
+        """导出指标的当前值（可按名称前缀过滤），用于把子进程的指标发给主进程
+
+        {名称: {'kind', 'help', 'labels', 'buckets', 'values': {标签值: 值}}}，
+        直方图的值为 (各桶计数, 总和, 次数)。
+        """
+        with self.lock:
+            metrics = [m for m in self.metrics.values() if not prefixes or m.name.startswith(prefixes)]
+        return {
+            m.name: {
+                'kind': m.kind,
+                'help': m.help,
+                'labels': m.label_names,
+                'buckets': getattr(m, 'buckets', None),
+                'values': m.values()
+            }
+            for m in metrics
+        }
+
+    def merge(self, delta):
+        """把另一个进程的计数器、直方图增量（export_delta 的结果）加到同名指标上，仪表不处理"""
+        for name, info in delta.items():
+            if info['kind'] == 'counter':
+                metric = self.counter(name, info['help'], info['labels'])
+                for values, amount in info['values'].items():
+                    (metric.labels(*values) if values else metric).inc(amount)
+            elif info['kind'] == 'histogram':
+                metric = self.histogram(name, info['help'], info['labels'], info['buckets'])
+                for values, (counts, total, count) in info['values'].items():
+                    (metric.labels(*values) if values else metric).merge(counts, total, count)
+
+    def render(self):
+        """Prometheus 文本格式"""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def export_delta(previous, current):
+    """两次 export 之间的变化：计数器和直方图为增量（没有变化的省略），仪表为当前值"""
+    delta = {}
+    for name, info in current.items():
+        old = previous.get(name, {}).get('values', {})
+        values = {}
+        for key, value in info['values'].items():
+            before = old.get(key)
+            if info['kind'] == 'counter':
+                value -= before or 0
+                if not value:
+                    continue
+            elif info['kind'] == 'histogram':
+                if before:
+                    value = (tuple(a - b for a, b in zip(value[0], before[0])),
+                             value[1] - before[1], value[2] - before[2])
+                if not value[2]:
+                    continue
+            values[key] = value
+        delta[name] = dict(info, values=values)
+    return delta
+
+
+def counter(name, help_text, labels=()):
+    """在默认注册表中创建（或取得）计数器"""
+    return REGISTRY.counter(name, help_text, labels)
+
+
+def gauge(name, help_text, labels=()):
+    """在默认注册表中创建（或取得）仪表"""
+    return REGISTRY.gauge(name, help_text, labels)
+
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    """在默认注册表中创建（或取得）直方图"""
+    return REGISTRY.histogram(name, help_text, labels, buckets)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics 返回全部指标"""
+
+    registry = REGISTRY
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """在后台线程中提供 http://host:port/metrics"""
+
+    def __init__(self, port=9108, host='127.0.0.1', registry=None):
+        self.port = port
+        self.host = host
+        self.registry = registry or REGISTRY
+        self.server = None
+
+    def start(self):
+        """启动HTTP服务，端口被占用时只记录错误"""
+        handler = type('Handler', (MetricsHandler,), {'registry': self.registry})
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            logger.error(f"❌ 监控指标服务启动失败: {e}")
+            return False
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"📊 监控指标: http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        """停止HTTP服务"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
\ No newline at end of file
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载进度事件模块 - 发布/订阅
+"""
+
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBus:
+    """下载进度事件总线
+
+    下载任务在自己的线程里发布事件（内容与 DownloadTask.get_info() 相同），
+    订阅者在发布线程中被调用，需要自己切换到界面线程（例如发送Qt信号）。
+    同一任务的进度事件每秒最多 max_rate 次，状态变化的事件总是发布。
+    """
+
+    def __init__(self, max_rate=10):
+        self.min_interval = 1.0 / max_rate if max_rate else 0
+        self.subscribers = []
+        self.lock = Lock()
+        self.published = 0
+
+    def subscribe(self, callback):
+        """订阅进度事件，callback(event)"""
+        with self.lock:
+            self.subscribers = self.subscribers + [callback]
+        return callback
+
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        with self.lock:
+            self.subscribers = [c for c in self.subscribers if c is not callback]
+
+    def publish(self, event):
+        """发布事件"""
+        self.published += 1
+        for callback in self.subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"❌ 进度事件处理失败: {e}")
+
+
+class SpeedMeter:
+    """EWMA平滑的速度和剩余时间
+
+    每隔 interval 秒取一次瞬时速度，按 alpha 做指数加权平均，
+    避免分块到达不均匀时速度数字来回跳。
+    """
+
+    def __init__(self, alpha=0.3, interval=0.5):
+        self.alpha = alpha
+        self.interval = interval
+        self.speed = 0.0
+        self.last_time = 0.0
+        self.last_size = 0
+
+    def reset(self, size, now):
+        """重新开始取样（续传、重试时），保留之前的平均速度"""
+        self.last_time = now
+        self.last_size = size
+
+    def update(self, size, now):
+        """记录当前已下载的字节数，返回速度是否更新"""
+        elapsed = now - self.last_time
+        if elapsed < self.interval:
+            return False
+        sample = (size - self.last_size) / elapsed
+        if self.speed:
+            self.speed = self.alpha * sample + (1 - self.alpha) * self.speed
+        else:
+            self.speed = sample
+        self.last_time = now
+        self.last_size = size
+        return True
+
+    def eta(self, remaining):
+        """剩余秒数，无法估计时返回None"""
+        if remaining <= 0 or self.speed <= 0:
+            return None
+        return remaining / self.speed
\ No newline at end of file
@@ -1,96 +1,332 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-代理服务器模块 - 使用mitmproxy
-"""
-
-import asyncio
-import threading
-from mitmproxy import http
-from mitmproxy.tools.main import mitmdump
-from utils import is_video_url
-
-
-class ProxyServer:
-    def __init__(self, port=8888, callback=None):
-        self.port = port
-        self.callback = callback
-        self.is_running = False
-        self.thread = None
-    
-    def start(self):
-        """启动代理服务器"""
-        if self.is_running:
-            return
-        
-        self.is_running = True
-        self.thread = threading.Thread(target=self._run_proxy, daemon=True)
-        self.thread.start()
-        print(f"✅ 代理服务器启动: 0.0.0.0:{self.port}")
-    
-    def stop(self):
-        """停止代理服务器"""
-        self.is_running = False
-        print("⏹️ 代理服务器已停止")
-    
-    def _run_proxy(self):
-        """运行代理（在独立线程中）"""
-        try:
-            # 创建addon实例
-            addon = VideoSnifferAddon(self.callback)
-            
-            # 启动mitmdump
-            asyncio.run(self._async_run(addon))
-        except Exception as e:
-            print(f"❌ 代理服务器错误: {e}")
-            self.is_running = False
-    
-    async def _async_run(self, addon):
-        """异步运行mitmdump"""
-        from mitmproxy.tools.main import mitmdump
-        
-        # mitmdump 配置
-        opts = [
-            '--listen-host', '0.0.0.0',
-            '--listen-port', str(self.port),
-            '--ssl-insecure',  # 忽略SSL错误
-            '--set', 'block_global=false',
-            '-q'  # 安静模式
-        ]
-        
-        # 运行mitmdump
-        await mitmdump(opts, [addon])
-
-
-class VideoSnifferAddon:
-    """mitmproxy插件 - 嗅探视频URL"""
-    
-    def __init__(self, callback=None):
-        self.callback = callback
-    
-    def request(self, flow: http.HTTPFlow):
-        """处理HTTP请求"""
-        url = flow.request.url
-        
-        # 检查是否是视频URL
-        if is_video_url(url):
-            print(f"✅ 捕获视频: {url}")
-            
-            # 提取请求头
-            headers = {
-                'Referer': flow.request.headers.get('Referer', ''),
-                'User-Agent': flow.request.headers.get('User-Agent', ''),
-                'Host': flow.request.headers.get('Host', '')
-            }
-            
-            # 回调通知
-            if self.callback:
-                try:
-                    self.callback(url, headers)
-                except Exception as e:
-                    print(f"回调错误: {e}")
-    
-    def response(self, flow: http.HTTPFlow):
-        """处理HTTP响应（可用于获取文件大小等）"""
-        pass
\ No newline at end of file
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+代理服务器模块 - 使用mitmproxy
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urljoin
+from mitmproxy import http
+from mitmproxy.options import Options
+from mitmproxy.tools.dump import DumpMaster
+from capture_queue import CaptureQueue, DROP_OLDEST
+from metrics import counter, gauge, histogram
+from tee_capture import VideoTee
+from resumable import parse_content_range
+from url_classifier import default_classifier
+
+logger = logging.getLogger(__name__)
+
+ONBOARDING_HOST = 'mitm.it'
+CAPTURE_KEY = 'video_sniffer.capture'   # flow.metadata 中的标记：请求是视频URL
+ACTIVE_KEY = 'video_sniffer.active'     # flow.metadata 中的标记：计入了进行中的请求数
+CAPTURE_STATUS = (200, 206)             # 只有这些状态码的响应体是视频数据
+MAX_REDIRECTS = 256                     # 最多记住多少个视频URL的跳转目标
+
+FLOWS = counter('sniffer_flows_total', '经过解密的HTTP请求数')
+CLASSIFIED = counter('sniffer_classified_total', 'URL分类结果', ['result'])
+CAPTURES = counter('sniffer_captures_total', '记录的视频捕获数')
+REJECTED = counter('sniffer_rejected_total', 'Content-Type不是视频而丢弃的响应数')
+CALLBACK_ERRORS = counter('sniffer_callback_errors_total', '捕获回调出错次数')
+HOOK_SECONDS = histogram('sniffer_hook_seconds', '插件钩子耗时（秒）', ['hook'])
+ACTIVE_FLOWS = gauge('sniffer_active_flows', '进行中的HTTP请求数')
+ACTIVE_CONNECTIONS = gauge('sniffer_active_connections', '客户端连接数（包括不解密的）')
+
+
+class ProxyServer:
+    def __init__(self, port=8888, callback=None, activity_callback=None, classifier=None,
+                 queue_size=1000, overflow=DROP_OLDEST, selective=True,
+                 tee_dir=None, tee_callback=None, host='0.0.0.0', sock=None):
+        # sock: 已经在监听的套接字（多进程时由主进程创建，所有工作进程在上面接受连接）
+        self.sock = sock
+        if sock:
+            host, port = sock.getsockname()[:2]
+        self.port = port
+        self.host = host
+        self.callback = callback
+        self.activity_callback = activity_callback  # 每个代理请求都会调用（用于下载让出带宽）
+        self.classifier = classifier or default_classifier
+        # callback 可能写磁盘，放到捕获队列的消费线程里调用，不阻塞代理的事件循环
+        self.captures = CaptureQueue(callback, queue_size, overflow) if callback else None
+        # selective=True 时只解密视频域名的TLS连接，其他连接原样转发
+        self.selective = selective
+        # 旁路写盘：视频经过代理时保存到 tee_dir，结束后 tee_callback(url, headers, info) 接手
+        self.tee = None
+        if tee_dir and tee_callback and self.captures:
+            self.tee = VideoTee(
+                tee_dir,
+                lambda url, headers, info: self.captures.put(url, headers, info, handler=tee_callback)
+            )
+            gauge('sniffer_tee_active', '正在旁路写盘的响应数').set_function(lambda: len(self.tee.active))
+        self.is_running = False
+        self.thread = None
+        self.master = None
+        self.addon = None
+
+    def start(self):
+        """启动代理服务器"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        if self.captures:
+            self.captures.start()
+        self.thread = threading.Thread(target=self._run_proxy, daemon=True)
+        self.thread.start()
+        scope = '只解密视频域名' if self.selective else '解密全部连接'
+        logger.info(f"✅ 代理服务器启动: {self.host}:{self.port}（{scope}）")
+
+    def stop(self):
+        """停止代理服务器"""
+        self.is_running = False
+        master = self.master
+        if master:
+            master.shutdown()
+        if self.thread:
+            self.thread.join(5)
+        if self.tee:
+            self.tee.flush()
+        if self.captures:
+            self.captures.stop()
+        # 事件循环已经结束，不会再有 client_disconnected/response 来减少计数
+        ACTIVE_CONNECTIONS.set(0)
+        ACTIVE_FLOWS.set(0)
+        logger.info("⏹️ 代理服务器已停止")
+
+    def set_intercept_scope(self, selective=None, classifier=None):
+        """运行时修改解密范围（只对之后建立的连接生效）"""
+        if classifier:
+            self.classifier = classifier
+            if self.addon:
+                self.addon.classifier = classifier
+        if selective is not None:
+            self.selective = selective
+
+        master = self.master
+        if master:
+            options = self._intercept_options()
+            master.event_loop.call_soon_threadsafe(lambda: master.options.update(**options))
+        logger.info(f"🔐 解密范围: {', '.join(self.classifier.domains) if self.selective else '全部'}")
+
+    def _intercept_options(self):
+        """allow_hosts 以外的连接不解密，直接转发TCP数据"""
+        if not self.selective:
+            return {'allow_hosts': []}
+        # 证书安装页面 mitm.it 也要经过 mitmproxy
+        return {'allow_hosts': [self.classifier.host_pattern([ONBOARDING_HOST])]}
+
+    def _run_proxy(self):
+        """运行代理（在独立线程中）"""
+        try:
+            # 创建addon实例
+            self.addon = VideoSnifferAddon(
+                self.captures.put if self.captures else None,
+                self.activity_callback, self.classifier, self.tee
+            )
+
+            asyncio.run(self._async_run(self.addon))
+        except Exception as e:
+            logger.error(f"❌ 代理服务器错误: {e}")
+        finally:
+            self.master = None
+            self.is_running = False
+
+    async def _async_run(self, addon):
+        """在当前事件循环中运行 mitmproxy"""
+        options = Options(
+            # 使用共用的套接字时 mitmproxy 自己只监听一个本机的随机端口
+            listen_host='127.0.0.1' if self.sock else self.host,
+            listen_port=0 if self.sock else self.port,
+            ssl_insecure=True  # 忽略SSL错误
+        )
+        master = DumpMaster(options, with_termlog=False, with_dumper=False)
+        # 安静模式：mitmproxy 每个连接都会记录INFO日志
+        logging.getLogger('mitmproxy').setLevel(logging.WARNING)
+        master.options.update(block_global=False, **self._intercept_options())
+        master.addons.add(addon)
+        if self.sock:
+            master.addons.add(SharedListener(master, self.sock))
+
+        self.master = master
+        if not self.is_running:
+            # start() 之后马上 stop() 了
+            return
+        await master.run()
+
+
+class SharedListener:
+    """mitmproxy插件 - 在传入的监听套接字上接受连接，交给 mitmproxy 的常规代理处理
+
+    多个进程在同一个套接字上接受连接，由内核把连接分给空闲的进程，数据不再经过其他进程。
+    """
+
+    def __init__(self, master, sock):
+        self.master = master
+        self.sock = sock
+        self.server = None
+
+    async def running(self):
+        """mitmproxy 的代理服务已经建立"""
+        instance = next(iter(self.master.addons.get('proxyserver').servers))
+        self.server = await asyncio.start_server(instance.handle_stream, sock=self.sock)
+
+    def done(self):
+        if self.server:
+            self.server.close()
+
+
+class VideoSnifferAddon:
+    """mitmproxy插件 - 嗅探视频URL"""
+
+    def __init__(self, callback=None, activity_callback=None, classifier=None, tee=None):
+        self.callback = callback
+        self.activity_callback = activity_callback
+        self.classifier = classifier or default_classifier
+        self.tee = tee
+        self.rejected = 0   # 因 Content-Type 或状态码不对而丢弃的捕获数
+        # 视频URL返回3xx时记下跳转目标，客户端跟随跳转的请求也当作视频URL
+        self.redirects = OrderedDict()
+
+        self.video_count = CLASSIFIED.labels('video')
+        self.other_count = CLASSIFIED.labels('other')
+        self.request_seconds = HOOK_SECONDS.labels('request')
+        self.responseheaders_seconds = HOOK_SECONDS.labels('responseheaders')
+
+    def client_connected(self, client):
+        """新的客户端连接（不解密的连接没有 request 事件，在这里记录代理活动）"""
+        ACTIVE_CONNECTIONS.inc()
+        if self.activity_callback:
+            self.activity_callback()
+
+    def client_disconnected(self, client):
+        """客户端连接关闭"""
+        ACTIVE_CONNECTIONS.dec()
+
+    def request(self, flow: http.HTTPFlow):
+        """处理HTTP请求：视频URL先做标记，等响应头到达后再记录"""
+        start = time.perf_counter()
+        FLOWS.inc()
+        ACTIVE_FLOWS.inc()
+        flow.metadata[ACTIVE_KEY] = True
+        if self.activity_callback:
+            self.activity_callback()
+
+        url = flow.request.url
+        if self.redirects.pop(url, None) or self.classifier.is_video_url(url):
+            flow.metadata[CAPTURE_KEY] = True
+            self.video_count.inc()
+        else:
+            self.other_count.inc()
+        self.request_seconds.observe(time.perf_counter() - start)
+
+    def responseheaders(self, flow: http.HTTPFlow):
+        """响应头到达（响应体还没有传输）：记录大小、类型、ETag等，丢弃非媒体响应
+
+        3xx 不记录，标记转给跳转后的请求；其他不是 200/206 的响应（403、404等）
+        即使 Content-Type 是视频也不是视频数据，直接丢弃。
+        """
+        if not flow.metadata.pop(CAPTURE_KEY, False):
+            return
+        start = time.perf_counter()
+
+        status = flow.response.status_code
+        meta = response_metadata(flow.response)
+        if 300 <= status < 400:
+            self._follow_redirect(flow)
+        elif status not in CAPTURE_STATUS or not self.classifier.is_media_type(meta['content_type']):
+            self.rejected += 1
+            REJECTED.inc()
+            logger.debug("丢弃非媒体响应: %s (%s %s)", flow.request.url, status, meta['content_type'])
+        else:
+            headers = self._capture(flow, meta)
+
+            # 视频响应体直接转发，不在内存中缓存；开启旁路写盘时同时保存到磁盘
+            if not (self.tee and self._tee(flow, headers, meta)):
+                flow.response.stream = True
+        self.responseheaders_seconds.observe(time.perf_counter() - start)
+
+    def response(self, flow: http.HTTPFlow):
+        """响应结束"""
+        if flow.metadata.pop(ACTIVE_KEY, False):
+            ACTIVE_FLOWS.dec()
+
+    def error(self, flow: http.HTTPFlow):
+        """没有收到响应（连接中断等）时仍然记录URL"""
+        if flow.metadata.pop(ACTIVE_KEY, False):
+            ACTIVE_FLOWS.dec()
+        if flow.metadata.pop(CAPTURE_KEY, False):
+            self._capture(flow, None)
+        if self.tee:
+            self.tee.abort(flow)
+
+    def _follow_redirect(self, flow):
+        """记下视频URL的跳转目标（304 等没有 Location 的响应直接忽略）"""
+        location = flow.response.headers.get('Location')
+        if not location:
+            return
+        self.redirects[urljoin(flow.request.url, location)] = True
+        while len(self.redirects) > MAX_REDIRECTS:
+            self.redirects.popitem(last=False)
+
+    def _tee(self, flow, headers, meta):
+        """开始旁路写盘，返回是否成功"""
+        try:
+            return self.tee.attach(flow, headers, meta)
+        except OSError as e:
+            logger.error(f"❌ 旁路写盘失败: {e}")
+            return False
+
+    def _capture(self, flow, meta):
+        """记录捕获的视频"""
+        url = flow.request.url
+        # 每次捕获都会记录，默认的INFO级别下不输出
+        logger.debug("捕获视频: %s", url)
+
+        # 提取请求头
+        headers = {
+            'Referer': flow.request.headers.get('Referer', ''),
+            'User-Agent': flow.request.headers.get('User-Agent', ''),
+            'Host': flow.request.headers.get('Host', '')
+        }
+
+        # 回调通知
+        CAPTURES.inc()
+        if self.callback:
+            try:
+                self.callback(url, headers, meta)
+            except Exception as e:
+                CALLBACK_ERRORS.inc()
+                logger.error(f"❌ 回调错误: {e}")
+        return headers
+
+
+def response_metadata(response):
+    """从响应头提取下载需要的信息
+
+    total_size 对 206 响应取 Content-Range 中的完整大小；
+    有内容编码时 Content-Length 不是文件大小，记为0。
+    """
+    headers = response.headers
+    content_range = parse_content_range(headers.get('Content-Range'))
+    encoding = headers.get('Content-Encoding', 'identity').lower()
+    total_size = 0
+    if response.status_code == 206 and content_range:
+        total_size = content_range[2]
+    elif response.status_code == 200 and encoding in ('', 'identity'):
+        try:
+            total_size = int(headers.get('Content-Length', 0))
+        except ValueError:
+            pass
+    return {
+        'status_code': response.status_code,
+        'content_type': headers.get('Content-Type', '').split(';')[0].strip().lower(),
+        'total_size': total_size,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'accept_ranges': bool(content_range) or headers.get('Accept-Ranges', '').lower() == 'bytes'
+    }
\ No newline at end of file
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多进程代理模块 - 多个 mitmproxy 工作进程共用一个监听套接字
+"""
+
+import sys
+import time
+import signal
+import socket
+import logging
+import logging.handlers
+import multiprocessing
+import threading
+from queue import Empty, Full
+from capture_queue import CaptureQueue, DROP_OLDEST
+from metrics import REGISTRY, counter, gauge, export_delta
+from resumable import backoff_delay
+from url_classifier import UrlClassifier, default_classifier
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_INTERVAL = 0.5     # 工作进程最多每0.5秒报告一次代理活动
+STABLE_SECONDS = 30         # 运行超过30秒后退出不算连续崩溃
+# 工作进程每秒把这些指标的变化发回主进程，由主进程的 /metrics 汇总输出
+# （工作进程自己的捕获队列只是转发，不计入，主进程的捕获队列指标是完整的）
+FORWARDED_METRICS = ('sniffer_', 'proxy_worker_events_')
+
+WORKER_RESTARTS = counter('proxy_worker_restarts_total', '意外退出后重启的代理子进程数')
+WORKERS_ALIVE = gauge('proxy_workers_alive', '运行中的代理工作进程数')
+EVENTS_DROPPED = counter('proxy_worker_events_dropped_total', '进程间队列满时丢弃的捕获数')
+
+
+class ProxyWorkerPool:
+    """多进程代理，接口与 ProxyServer 相同
+
+    本进程监听 host:port，把监听套接字传给 N 个工作进程；工作进程都在这个套接字上接受连接，
+    由内核分给空闲的进程，连接的数据直接由接受它的工作进程处理，TLS和HTTP解析分摊到多个CPU核。
+    工作进程重启时监听套接字一直由本进程持有，新连接由其他工作进程接受。
+    旁路写盘的文件都写在同一个 tee_dir 中，同一个视频同时只由一个进程写。
+    工作进程捕获的视频、旁路写盘结果和日志通过进程间队列发回本进程，
+    callback 只在本进程的捕获队列消费线程中调用，数据库只在本进程中打开。
+    子进程意外退出时自动重启，连续崩溃时按指数退避等待。
+    被杀死的进程可能还占着队列的锁，所以每次启动子进程都换用新的队列。
+    工作进程的代理指标每秒发回一次：计数器、直方图累加到本进程的同名指标，仪表为各进程之和。
+    """
+
+    def __init__(self, workers=2, port=8888, callback=None, activity_callback=None, classifier=None,
+                 queue_size=1000, overflow=DROP_OLDEST, selective=True,
+                 tee_dir=None, tee_callback=None, host='0.0.0.0'):
+        self.worker_count = max(1, workers)
+        self.port = port
+        self.host = host
+        self.activity_callback = activity_callback
+        self.classifier = classifier or default_classifier
+        self.selective = selective
+        self.tee_dir = tee_dir if tee_callback and callback else None
+        self.tee_callback = tee_callback
+        self.captures = CaptureQueue(callback, queue_size, overflow) if callback else None
+
+        self.queue_size = queue_size
+        self.context = multiprocessing.get_context('spawn')
+        self.listener = None    # 所有工作进程共用的监听套接字
+
+        slots = self.worker_count
+        self.processes = [None] * slots
+        self.channels = [None] * slots      # 工作进程 → 本进程的事件队列
+        self.controls = [None] * slots      # 本进程 → 工作进程的控制队列
+        self.started_at = [0.0] * slots
+        self.crashes = [0] * slots
+        self.next_start = [0.0] * slots
+
+        self.is_running = False
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.readers = []
+        self.supervisor = None
+        self.worker_gauges = {}     # {槽位: {指标名: {标签值: 值}}}
+        self.summed_gauges = set()  # 已改为各进程求和的 (指标名, 标签值)
+        WORKERS_ALIVE.set_function(self.alive_workers)
+
+    def start(self):
+        """打开监听套接字，启动工作进程和本进程中的接收、监督线程"""
+        if self.is_running:
+            return
+
+        try:
+            # Windows 上 SO_REUSEADDR 允许别的进程抢占同一端口，create_server 只在 POSIX 上打开
+            self.listener = socket.create_server((self.host, self.port))
+        except OSError as e:
+            logger.error(f"❌ 代理服务器错误: {e}")
+            return
+
+        self.is_running = True
+        self.stop_event.clear()
+        if self.captures:
+            self.captures.start()
+
+        with self.lock:
+            for slot in range(len(self.processes)):
+                self._spawn(slot)
+
+        self.supervisor = threading.Thread(target=self._supervise, daemon=True)
+        self.supervisor.start()
+
+        scope = '只解密视频域名' if self.selective else '解密全部连接'
+        logger.info(f"✅ 代理服务器启动: {self.host}:{self.port}（{self.worker_count}个进程，{scope}）")
+
+    def stop(self):
+        """停止所有子进程，处理完已收到的捕获"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        self.stop_event.set()
+        if self.supervisor:
+            self.supervisor.join()
+
+        # 工作进程收到 stop 后会交出旁路写盘中的文件再退出
+        for control in self.controls:
+            control.put(('stop',))
+        for process in self.processes:
+            process.join(10)
+            if process.is_alive():
+                process.terminate()
+                process.join(1)
+
+        # 子进程都已退出，队列里剩下的事件处理完后接收线程结束
+        for channel in self.channels:
+            channel.put(None)
+        for reader in self.readers:
+            reader.join(10)
+        self.readers = []
+        self.listener.close()
+        self.listener = None
+        self.worker_gauges.clear()
+        if self.captures:
+            self.captures.stop()
+        logger.info("⏹️ 代理服务器已停止")
+
+    def set_intercept_scope(self, selective=None, classifier=None):
+        """运行时修改所有工作进程的解密范围"""
+        if classifier:
+            self.classifier = classifier
+        if selective is not None:
+            self.selective = selective
+        with self.lock:
+            for control in self.controls:
+                if control is not None:
+                    control.put(('scope', selective, classifier.rules if classifier else None))
+        logger.info(f"🔐 解密范围: {', '.join(self.classifier.domains) if self.selective else '全部'}")
+
+    def alive_workers(self):
+        """运行中的工作进程数"""
+        return sum(1 for p in self.processes if p is not None and p.is_alive())
+
+    def _spawn(self, slot):
+        """启动一个工作进程和它的接收线程（调用方持有锁）"""
+        channel = self.context.Queue(self.queue_size)
+        config = {
+            'rules': self.classifier.rules,
+            'selective': self.selective,
+            'tee_dir': self.tee_dir,
+            'log_level': logging.getLogger().getEffectiveLevel()
+        }
+        self.controls[slot] = self.context.Queue()
+        # 监听套接字随参数复制到子进程中
+        process = self.context.Process(
+            target=_run_worker,
+            args=(self.listener, config, channel, self.controls[slot]),
+            name=f'proxy-worker-{slot}', daemon=True
+        )
+        process.start()
+        self.processes[slot] = process
+        self.channels[slot] = channel
+        self.started_at[slot] = time.monotonic()
+
+        reader = threading.Thread(target=self._read_events, args=(slot, channel), daemon=True)
+        reader.start()
+        self.readers = [r for r in self.readers if r.is_alive()] + [reader]
+
+    def _supervise(self):
+        """监督线程：重启意外退出的子进程"""
+        while not self.stop_event.wait(1.0):
+            now = time.monotonic()
+            with self.lock:
+                for slot, process in enumerate(self.processes):
+                    if process is None or process.is_alive() or not self.is_running:
+                        continue
+                    if self.next_start[slot] == 0:
+                        self.worker_gauges.pop(slot, None)
+                        # 刚发现退出：运行时间很短就退出算连续崩溃，重启前等待更久
+                        if now - self.started_at[slot] < STABLE_SECONDS:
+                            self.crashes[slot] += 1
+                        else:
+                            self.crashes[slot] = 0
+                        delay = backoff_delay(self.crashes[slot]) if self.crashes[slot] else 0
+                        self.next_start[slot] = now + delay
+                        logger.warning(f"⚠️ 代理子进程 {process.name} 退出（代码 {process.exitcode}），"
+                                       f"{delay:.1f}秒后重启")
+                    if now >= self.next_start[slot]:
+                        self.next_start[slot] = 0
+                        WORKER_RESTARTS.inc()
+                        self._spawn(slot)
+
+    def _read_events(self, slot, channel):
+        """接收线程：把一个子进程发来的事件交给捕获队列"""
+        while True:
+            try:
+                event = channel.get(timeout=1.0)
+            except Empty:
+                if self.channels[slot] is not channel:
+                    return      # 子进程已经重启，换了新队列
+                continue
+            if event is None:
+                return
+
+            kind = event[0]
+            try:
+                if kind == 'log':
+                    record = event[1]
+                    logging.getLogger(record.name).handle(record)
+                elif kind == 'capture' and self.captures:
+                    self.captures.put(*event[1:])
+                elif kind == 'tee' and self.captures:
+                    self.captures.put(*event[1:], handler=self.tee_callback)
+                elif kind == 'activity' and self.activity_callback:
+                    self.activity_callback()
+                elif kind == 'metrics':
+                    self._merge_metrics(slot, event[1])
+            except Exception as e:
+                logger.error(f"❌ 处理代理进程事件失败: {e}")
+
+
+    def _merge_metrics(self, slot, delta):
+        """合并一个工作进程的指标变化"""
+        REGISTRY.merge(delta)
+        gauges = {name: info for name, info in delta.items() if info['kind'] == 'gauge'}
+        self.worker_gauges[slot] = {name: info['values'] for name, info in gauges.items()}
+        for name, info in gauges.items():
+            metric = gauge(name, info['help'], info['labels'])
+            for values in info['values']:
+                if (name, values) not in self.summed_gauges:
+                    self.summed_gauges.add((name, values))
+                    child = metric.labels(*values) if values else metric
+                    child.set_function(lambda name=name, values=values: self._gauge_sum(name, values))
+
+    def _gauge_sum(self, name, values):
+        """运行中的工作进程上报的仪表值之和"""
+        return sum(gauges.get(name, {}).get(values, 0) for gauges in list(self.worker_gauges.values()))
+
+
+class _EventSender:
+    """子进程中：把捕获、旁路写盘结果和日志放进进程间队列，队列满时丢弃
+
+    同时作为子进程日志 QueueHandler 的队列，日志记录在本进程中交给同名的 logger。
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.last_activity = 0.0
+        self.reported = {}      # 上次发给主进程的指标值
+
+    def capture(self, url, headers, meta=None):
+        self._send(('capture', url, headers, meta))
+
+    def tee(self, url, headers, info):
+        self._send(('tee', url, headers, info))
+
+    def activity(self):
+        now = time.monotonic()
+        if now - self.last_activity >= ACTIVITY_INTERVAL:
+            self.last_activity = now
+            self._send(('activity',))
+
+    def put_nowait(self, record):
+        self._send(('log', record))
+
+    def report_metrics(self):
+        """把代理指标自上次以来的变化发给主进程（队列满时下次一起发）"""
+        current = REGISTRY.export(FORWARDED_METRICS)
+        if self._send(('metrics', export_delta(self.reported, current))):
+            self.reported = current
+
+    def _send(self, event):
+        try:
+            self.events.put_nowait(event)
+            return True
+        except Full:
+            EVENTS_DROPPED.inc()
+            return False
+
+
+def _setup_child_logging(sender, level=logging.INFO):
+    """子进程的日志全部发回主进程；Ctrl+C 由主进程处理，再通知子进程退出"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(sender))
+    root.setLevel(level)
+
+
+def _run_worker(sock, config, channel, control):
+    """工作进程入口"""
+    sender = _EventSender(channel)
+    _setup_child_logging(sender, config['log_level'])
+    from proxy_server import ProxyServer
+
+    server = ProxyServer(
+        sock=sock,
+        callback=sender.capture,
+        activity_callback=sender.activity,
+        classifier=UrlClassifier(**config['rules']),
+        selective=config['selective'],
+        tee_dir=config['tee_dir'],
+        tee_callback=sender.tee if config['tee_dir'] else None
+    )
+    server.start()
+
+    while True:
+        try:
+            message = control.get(timeout=1.0)
+        except Empty:
+            if not server.is_running:
+                # mitmproxy 出错退出（例如端口被占用），由主进程重启
+                sys.exit(1)
+            sender.report_metrics()
+            continue
+        if message[0] == 'stop':
+            break
+        if message[0] == 'scope':
+            _, selective, rules = message
+            server.set_intercept_scope(
+                selective=selective,
+                classifier=UrlClassifier(**rules) if rules else None
+            )
+    server.stop()
+    sender.report_metrics()
\ No newline at end of file
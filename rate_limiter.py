@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+限速模块 - 令牌桶
+"""
+
+import time
+from threading import Lock
+
+
+class TokenBucket:
+    """令牌桶（速率为0表示不限速）
+
+    允许令牌透支：一次取走整块数据对应的令牌，再按欠额计算需要等待的时间，
+    所以即使每块1MB、限速很低也能保证平均速率准确，而且只需要sleep一次。
+    """
+
+    def __init__(self, rate=0, burst_seconds=1.0):
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self.tokens = 0.0
+        self.last_time = time.monotonic()
+        self.lock = Lock()
+
+    def set_rate(self, rate):
+        """调整速率"""
+        with self.lock:
+            self._refill()
+            self.rate = rate
+            if rate:
+                self.tokens = min(self.tokens, rate * self.burst_seconds)
+
+    def reserve(self, size):
+        """取走 size 个令牌，返回需要等待的秒数"""
+        with self.lock:
+            if not self.rate:
+                return 0.0
+            self._refill()
+            self.tokens -= size
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def _refill(self):
+        """按经过的时间补充令牌（调用方持有锁）"""
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.tokens + (now - self.last_time) * self.rate,
+                              self.rate * self.burst_seconds)
+        self.last_time = now
+
+
+class BandwidthLimiter:
+    """下载限速器
+
+    全局、每个主机、每个任务三级令牌桶，取最长的等待时间。
+    代理优先模式下，最近有代理流量时下载总速率降到 link_rate - reserve_rate，
+    给手机通过代理浏览留出带宽。
+    """
+
+    def __init__(self, global_rate=0, host_rate=0, task_rate=0):
+        self.global_bucket = TokenBucket(global_rate)
+        self.global_rate = global_rate
+        self.host_rate = host_rate          # 新主机默认限速
+        self.host_rates = {}                # {host: rate} 单独设置的主机限速
+        self.host_buckets = {}              # {host: TokenBucket}
+        self.task_rate = task_rate          # 新任务默认限速
+        self.lock = Lock()
+
+        # 代理优先模式
+        self.link_rate = 0
+        self.reserve_rate = 0
+        self.proxy_idle_timeout = 5
+        self.last_proxy_activity = 0
+
+    def set_global_rate(self, rate):
+        """设置全局限速（字节/秒，0为不限速）"""
+        with self.lock:
+            self.global_rate = rate
+            self._apply_global_rate()
+
+    def set_host_rate(self, rate, host=None):
+        """设置主机限速，host为None时修改所有主机的默认值"""
+        with self.lock:
+            if host is None:
+                self.host_rate = rate
+                for name, bucket in self.host_buckets.items():
+                    if name not in self.host_rates:
+                        bucket.set_rate(rate)
+            else:
+                self.host_rates[host] = rate
+                if host in self.host_buckets:
+                    self.host_buckets[host].set_rate(rate)
+
+    def set_task_rate(self, task, rate):
+        """设置单个任务的限速"""
+        task.rate_bucket.set_rate(rate)
+
+    def new_task_bucket(self):
+        """为新任务创建令牌桶"""
+        return TokenBucket(self.task_rate)
+
+    def set_proxy_headroom(self, link_rate, reserve_rate, idle_timeout=5):
+        """代理优先模式: link_rate 为上行带宽，reserve_rate 为代理预留带宽（0为关闭）"""
+        with self.lock:
+            self.link_rate = link_rate
+            self.reserve_rate = reserve_rate
+            self.proxy_idle_timeout = idle_timeout
+            self._apply_global_rate()
+
+    def note_proxy_activity(self):
+        """代理有流量时调用"""
+        now = time.monotonic()
+        if self.reserve_rate and now - self.last_proxy_activity > 1:
+            self.last_proxy_activity = now
+            with self.lock:
+                self._apply_global_rate()
+        else:
+            self.last_proxy_activity = now
+
+    def reserve(self, task, host, size):
+        """下载了 size 字节后调用，返回需要等待的秒数"""
+        if self.reserve_rate:
+            self._check_proxy_idle()
+
+        return max(
+            self.global_bucket.reserve(size),
+            self._host_bucket(host).reserve(size),
+            task.rate_bucket.reserve(size)
+        )
+
+    def throttle(self, task, host, size, cancel_event=None):
+        """下载了 size 字节后调用，按需要等待"""
+        delay = self.reserve(task, host, size)
+        if delay > 0:
+            if cancel_event:
+                cancel_event.wait(delay)
+            else:
+                time.sleep(delay)
+
+    def get_stats(self):
+        """获取限速配置"""
+        with self.lock:
+            return {
+                'global_rate': self.global_bucket.rate,
+                'host_rate': self.host_rate,
+                'host_rates': dict(self.host_rates),
+                'task_rate': self.task_rate,
+                'proxy_active': self._proxy_active(),
+                'reserve_rate': self.reserve_rate
+            }
+
+    def _host_bucket(self, host):
+        """获取主机的令牌桶"""
+        bucket = self.host_buckets.get(host)
+        if bucket is None:
+            with self.lock:
+                bucket = self.host_buckets.setdefault(
+                    host, TokenBucket(self.host_rates.get(host, self.host_rate))
+                )
+        return bucket
+
+    def _proxy_active(self):
+        """最近是否有代理流量"""
+        return time.monotonic() - self.last_proxy_activity < self.proxy_idle_timeout
+
+    def _check_proxy_idle(self):
+        """代理空闲后恢复全局速率"""
+        limited = self.global_bucket.rate != self.global_rate
+        if limited and not self._proxy_active():
+            with self.lock:
+                self._apply_global_rate()
+
+    def _apply_global_rate(self):
+        """计算实际的全局速率（调用方持有锁）"""
+        rate = self.global_rate
+        if self.reserve_rate and self.link_rate and self._proxy_active():
+            headroom = max(self.link_rate - self.reserve_rate, 1)
+            rate = min(rate, headroom) if rate else headroom
+        self.global_bucket.set_rate(rate)
\ No newline at end of file
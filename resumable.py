@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+断点续传模块 - .part 文件 + 状态记录
+"""
+
+import os
+import json
+import random
+import re
+
+
+class IncompleteTransfer(IOError):
+    """连接中断，数据未下载完整（可以从已确认的位置重试）"""
+
+
+class ResourceChanged(IOError):
+    """服务器上的文件已变化，之前下载的部分作废"""
+
+
+class ResumeState:
+    """续传状态，保存在 <文件>.part.json
+
+    offset 是已经写入并 flush 到 .part 文件的字节数（已确认偏移），
+    segments 为分段下载时每段的 [start, end, 已下载字节数]。
+    """
+
+    def __init__(self, path, url):
+        self.path = path
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.total_size = 0
+        self.offset = 0
+        self.segments = None
+
+    @classmethod
+    def load(cls, path, url):
+        """读取状态，URL不一致或文件损坏时返回None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            return None
+        if data.get('url') != url:
+            return None
+
+        state = cls(path, url)
+        state.etag = data.get('etag')
+        state.last_modified = data.get('last_modified')
+        state.total_size = data.get('total_size', 0)
+        state.offset = data.get('offset', 0)
+        state.segments = data.get('segments')
+        return state
+
+    def save(self):
+        """原子地保存状态"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': self.url,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'total_size': self.total_size,
+                'offset': self.offset,
+                'segments': self.segments
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """删除状态文件"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def update_validators(self, headers):
+        """记录响应中的 ETag / Last-Modified"""
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+
+    def validator(self):
+        """If-Range 使用的校验值（弱ETag不能用于If-Range）"""
+        if self.etag and not self.etag.startswith('W/'):
+            return self.etag
+        return self.last_modified
+
+
+_CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+
+def parse_content_range(value):
+    """解析 Content-Range，返回 (start, end, total)，total未知时为0"""
+    match = _CONTENT_RANGE.match(value or '')
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return int(start), int(end), int(total) if total != '*' else 0
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """指数退避的等待时间（带随机抖动）"""
+    delay = min(cap, base * (2 ** attempt))
+    return delay * (0.5 + random.random() / 2)
\ No newline at end of file
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+存储引擎模块 - 追加日志 / SQLite
+"""
+
+import json
+import os
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class JournalStore:
+    """追加日志存储
+
+    每次变更只追加一行JSON到日志文件，启动时回放 快照 + 日志。
+    日志条目超过阈值后在后台线程压缩成新快照。
+    """
+
+    def __init__(self, db_path, snapshot_fn, compact_threshold=1000):
+        self.db_path = db_path                    # 快照文件
+        self.log_path = db_path + '.log'          # 当前日志
+        self.old_log_path = db_path + '.log.old'  # 压缩中的旧日志
+        self.snapshot_fn = snapshot_fn            # 返回 (全部记录副本, 下一个ID)
+        self.compact_threshold = compact_threshold
+
+        self.lock = threading.Lock()
+        self.log_file = None
+        self.log_entries = 0
+        self.compacting = False
+        self.compact_thread = None
+
+    def load(self):
+        """回放快照和日志，返回 (视频列表, 下一个ID)"""
+        videos = []
+        next_id = 1
+        if os.path.exists(self.db_path):
+            try:
+                with open(self.db_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # 兼容旧版本的纯列表格式
+                if isinstance(data, list):
+                    videos = data
+                else:
+                    videos = data.get('videos', [])
+                    next_id = data.get('next_id', 1)
+            except Exception as e:
+                logger.error(f"加载快照失败: {e}")
+                videos = []
+
+        state = {
+            'videos': videos,
+            'index': {v['id']: v for v in videos},
+            'next_id': max([next_id] + [v['id'] + 1 for v in videos]),
+        }
+        for path in (self.old_log_path, self.log_path):
+            self._replay(path, state)
+        videos, next_id = state['videos'], state['next_id']
+
+        # 旧日志已回放，合并进新快照
+        if os.path.exists(self.old_log_path):
+            self._write_snapshot((videos, next_id))
+            os.remove(self.old_log_path)
+
+        self.log_entries = self._count_lines(self.log_path)
+        if self.log_file:
+            self.log_file.close()
+        self.log_file = open(self.log_path, 'a', encoding='utf-8')
+        return videos, next_id
+
+    def write(self, ops):
+        """追加一批变更记录"""
+        if not ops:
+            return
+        data = ''.join(json.dumps(op, ensure_ascii=False) + '\n' for op in ops)
+        with self.lock:
+            self.log_file.write(data)
+            self.log_file.flush()
+            self.log_entries += len(ops)
+            need_compact = (self.log_entries >= self.compact_threshold
+                            and not self.compacting)
+            if need_compact:
+                self.compacting = True
+
+        if need_compact:
+            self.compact_thread = threading.Thread(target=self._compact, daemon=True)
+            self.compact_thread.start()
+
+    def compact(self):
+        """立即把日志压缩进快照"""
+        with self.lock:
+            if self.compacting:
+                return
+            self.compacting = True
+        self._compact()
+
+    def _compact(self):
+        """执行压缩（调用前已设置 compacting 标志）"""
+        try:
+            with self.lock:
+                # 切换日志：之后的变更写入新日志
+                self.log_file.close()
+                os.replace(self.log_path, self.old_log_path)
+                self.log_file = open(self.log_path, 'a', encoding='utf-8')
+                self.log_entries = 0
+
+            # 快照至少包含切换前的所有变更，回放新日志时重复应用是幂等的
+            self._write_snapshot(self.snapshot_fn())
+            os.remove(self.old_log_path)
+        except Exception as e:
+            logger.error(f"压缩数据库失败: {e}")
+        finally:
+            with self.lock:
+                self.compacting = False
+
+    def flush(self):
+        """把日志刷到磁盘"""
+        with self.lock:
+            if self.log_file:
+                self.log_file.flush()
+                os.fsync(self.log_file.fileno())
+
+    def close(self):
+        """关闭存储"""
+        thread = self.compact_thread
+        if thread and thread.is_alive():
+            thread.join()
+        with self.lock:
+            if self.log_file:
+                self.log_file.close()
+                self.log_file = None
+
+    def _write_snapshot(self, snapshot):
+        """原子地写入快照"""
+        videos, next_id = snapshot
+        tmp_path = self.db_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'next_id': next_id, 'videos': videos}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.db_path)
+
+    @staticmethod
+    def _replay(path, state):
+        """回放一个日志文件"""
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # 崩溃时写了一半的最后一行
+                    continue
+
+                kind = op.get('op')
+                index = state['index']
+                if kind == 'add':
+                    video = op['video']
+                    if video['id'] in index:
+                        index[video['id']].update(video)
+                    else:
+                        state['videos'].append(video)
+                        index[video['id']] = video
+                    state['next_id'] = max(state['next_id'], video['id'] + 1)
+                elif kind == 'update':
+                    video = index.get(op['id'])
+                    if video:
+                        video.update(op['updates'])
+                elif kind == 'clear':
+                    state['videos'] = []
+                    state['index'] = {}
+                    state['next_id'] = max(state['next_id'], op.get('next_id', 1))
+
+    @staticmethod
+    def _count_lines(path):
+        """统计日志行数"""
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as f:
+            return sum(1 for _ in f)
+
+
+class SqliteStore:
+    """SQLite存储
+
+    WAL模式，每批变更一个事务；按 url/capture_time/domain/downloaded 建索引，
+    支持把过滤和分页下推到数据库。
+    """
+
+    def __init__(self, db_path, snapshot_fn=None, **kwargs):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+
+    def _create_schema(self):
+        """建表和索引"""
+        with self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS videos (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL UNIQUE,
+                    capture_time TEXT NOT NULL,
+                    domain TEXT,
+                    downloaded INTEGER NOT NULL DEFAULT 0,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_videos_capture_time ON videos(capture_time);
+                CREATE INDEX IF NOT EXISTS idx_videos_domain ON videos(domain, capture_time);
+                CREATE INDEX IF NOT EXISTS idx_videos_downloaded ON videos(downloaded, capture_time);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            ''')
+
+    def load(self):
+        """读取全部记录，返回 (视频列表, 下一个ID)"""
+        with self.lock:
+            rows = self.conn.execute('SELECT data FROM videos ORDER BY capture_time').fetchall()
+            meta = self.conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        videos = [json.loads(row[0]) for row in rows]
+        next_id = int(meta[0]) if meta else 1
+        return videos, next_id
+
+    def write(self, ops):
+        """在一个事务里执行一批变更"""
+        if not ops:
+            return
+        with self.lock, self.conn:
+            for op in ops:
+                kind = op.get('op')
+                if kind == 'add':
+                    video = op['video']
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO videos (id, url, capture_time, domain, downloaded, data) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (video['id'], video['url'], video['capture_time'], video.get('domain'),
+                         int(bool(video.get('downloaded'))), json.dumps(video, ensure_ascii=False))
+                    )
+                    self._set_next_id(video['id'] + 1)
+                elif kind == 'update':
+                    row = self.conn.execute('SELECT data FROM videos WHERE id = ?', (op['id'],)).fetchone()
+                    if not row:
+                        continue
+                    video = json.loads(row[0])
+                    video.update(op['updates'])
+                    self.conn.execute(
+                        'UPDATE videos SET url = ?, downloaded = ?, data = ? WHERE id = ?',
+                        (video['url'], int(bool(video.get('downloaded'))),
+                         json.dumps(video, ensure_ascii=False), op['id'])
+                    )
+                elif kind == 'clear':
+                    self.conn.execute('DELETE FROM videos')
+                    self._set_next_id(op.get('next_id', 1))
+
+    def _set_next_id(self, next_id):
+        """只增不减地更新ID计数器（调用方持有事务）"""
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = MAX(CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))",
+            (next_id,)
+        )
+
+    def query_ids(self, domain=None, downloaded=None, since=None, until=None, limit=None, offset=0):
+        """按条件查询视频ID（按捕获时间倒序）"""
+        where, params = self._where(domain, downloaded, since, until)
+        sql = f'SELECT id FROM videos{where} ORDER BY capture_time DESC'
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params += [limit, offset]
+        elif offset:
+            sql += ' LIMIT -1 OFFSET ?'
+            params.append(offset)
+        with self.lock:
+            return [row[0] for row in self.conn.execute(sql, params)]
+
+    def count(self, domain=None, downloaded=None, since=None, until=None):
+        """按条件统计数量"""
+        where, params = self._where(domain, downloaded, since, until)
+        with self.lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM videos{where}', params).fetchone()[0]
+
+    @staticmethod
+    def _where(domain, downloaded, since, until):
+        """拼接查询条件"""
+        clauses, params = [], []
+        if domain is not None:
+            clauses.append('domain = ?')
+            params.append(domain)
+        if downloaded is not None:
+            clauses.append('downloaded = ?')
+            params.append(int(bool(downloaded)))
+        if since is not None:
+            clauses.append('capture_time >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('capture_time < ?')
+            params.append(until)
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        return where, params
+
+    def compact(self):
+        """合并WAL到主库"""
+        with self.lock:
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def flush(self):
+        """每个事务提交即已落盘"""
+        pass
+
+    def close(self):
+        """关闭存储"""
+        with self.lock:
+            self.conn.close()
+
+
+# 可选的存储引擎
+STORES = {
+    'journal': JournalStore,
+    'sqlite': SqliteStore,
+}
+
+# 各存储引擎的默认数据库文件
+DEFAULT_PATHS = {
+    'journal': 'videos.json',
+    'sqlite': 'videos.db',
+}
+
+
+def create_store(backend, db_path, snapshot_fn, **kwargs):
+    """按名称创建存储引擎"""
+    if backend not in STORES:
+        raise ValueError(f"未知的存储引擎: {backend}")
+    return STORES[backend](db_path, snapshot_fn, **kwargs)
\ No newline at end of file
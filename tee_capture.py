@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+旁路写盘模块 - 视频经过代理时同时保存到磁盘
+"""
+
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from threading import Condition, Lock, Thread
+from download_scheduler import PRIORITY_BATCH
+from media_index import link_file
+from metrics import counter
+from resumable import ResumeState, parse_content_range
+from utils import canonicalize_url, is_hls_url
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+TEE_OVERFLOWS = counter('sniffer_tee_overflow_total', '写盘线程积压太多而放弃旁路写盘的响应数')
+
+
+class TeeSession:
+    """一个响应的旁路写盘，作为 flow.response.stream 使用
+
+    mitmproxy 每收到一块响应体就调用一次，数据交给写盘线程后立即原样转发给手机；
+    响应结束时以 b'' 调用。打开、写入、计算sha256、flush 和保存续传记录都在
+    写盘线程中进行，续传记录每 save_interval 字节才保存一次。
+    """
+
+    def __init__(self, tee, key, url, headers, state, start, previous=None):
+        self.tee = tee
+        self.key = key
+        self.url = url
+        self.headers = headers
+        self.state = state
+        state.offset = start
+        # 事件循环中：已交给写盘线程的字节数；关闭后改为写盘线程确认过的偏移
+        self.offset = start
+        self.written = start    # 写盘线程中：已写入的字节数
+        self.unsaved = 0
+        self.hasher = hashlib.sha256() if start == 0 else None   # 从头完整经过代理时顺便计算sha256
+        self.closed = False
+        self.failed = False
+        self.replaced = False   # 后续请求接着这个文件写了，结束时不用再处理
+        self.f = None
+        tee.submit(self._open, start, previous)
+
+    def __call__(self, data):
+        if self.closed:
+            return data
+        if not data:
+            self.close(ended=True)
+            return data
+        if self.failed or not self.tee.submit(self._write, data, size=len(data)):
+            # 写盘出错或写盘线程积压太多：放弃保存，数据照常转发
+            self.close(ended=False)
+            return data
+        self.offset += len(data)
+        return data
+
+    def close(self, ended):
+        """响应结束（ended=False 表示连接中断）"""
+        if self.closed:
+            return
+        self.closed = True
+        self.tee.submit(self._close, ended)
+
+    # 以下在写盘线程中执行
+
+    def _open(self, start, previous):
+        if start and previous and previous.state.offset != start:
+            # 前一个响应最后没有写完，文件接不上
+            self.written = self.state.offset = previous.state.offset
+            self._fail(f"{self.key}.part 只保存了 {previous.state.offset} 字节")
+            return
+        try:
+            self.f = open(self.tee.part_path(self.key), 'r+b' if start else 'wb')
+            self.f.seek(start)
+            self.f.truncate()
+        except OSError as e:
+            self._fail(e)
+
+    def _write(self, data):
+        if self.failed:
+            return
+        try:
+            self.f.write(data)
+        except OSError as e:
+            self._fail(e)
+            return
+        if self.hasher:
+            self.hasher.update(data)
+        self.written += len(data)
+        self.unsaved += len(data)
+        if self.unsaved >= self.tee.save_interval:
+            self._save()
+
+    def _save(self):
+        """flush 后记录已确认偏移"""
+        try:
+            self.f.flush()
+            self.state.offset = self.written
+            self.state.save()
+        except OSError as e:
+            self._fail(e)
+        self.unsaved = 0
+
+    def _close(self, ended):
+        if not self.failed:
+            self._save()
+        if self.f:
+            try:
+                self.f.close()
+            except OSError as e:
+                self._fail(e)
+        # 出错时只有最后一次保存的部分是可靠的
+        self.offset = self.state.offset
+        self.tee.session_closed(self, ended and not self.failed)
+
+    def _fail(self, error):
+        logger.error(f"❌ 旁路写盘失败: {error}")
+        self.failed = True
+        self.hasher = None
+
+
+class VideoTee:
+    """把经过代理的视频响应体保存到 directory
+
+    同一个视频（按规范化URL）同时只写一个文件。手机用 Range 分段播放时，
+    起点正好接在已保存部分之后的响应继续追加；其他起点的响应只转发不保存。
+    文件完整时立即交给 on_done；不完整的等 idle_timeout 秒没有后续请求再交给 on_done，
+    由下载器用 Range 请求补完。交出时 .part 改为不重复的文件名，之后同一个视频可以重新开始写；
+    on_done(url, headers, info) 在写盘线程中调用，不能阻塞。
+
+    所有文件操作由一个写盘线程按顺序执行，事件循环只入队；积压的数据超过
+    max_pending 字节时新数据不再保存（只转发），不会占满内存。
+    多个代理进程可以共用同一个目录：目录中的 tee.lock 按视频加锁，
+    一个视频在交出之前只由一个进程写。
+    """
+
+    def __init__(self, directory, on_done, idle_timeout=30.0, save_interval=4 * 1024 * 1024,
+                 max_pending=64 * 1024 * 1024):
+        self.directory = directory
+        self.on_done = on_done
+        self.idle_timeout = idle_timeout
+        self.save_interval = save_interval
+        self.max_pending = max_pending
+        self.active = {}    # {key: TeeSession}
+        self.idle = {}      # {key: (TeeSession, 定时器)} 不完整、等待后续请求的
+        self.loop = None    # 代理的事件循环，写盘线程通过它通知响应结束
+
+        self.jobs = deque()
+        self.pending = 0    # 队列中数据的字节数
+        self.busy = False
+        self.cond = Condition()
+        self.thread = None
+        os.makedirs(directory, exist_ok=True)
+
+        self.owned = {}     # {key: 本进程中持有这个视频的文件数} 第一个开始写时加锁，全部交出后解锁
+        self.lock_guard = Lock()
+        self.lock_fd = os.open(os.path.join(directory, 'tee.lock'), os.O_RDWR | os.O_CREAT)
+
+    def part_path(self, key):
+        return os.path.join(self.directory, key + '.part')
+
+    def attach(self, flow, headers, meta):
+        """响应头到达时调用，可以旁路写盘时设置 flow.response.stream，返回是否写盘"""
+        url = flow.request.url
+        response = flow.response
+        encoding = response.headers.get('Content-Encoding', 'identity').lower()
+        if is_hls_url(url) or encoding not in ('', 'identity') or response.status_code not in (200, 206):
+            return False
+
+        canonical = canonicalize_url(url)
+        key = hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:20]
+        # 前一个响应已经结束但写盘线程还没写完时也可以接着写
+        previous = self.active.get(key)
+        if previous and not previous.closed:
+            return False
+        idle = self.idle.get(key)
+        if idle:
+            previous = idle[0]
+
+        start = 0
+        if response.status_code == 206:
+            content_range = parse_content_range(response.headers.get('Content-Range'))
+            if not content_range:
+                return False
+            start = content_range[0]
+
+        if start > 0:
+            # 只接在前一个响应写到的位置之后继续写，并且文件没有变化
+            etag = previous.state.etag if previous else None
+            if not previous or previous.offset != start or \
+                    (etag and meta.get('etag') and etag != meta.get('etag')):
+                return False
+
+        if not previous and not self._acquire(key):
+            # 别的代理进程正在写这个视频
+            return False
+        if idle:
+            del self.idle[key]
+            idle[1].cancel()
+        elif previous:
+            previous.replaced = True
+
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        state = ResumeState(self.part_path(key) + '.json', canonical)
+        state.etag = meta.get('etag')
+        state.last_modified = meta.get('last_modified')
+        state.total_size = meta.get('total_size') or 0
+        session = TeeSession(self, key, url, headers, state, start, previous)
+        self.active[key] = session
+        response.stream = session
+        return True
+
+    def abort(self, flow):
+        """连接中断"""
+        session = flow.response.stream if flow.response else None
+        if isinstance(session, TeeSession):
+            session.close(ended=False)
+
+    def submit(self, func, *args, size=0):
+        """交给写盘线程执行，返回是否入队（size 为数据字节数，超过积压上限时不入队）"""
+        with self.cond:
+            if size and self.pending + size > self.max_pending:
+                TEE_OVERFLOWS.inc()
+                return False
+            self.pending += size
+            self.jobs.append((func, args, size))
+            if self.thread is None:
+                self.thread = Thread(target=self._run_writer, daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+        return True
+
+    def session_closed(self, session, ended):
+        """写盘线程处理完一个响应，回到事件循环中处理"""
+        try:
+            self.loop.call_soon_threadsafe(self.on_session_closed, session, ended)
+        except (AttributeError, RuntimeError):
+            # 没有事件循环或已经结束（代理停止时）
+            self.on_session_closed(session, ended)
+
+    def on_session_closed(self, session, ended):
+        """一个响应结束：完整时交出去，否则等待后续请求"""
+        if session.replaced:
+            return
+        self.active.pop(session.key, None)
+        state = session.state
+        complete = state.total_size > 0 and session.offset >= state.total_size
+        if not complete and state.total_size == 0 and ended and session.hasher:
+            # 没有大小信息的200响应正常结束，视为完整
+            state.total_size = session.offset
+            complete = True
+        if complete:
+            self._hand_off(session, True)
+            return
+
+        try:
+            timer = asyncio.get_running_loop().call_later(self.idle_timeout, self._expire, session.key)
+        except RuntimeError:
+            self._hand_off(session, False)
+            return
+        self.idle[session.key] = (session, timer)
+
+    def flush(self):
+        """写完所有数据，交出所有未完成的文件（代理停止、事件循环结束后调用）"""
+        for session in list(self.active.values()):
+            session.close(ended=False)
+        self._wait_writer()
+        for key in list(self.idle):
+            session, timer = self.idle.pop(key)
+            timer.cancel()
+            self._hand_off(session, False)
+        self._wait_writer()
+
+    def _wait_writer(self):
+        """等待写盘线程处理完队列"""
+        with self.cond:
+            while self.jobs or self.busy:
+                self.cond.wait()
+
+    def _run_writer(self):
+        """写盘线程"""
+        while True:
+            with self.cond:
+                while not self.jobs:
+                    self.cond.wait()
+                func, args, size = self.jobs.popleft()
+                self.busy = True
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error(f"❌ 旁路写盘错误: {e}")
+            with self.cond:
+                self.pending -= size
+                self.busy = False
+                self.cond.notify_all()
+
+    def _expire(self, key):
+        """不完整的文件一段时间没有后续请求"""
+        idle = self.idle.pop(key, None)
+        if idle:
+            self._hand_off(idle[0], False)
+
+    def _hand_off(self, session, complete):
+        """交给写盘线程：写完之后才交出文件"""
+        self.submit(self._release, session, complete)
+
+    def _release(self, session, complete):
+        """写盘线程中：文件改名后交给 on_done，然后解锁这个视频"""
+        state = session.state
+        path = os.path.join(self.directory, f'{session.key}-{uuid.uuid4().hex[:8]}.part')
+        try:
+            os.replace(self.part_path(session.key), path)
+            if os.path.exists(state.path):
+                os.replace(state.path, path + '.json')
+        except OSError as e:
+            logger.error(f"❌ 旁路写盘文件改名失败: {e}")
+            self._unlock(session.key)
+            return
+        info = {
+            'path': path,
+            'state_path': path + '.json',
+            'offset': session.offset,
+            'total_size': state.total_size,
+            'etag': state.etag,
+            'last_modified': state.last_modified,
+            'complete': complete,
+            'sha256': session.hasher.hexdigest() if complete and session.hasher else None
+        }
+        try:
+            self.on_done(session.url, session.headers, info)
+        except Exception as e:
+            logger.error(f"❌ 旁路写盘回调错误: {e}")
+        self._unlock(session.key)
+
+    def _acquire(self, key):
+        """开始写一个视频：本进程第一次写时加进程间锁，返回是否成功"""
+        with self.lock_guard:
+            if key not in self.owned:
+                if not _lock_range(self.lock_fd, _lock_offset(key)):
+                    return False
+                self.owned[key] = 0
+            self.owned[key] += 1
+            return True
+
+    def _unlock(self, key):
+        """交出一个文件：本进程不再写这个视频时解锁"""
+        with self.lock_guard:
+            self.owned[key] -= 1
+            if not self.owned[key]:
+                del self.owned[key]
+                _unlock_range(self.lock_fd, _lock_offset(key))
+
+
+def _lock_offset(key):
+    """视频在 tee.lock 中对应的字节位置"""
+    return int(key[:7], 16)
+
+
+def _lock_range(fd, offset):
+    """不等待地锁住 fd 中 offset 处的一个字节（进程间互斥），返回是否成功"""
+    try:
+        if os.name == 'nt':
+            os.lseek(fd, offset, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock_range(fd, offset):
+    if os.name == 'nt':
+        os.lseek(fd, offset, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+
+
+class TeeAdopter:
+    """把旁路写盘的文件接入数据库和下载器（在捕获队列的消费线程中调用）
+
+    完整的文件直接成为已下载的记录；不完整的移到下载器的 .part 位置并写好续传记录，
+    由下载器用 Range 请求下载剩余部分。
+    """
+
+    def __init__(self, db, download_manager):
+        self.db = db
+        self.download_manager = download_manager
+        self.completed = 0
+        self.resumed = 0
+        self.discarded = 0
+
+    def adopt(self, url, headers, info):
+        """处理一个旁路写盘的文件"""
+        video = self.db.get_by_url(url)
+        task = self.download_manager.get_task(video['id']) if video else None
+        if not video or video.get('downloaded') or \
+                (task and task.status not in ('failed', 'cancelled')):
+            # 没有记录（例如被丢弃）、已经下载过或者正在下载
+            self._discard(info)
+            return
+
+        save_path = os.path.join(self.download_manager.video_dir, video['filename'])
+        if info['complete']:
+            self._complete(video, save_path, info)
+        else:
+            self._resume(video, save_path, headers, info)
+
+    def _complete(self, video, save_path, info):
+        """完整的文件：改名为目标文件，标记为已下载"""
+        os.replace(info['path'], save_path)
+        ResumeState(info['state_path'], None).remove()
+        size = os.path.getsize(save_path)
+
+        media_index = self.download_manager.media_index
+        if media_index and info['sha256']:
+            existing = media_index.register(info['sha256'], save_path, size, info['etag'],
+                                            canonicalize_url(video['url']))
+            if existing and not os.path.samefile(existing, save_path):
+                link_file(existing, save_path)
+
+        self.db.update_video(video['id'], {
+            'downloaded': True,
+            'download_path': save_path,
+            'file_size': size
+        })
+        self.completed += 1
+        logger.info(f"✅ 播放时已保存: {video['filename']}")
+
+    def _resume(self, video, save_path, headers, info):
+        """不完整的文件：交给下载器续传"""
+        state = ResumeState(save_path + '.part.json', video['url'])
+        state.etag = info['etag']
+        state.last_modified = info['last_modified']
+        state.total_size = info['total_size']
+        state.offset = info['offset']
+        os.replace(info['path'], save_path + '.part')
+        state.save()
+        ResumeState(info['state_path'], None).remove()
+
+        def on_complete(task):
+            if task.status == 'completed':
+                self.db.update_video(video['id'], {
+                    'downloaded': True,
+                    'download_path': task.save_path,
+                    'file_size': task.total_size
+                })
+
+        self.download_manager.download_video(
+            video['id'], video['url'], video['filename'],
+            callback=on_complete,
+            headers={'Referer': video.get('referer', ''), 'User-Agent': video.get('user_agent', '')},
+            priority=PRIORITY_BATCH,
+            hints=video
+        )
+        self.resumed += 1
+        logger.info(f"⬇️ 播放时保存了 {info['offset']}/{info['total_size']} 字节，继续下载: {video['filename']}")
+
+    def _discard(self, info):
+        """删除用不到的旁路文件"""
+        for path in (info['path'], info['state_path']):
+            if os.path.exists(path):
+                os.remove(path)
+        self.discarded += 1
\ No newline at end of file
@@ -0,0 +1,53 @@
+import http.server
+import os
+import re
+import sys
+import threading
+
+import pytest
+
+# 模块都在仓库根目录下
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    """支持 Range / If-Range 的文件服务器，记录收到的请求头"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        data = server.data
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if match and server.ranges and (if_range is None or if_range == server.etag):
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', server.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def file_server():
+    """本地文件服务器：data、etag、ranges 可以在测试中修改，requests 为收到的请求头"""
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+    httpd.data = os.urandom(300 * 1024 + 7)
+    httpd.etag = '"v1"'
+    httpd.ranges = True
+    httpd.requests = []
+    httpd.url = f'http://127.0.0.1:{httpd.server_port}/video.mp4'
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
\ No newline at end of file
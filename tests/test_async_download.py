@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from async_download import AsyncDownloadManager  # noqa: E402
+
+
+def download(tmp_path, url, **kwargs):
+    """用asyncio引擎下载一个文件，返回结束后的任务"""
+    manager = AsyncDownloadManager(download_dir=str(tmp_path), max_retries=0, **kwargs)
+    done = threading.Event()
+    try:
+        manager.download_video(1, url, 'video.mp4', callback=lambda task: done.set())
+        assert done.wait(30)
+        return manager.get_task(1)
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_segmented_download(tmp_path, file_server):
+    task = download(tmp_path, file_server.url, segments=4, segment_min_size=1024)
+
+    assert task.status == 'completed', task.error
+    assert file_server.requests[0]['Range'] == 'bytes=0-0'
+    assert len(file_server.requests) == 5
+    assert all(r['If-Range'] == '"v1"' for r in file_server.requests[1:])
+    with open(task.save_path, 'rb') as f:
+        assert f.read() == file_server.data
+
+
+def test_single_stream_without_probe(tmp_path, file_server):
+    task = download(tmp_path, file_server.url, segments=1)
+
+    assert task.status == 'completed', task.error
+    assert len(file_server.requests) == 1 and 'Range' not in file_server.requests[0]
+    with open(task.save_path, 'rb') as f:
+        assert f.read() == file_server.data
\ No newline at end of file
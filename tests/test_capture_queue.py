@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from capture_queue import CaptureQueue, DROP_NEWEST, DROP_OLDEST
+
+
+def fill(overflow):
+    """不启动消费线程，放入5个捕获到容量为3的队列，返回处理结果"""
+    handled = []
+    queue = CaptureQueue(lambda url, headers, meta: handled.append(url), maxsize=3, overflow=overflow)
+    accepted = [queue.put(f'u{i}') for i in range(5)]
+    queue.start()
+    queue.stop()
+    return accepted, handled, queue.get_stats()
+
+
+def test_drop_oldest():
+    accepted, handled, stats = fill(DROP_OLDEST)
+    assert accepted == [True] * 5
+    assert handled == ['u2', 'u3', 'u4']
+    assert stats['dropped'] == 2 and stats['max_depth'] == 3 and stats['processed'] == 3
+
+
+def test_drop_newest():
+    accepted, handled, stats = fill(DROP_NEWEST)
+    assert accepted == [True, True, True, False, False]
+    assert handled == ['u0', 'u1', 'u2']
+    assert stats['dropped'] == 2
+
+
+def test_handler_override_errors_and_order():
+    handled = []
+    queue = CaptureQueue(lambda url, headers, meta: handled.append(('default', url)))
+
+    def failing(url, headers, meta):
+        raise ValueError('bad')
+
+    queue.put('a')
+    queue.put('b', handler=lambda url, headers, meta: handled.append(('tee', url)))
+    queue.put('c', handler=failing)
+    queue.put('d')
+    queue.start()
+    queue.stop()
+    assert handled == [('default', 'a'), ('tee', 'b'), ('default', 'd')]
+    assert queue.get_stats()['errors'] == 1
+
+
+def test_put_never_blocks_on_slow_handler():
+    release = threading.Event()
+    queue = CaptureQueue(lambda url, headers, meta: release.wait(5), maxsize=2)
+    queue.start()
+    queue.put('slow')
+    # 消费线程卡住时 put 仍立即返回
+    for i in range(10):
+        queue.put(f'u{i}')
+    assert queue.depth() <= 2
+    release.set()
+    queue.stop()
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        CaptureQueue(print, overflow='block')
\ No newline at end of file
@@ -0,0 +1,48 @@
+import threading
+
+from download_scheduler import DownloadScheduler, PRIORITY_BATCH, PRIORITY_COVER, PRIORITY_MANUAL
+
+
+class FakeTask:
+    def __init__(self, name, host, order, gate=None):
+        self.name = name
+        self.url = f'https://{host}/{name}'
+        self.order = order
+        self.gate = gate
+        self.status = 'pending'
+
+    def start(self):
+        if self.gate:
+            self.gate.wait(5)
+        self.order.append(self.name)
+
+    def cancel(self):
+        pass
+
+
+def test_priority_then_host_round_robin():
+    order = []
+    gate = threading.Event()
+    scheduler = DownloadScheduler(max_workers=1)
+    # 占住唯一的工作线程，让后面的任务都进入队列
+    scheduler.submit(FakeTask('blocker', 'x', order, gate))
+    while not scheduler.running:
+        pass
+
+    for name, host, priority in [
+        ('cover', 'a', PRIORITY_COVER),
+        ('a1', 'a', PRIORITY_BATCH),
+        ('a2', 'a', PRIORITY_BATCH),
+        ('a3', 'a', PRIORITY_BATCH),
+        ('b1', 'b', PRIORITY_BATCH),
+        ('manual', 'c', PRIORITY_MANUAL),
+    ]:
+        scheduler.submit(FakeTask(name, host, order), priority)
+    paused = FakeTask('paused', 'a', order)
+    scheduler.submit(paused, PRIORITY_BATCH)
+    assert scheduler.pause(paused)
+
+    gate.set()
+    scheduler.shutdown(wait=True)
+    assert order == ['blocker', 'manual', 'a1', 'b1', 'a2', 'a3', 'cover']
+    assert paused.status == 'paused'
\ No newline at end of file
@@ -0,0 +1,67 @@
+from download_manager import DownloadTask
+from resumable import ResumeState
+
+
+def make_task(tmp_path, url, **kwargs):
+    return DownloadTask(1, url, str(tmp_path / 'video.mp4'), max_retries=0,
+                        segments=4, segment_min_size=1024, **kwargs)
+
+
+def test_segmented_download(tmp_path, file_server):
+    task = make_task(tmp_path, file_server.url)
+    task.start()
+
+    assert task.status == 'completed', task.error
+    ranges = sorted(r['Range'] for r in file_server.requests[1:])
+    size = len(file_server.data)
+    step = -(-size // 4)
+    assert ranges == sorted(f'bytes={s}-{min(s + step, size) - 1}' for s in range(0, size, step))
+    assert all(r['If-Range'] == '"v1"' for r in file_server.requests[1:])
+    with open(task.save_path, 'rb') as f:
+        assert f.read() == file_server.data
+
+
+def test_segmented_resume_skips_finished_segments(tmp_path, file_server):
+    data = file_server.data
+    task = make_task(tmp_path, file_server.url)
+    segments = DownloadTask._split(len(data), 4)
+    # 第一段已完成，第二段完成了一半
+    segments[0][2] = segments[0][1] + 1
+    segments[1][2] = 1000
+    with open(task.part_path, 'wb') as f:
+        f.write(data[:segments[1][0] + 1000])
+        f.truncate(len(data))
+    state = ResumeState(task.state_path, task.url)
+    state.etag = '"v1"'
+    state.total_size = len(data)
+    state.segments = segments
+    state.save()
+
+    task.start()
+    assert task.status == 'completed', task.error
+    assert sorted(r['Range'] for r in file_server.requests) == sorted(
+        f'bytes={seg[0] + seg[2]}-{seg[1]}' for seg in segments[1:]
+    )
+    with open(task.save_path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_no_range_support_falls_back_to_single_stream(tmp_path, file_server):
+    file_server.ranges = False
+    task = make_task(tmp_path, file_server.url)
+    task.start()
+
+    assert task.status == 'completed', task.error
+    with open(task.save_path, 'rb') as f:
+        assert f.read() == file_server.data
+
+def test_saved_segments_follow_progress(tmp_path):
+    task = DownloadTask(1, 'http://127.0.0.1/video.mp4', str(tmp_path / 'video.mp4'))
+    state = ResumeState(task.state_path, task.url)
+    state.segments = DownloadTask._split(4000, 2)
+    first = state.segments[0]
+    for done in (100, 700):
+        first[2] = done
+        task._save_segments(state)
+        assert ResumeState.load(task.state_path, task.url).segments[0][2] == done
+    assert state.segments[0] is first
\ No newline at end of file
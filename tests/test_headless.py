@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from headless import HeadlessService, load_config, parse_args
+
+
+def test_defaults_config_file_and_cli(tmp_path):
+    config_path = tmp_path / 'sniffer.json'
+    config_path.write_text(json.dumps({'port': 9000, 'workers': 4, 'db_backend': 'sqlite'}), encoding='utf-8')
+
+    config = load_config(parse_args(['--config', str(config_path), '--workers', '2']))
+    assert config['port'] == 9000           # 配置文件覆盖默认值
+    assert config['workers'] == 2           # 命令行覆盖配置文件
+    assert config['host'] == '0.0.0.0'      # 默认值
+    assert config['db_path'] == 'videos.db'
+    assert config['auto_download'] is True
+
+
+def test_flags_not_given_do_not_override(tmp_path):
+    config_path = tmp_path / 'sniffer.json'
+    config_path.write_text(json.dumps({'tee': True, 'auto_download': False}), encoding='utf-8')
+    config = load_config(parse_args(['--config', str(config_path)]))
+    assert config['tee'] is True
+    assert config['auto_download'] is False
+
+
+def test_unknown_key(tmp_path):
+    config_path = tmp_path / 'sniffer.json'
+    config_path.write_text(json.dumps({'prot': 9000}), encoding='utf-8')
+    with pytest.raises(ValueError):
+        load_config(parse_args(['--config', str(config_path)]))
+
+def test_unknown_or_abbreviated_flag():
+    with pytest.raises(SystemExit):
+        parse_args(['--worker', '2'])
+
+
+def test_stop_waits_for_downloads_before_closing_db():
+    calls = []
+
+    class Recorder:
+        def __init__(self, name):
+            self.name = name
+
+        def __getattr__(self, method):
+            return lambda *args, **kwargs: calls.append((self.name, method, kwargs))
+
+    service = HeadlessService(load_config(parse_args([])))
+    service.proxy_server = Recorder('proxy')
+    service.download_manager = Recorder('downloads')
+    service.db = Recorder('db')
+    service.stop()
+    assert calls == [
+        ('proxy', 'stop', {}),
+        ('downloads', 'shutdown', {'wait': True}),
+        ('db', 'close', {}),
+    ]
\ No newline at end of file
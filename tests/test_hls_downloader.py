@@ -0,0 +1,72 @@
+import pytest
+
+from hls_downloader import HlsDownloader, parse_playlist, slice_byterange
+
+MASTER = '''#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360
+low/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2400000,RESOLUTION="1280x720"
+https://cdn.example.com/high/index.m3u8
+'''
+
+MEDIA = '''#EXTM3U
+#EXT-X-MEDIA-SEQUENCE:7
+#EXT-X-MAP:URI="init.mp4"
+#EXT-X-KEY:METHOD=AES-128,URI="../key.bin",IV=0x01
+#EXTINF:4.0,
+seg0.ts
+#EXT-X-KEY:METHOD=NONE
+#EXTINF:4.5,
+#EXT-X-BYTERANGE:1000@200
+all.ts
+#EXTINF:2,
+#EXT-X-BYTERANGE:500
+all.ts
+#EXT-X-ENDLIST
+'''
+
+
+def test_master_playlist():
+    playlist = parse_playlist(MASTER, 'https://cdn.example.com/video/master.m3u8')
+    assert playlist['type'] == 'master'
+    assert [(v['bandwidth'], v['resolution'], v['uri']) for v in playlist['variants']] == [
+        (800000, '640x360', 'https://cdn.example.com/video/low/index.m3u8'),
+        (2400000, '1280x720', 'https://cdn.example.com/high/index.m3u8'),
+    ]
+
+
+def test_media_playlist():
+    playlist = parse_playlist(MEDIA, 'https://cdn.example.com/video/index.m3u8')
+    assert playlist['type'] == 'media' and playlist['endlist']
+    assert playlist['init_map'] == 'https://cdn.example.com/video/init.mp4'
+    first, second, third = playlist['segments']
+    assert first['sequence'] == 7 and first['duration'] == 4.0
+    assert first['key'] == {'method': 'AES-128', 'uri': 'https://cdn.example.com/key.bin', 'iv': '0x01'}
+    assert second['key'] is None and second['byterange'] == (200, 1199)
+    # 没有 @offset 时接在上一段之后
+    assert third['byterange'] == (1200, 1699) and third['sequence'] == 9
+    assert HlsDownloader.media_segments(playlist) == playlist['segments']
+
+
+def test_live_playlist_is_rejected():
+    playlist = parse_playlist(MEDIA.replace('#EXT-X-ENDLIST\n', ''), 'https://cdn.example.com/index.m3u8')
+    assert not playlist['endlist']
+    with pytest.raises(IOError):
+        HlsDownloader.media_segments(playlist)
+
+
+def test_invalid_playlist():
+    with pytest.raises(ValueError):
+        parse_playlist('<html></html>', 'https://cdn.example.com/index.m3u8')
+
+
+def test_slice_byterange():
+    data = bytes(range(256)) * 8
+    # 206 响应只取请求的长度
+    assert slice_byterange(206, 'bytes 100-199/2048', data[100:300], (100, 199)) == data[100:200]
+    # 服务器忽略 Range 返回完整资源
+    assert slice_byterange(200, None, data, (100, 199)) == data[100:200]
+    with pytest.raises(IOError):
+        slice_byterange(206, 'bytes 0-99/2048', data[:100], (100, 199))
+    with pytest.raises(IOError):
+        slice_byterange(200, None, data[:150], (100, 199))
\ No newline at end of file
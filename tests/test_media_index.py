@@ -0,0 +1,52 @@
+from download_manager import DownloadTask
+from media_index import MediaIndex, hash_file
+from utils import canonicalize_url
+
+
+def register(index, path, data, etag=None, url=None):
+    path.write_bytes(data)
+    index.register(hash_file(str(path)), str(path), len(data), etag,
+                   canonicalize_url(url) if url else None)
+
+
+def test_find_by_url_needs_matching_size_and_etag(tmp_path):
+    index = MediaIndex(str(tmp_path / 'media_index.json'))
+    url = 'https://finder.video.qq.com/v.mp4?encfilekey=abc&token=1'
+    register(index, tmp_path / 'a.mp4', b'x' * 100, '"a"', url)
+    key = canonicalize_url(url.replace('token=1', 'token=2'))
+
+    assert index.find(key, 100, '"a"')[1] == str(tmp_path / 'a.mp4')
+    assert index.find(key, 100, None) is not None
+    assert index.find(key, 0, None) is None
+    assert index.find(key, 200, '"a"') is None
+    assert index.find(key, 100, '"b"') is None
+    # 大小 + 强ETag 不看URL
+    assert index.find('https://other/x.mp4', 100, '"a"') is not None
+    assert index.find('https://other/x.mp4', 100, 'W/"a"') is None
+
+
+def test_changed_file_is_forgotten(tmp_path):
+    index = MediaIndex(str(tmp_path / 'media_index.json'))
+    register(index, tmp_path / 'a.mp4', b'x' * 100, '"a"')
+    (tmp_path / 'a.mp4').write_bytes(b'x' * 50)
+    assert index.find(None, 100, '"a"') is None
+    assert MediaIndex(str(tmp_path / 'media_index.json')).get_stats()['files'] == 0
+
+
+def test_single_stream_reuses_by_response_headers(tmp_path, file_server):
+    index = MediaIndex(str(tmp_path / 'media_index.json'))
+    first = DownloadTask(1, file_server.url + '?token=1', str(tmp_path / 'a.mp4'),
+                         media_index=index, max_retries=0)
+    first.start()
+    assert first.status == 'completed', first.error
+    # 单连接下载不发探测请求
+    assert len(file_server.requests) == 1 and 'Range' not in file_server.requests[0]
+
+    second = DownloadTask(2, file_server.url + '?token=2', str(tmp_path / 'b.mp4'),
+                          media_index=index, max_retries=0)
+    second.start()
+    assert second.status == 'completed', second.error
+    assert len(file_server.requests) == 2
+    assert second.duplicate_of == first.save_path
+    with open(second.save_path, 'rb') as f:
+        assert f.read() == file_server.data
\ No newline at end of file
@@ -0,0 +1,75 @@
+import pytest
+
+from metrics import Registry, export_delta
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    registry.counter('flows_total', '请求数').inc(3)
+    results = registry.counter('classified_total', '分类结果', ['result'])
+    results.labels('video').inc()
+    results.labels('other').inc(2)
+    registry.gauge('queue_depth', '队列长度').set_function(lambda: 7)
+    hook = registry.histogram('hook_seconds', '耗时', buckets=(0.1, 1.0))
+    hook.observe(0.05)
+    hook.observe(0.5)
+
+    lines = registry.render().splitlines()
+    assert lines[:4] == [
+        '# HELP classified_total 分类结果',
+        '# TYPE classified_total counter',
+        'classified_total{result="other"} 2',
+        'classified_total{result="video"} 1',
+    ]
+    assert 'flows_total 3' in lines
+    assert 'queue_depth 7' in lines
+    assert 'hook_seconds_bucket{le="0.1"} 1' in lines
+    assert 'hook_seconds_bucket{le="1"} 2' in lines
+    assert 'hook_seconds_bucket{le="+Inf"} 2' in lines
+    assert 'hook_seconds_count 2' in lines
+    assert 'hook_seconds_sum 0.55' in lines
+
+
+def test_same_name_returns_same_metric():
+    registry = Registry()
+    assert registry.counter('a_total', 'a') is registry.counter('a_total', 'a')
+    with pytest.raises(ValueError):
+        registry.gauge('a_total', 'a')
+    with pytest.raises(ValueError):
+        registry.counter('b_total', 'b', ['x']).labels('1', '2')
+
+
+def test_export_delta_and_merge():
+    worker = Registry()
+    flows = worker.counter('sniffer_flows_total', '请求数')
+    results = worker.counter('sniffer_classified_total', '分类结果', ['result'])
+    hook = worker.histogram('sniffer_hook_seconds', '耗时', buckets=(0.1,))
+    worker.gauge('sniffer_active_flows', '进行中').set(4)
+    worker.counter('other_total', '不导出').inc()
+
+    flows.inc(2)
+    results.labels('video').inc()
+    hook.observe(0.05)
+    first = worker.export(('sniffer_',))
+    assert 'other_total' not in first
+
+    flows.inc(3)
+    hook.observe(0.5)
+    second = worker.export(('sniffer_',))
+    delta = export_delta(first, second)
+    assert delta['sniffer_flows_total']['values'] == {(): 3}
+    # 没有变化的标签值省略
+    assert delta['sniffer_classified_total']['values'] == {}
+    assert delta['sniffer_hook_seconds']['values'] == {(): ((0, 1), 0.5, 1)}
+    assert delta['sniffer_active_flows']['values'] == {(): 4}
+
+    # 主进程按增量累加，第一次的增量是相对空导出
+    main = Registry()
+    main.counter('sniffer_flows_total', '请求数').inc(10)
+    main.merge(export_delta({}, first))
+    main.merge(delta)
+    assert main.counter('sniffer_flows_total', '请求数').get() == 15
+    assert main.counter('sniffer_classified_total', '分类结果', ['result']).values() == {('video',): 1}
+    assert main.histogram('sniffer_hook_seconds', '耗时', buckets=(0.1,)).values() == {(): ((1, 1), 0.55, 2)}
+    # 仪表不合并
+    assert 'sniffer_active_flows' not in main.metrics
\ No newline at end of file
@@ -0,0 +1,76 @@
+import pytest
+
+pytest.importorskip('mitmproxy')
+
+from mitmproxy.test import tflow, tutils
+
+from proxy_server import VideoSnifferAddon, response_metadata
+
+VIDEO_URL = 'https://finder.video.qq.com/251/20302/stodownload?encfilekey=x&video_id=1'
+
+
+def make_response(status, headers):
+    return tutils.tresp(status_code=status, headers=[(k.encode(), v.encode()) for k, v in headers.items()])
+
+
+def test_response_metadata_full_and_range():
+    meta = response_metadata(make_response(200, {
+        'Content-Type': 'video/mp4; codecs=avc1', 'Content-Length': '1000',
+        'ETag': '"v1"', 'Accept-Ranges': 'bytes'
+    }))
+    assert meta['content_type'] == 'video/mp4'
+    assert meta['total_size'] == 1000
+    assert meta['etag'] == '"v1"'
+    assert meta['accept_ranges']
+
+    meta = response_metadata(make_response(206, {
+        'Content-Type': 'video/mp4', 'Content-Length': '100', 'Content-Range': 'bytes 0-99/5000'
+    }))
+    assert meta['total_size'] == 5000
+    assert meta['accept_ranges']
+
+
+def test_response_metadata_unknown_size():
+    # 压缩过的响应 Content-Length 不是文件大小
+    meta = response_metadata(make_response(200, {'Content-Length': '10', 'Content-Encoding': 'gzip'}))
+    assert meta['total_size'] == 0
+    assert not meta['accept_ranges']
+    assert response_metadata(make_response(200, {'Content-Length': 'x'}))['total_size'] == 0
+
+
+def run_flow(addon, url, status, headers):
+    flow = tflow.tflow()
+    flow.request.url = url
+    addon.request(flow)
+    flow.response = make_response(status, headers)
+    addon.responseheaders(flow)
+    return flow
+
+
+def test_only_successful_video_responses_are_captured():
+    captured = []
+    addon = VideoSnifferAddon(lambda url, headers, meta: captured.append((url, meta['status_code'])))
+
+    run_flow(addon, VIDEO_URL, 403, {'Content-Type': 'video/mp4'})
+    run_flow(addon, VIDEO_URL, 200, {'Content-Type': 'text/html'})
+    assert captured == []
+    assert addon.rejected == 2
+
+    flow = run_flow(addon, VIDEO_URL, 206, {'Content-Type': 'video/mp4', 'Content-Range': 'bytes 0-9/10'})
+    assert captured == [(VIDEO_URL, 206)]
+    assert flow.response.stream
+
+
+def test_redirect_is_followed():
+    captured = []
+    addon = VideoSnifferAddon(lambda url, headers, meta: captured.append(url))
+
+    run_flow(addon, VIDEO_URL, 302, {'Location': 'https://cdn.example.com/v.mp4'})
+    assert captured == [] and addon.rejected == 0
+
+    # 跳转目标不在视频域名里，也要记录
+    run_flow(addon, 'https://cdn.example.com/v.mp4', 200, {'Content-Type': 'video/mp4'})
+    assert captured == ['https://cdn.example.com/v.mp4']
+    # 只转交一次
+    run_flow(addon, 'https://cdn.example.com/v.mp4', 200, {'Content-Type': 'video/mp4'})
+    assert len(captured) == 1
\ No newline at end of file
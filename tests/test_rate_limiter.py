@@ -0,0 +1,33 @@
+import pytest
+
+from rate_limiter import BandwidthLimiter, TokenBucket
+
+
+def test_token_bucket_overdraft():
+    bucket = TokenBucket(rate=1000, burst_seconds=1.0)
+    # 一次取走大块数据，按欠额等待
+    assert bucket.reserve(3000) == pytest.approx(3.0, abs=0.05)
+    assert bucket.reserve(1000) == pytest.approx(4.0, abs=0.05)
+
+
+def test_unlimited_bucket():
+    assert TokenBucket(0).reserve(10 ** 9) == 0.0
+
+
+def test_limiter_uses_longest_wait():
+    limiter = BandwidthLimiter(global_rate=10000, host_rate=1000)
+    limiter.set_host_rate(500, host='slow.example.com')
+
+    class Task:
+        rate_bucket = limiter.new_task_bucket()
+
+    assert limiter.reserve(Task, 'fast.example.com', 2000) == pytest.approx(2.0, abs=0.05)
+    assert limiter.reserve(Task, 'slow.example.com', 1000) == pytest.approx(2.0, abs=0.05)
+
+
+def test_proxy_headroom():
+    limiter = BandwidthLimiter()
+    limiter.set_proxy_headroom(link_rate=1000, reserve_rate=400)
+    assert limiter.get_stats()['global_rate'] == 0
+    limiter.note_proxy_activity()
+    assert limiter.get_stats()['global_rate'] == 600
\ No newline at end of file
@@ -0,0 +1,60 @@
+import os
+
+from download_manager import DownloadTask
+from resumable import ResumeState, parse_content_range
+
+
+def make_partial(tmp_path, server, offset, etag):
+    """模拟上次下载到 offset 时中断"""
+    save_path = str(tmp_path / 'video.mp4')
+    with open(save_path + '.part', 'wb') as f:
+        f.write(server.data[:offset])
+    state = ResumeState(save_path + '.part.json', server.url)
+    state.etag = etag
+    state.total_size = len(server.data)
+    state.offset = offset
+    state.save()
+    return DownloadTask(1, server.url, save_path, max_retries=0)
+
+
+def test_resume_with_matching_validator(tmp_path, file_server):
+    task = make_partial(tmp_path, file_server, 100000, '"v1"')
+    task.start()
+
+    assert task.status == 'completed', task.error
+    assert file_server.requests[-1]['Range'] == 'bytes=100000-'
+    assert file_server.requests[-1]['If-Range'] == '"v1"'
+    with open(task.save_path, 'rb') as f:
+        assert f.read() == file_server.data
+    assert not os.path.exists(task.part_path)
+    assert not os.path.exists(task.state_path)
+
+
+def test_changed_file_downloads_from_start(tmp_path, file_server):
+    # 本地的前半部分属于旧版本文件
+    task = make_partial(tmp_path, file_server, 100000, '"v0"')
+    with open(task.part_path, 'r+b') as f:
+        f.write(b'\0' * 100000)
+    task.start()
+
+    assert task.status == 'completed', task.error
+    assert file_server.requests[-1]['If-Range'] == '"v0"'
+    with open(task.save_path, 'rb') as f:
+        assert f.read() == file_server.data
+
+
+def test_state_for_another_url_is_ignored(tmp_path):
+    state = ResumeState(str(tmp_path / 'a.part.json'), 'https://a/1.mp4')
+    state.offset = 10
+    state.save()
+    assert ResumeState.load(state.path, 'https://a/2.mp4') is None
+    assert ResumeState.load(state.path, 'https://a/1.mp4').offset == 10
+
+
+def test_weak_etag_falls_back_to_last_modified(tmp_path):
+    state = ResumeState(str(tmp_path / 'a.part.json'), 'https://a/1.mp4')
+    state.update_validators({'ETag': 'W/"x"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+    assert state.validator() == 'Mon, 01 Jan 2024 00:00:00 GMT'
+    assert parse_content_range('bytes 5-9/100') == (5, 9, 100)
+    assert parse_content_range('bytes 5-9/*') == (5, 9, 0)
+    assert parse_content_range('garbage') is None
\ No newline at end of file
@@ -0,0 +1,94 @@
+import json
+
+from storage import DEFAULT_PATHS, JournalStore, SqliteStore
+from video_database import VideoDatabase
+
+
+def test_replay_after_compaction(tmp_path):
+    path = str(tmp_path / 'videos.json')
+    db = VideoDatabase(path, compact_threshold=1000)
+    first = db.add_video('https://finder.video.qq.com/a.mp4?token=1')
+    db.add_video('https://finder.video.qq.com/b.mp4?token=1')
+    db.store.compact()
+    # 压缩之后的变更只在新日志里
+    db.update_video(first['id'], {'downloaded': True})
+    db.add_video('https://finder.video.qq.com/c.mp4?token=1')
+    db.close()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        assert len(json.load(f)['videos']) == 2
+
+    db = VideoDatabase(path)
+    assert sorted(v['filename'] for v in db.get_all()) == ['a.mp4', 'b.mp4', 'c.mp4']
+    assert db.get_by_id(first['id'])['downloaded'] is True
+    assert db.get_downloaded_count() == 1
+    assert db.next_id == 4
+    db.close()
+
+
+def test_interrupted_compaction_replays_old_log(tmp_path):
+    path = str(tmp_path / 'videos.json')
+    store = JournalStore(path, snapshot_fn=None)
+    store.load()
+    store.close()
+    # 模拟压缩时崩溃：旧日志已切换但快照还没写
+    with open(path + '.log.old', 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'op': 'add', 'video': {'id': 1, 'url': 'u1'}}) + '\n')
+    with open(path + '.log', 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'op': 'update', 'id': 1, 'updates': {'downloaded': True}}) + '\n')
+        f.write('{"op": "add", "vid')     # 写了一半的最后一行
+
+    store = JournalStore(path, snapshot_fn=None)
+    videos, next_id = store.load()
+    store.close()
+    assert videos == [{'id': 1, 'url': 'u1', 'downloaded': True}]
+    assert next_id == 2
+    assert not (tmp_path / 'videos.json.log.old').exists()
+
+def make_video(video_id, capture_time, domain='a.qq.com', downloaded=False):
+    return {'id': video_id, 'url': f'https://{domain}/{video_id}.mp4', 'capture_time': capture_time,
+            'domain': domain, 'downloaded': downloaded}
+
+
+def test_sqlite_query_and_count(tmp_path):
+    store = SqliteStore(str(tmp_path / 'videos.db'))
+    store.write([
+        {'op': 'add', 'video': make_video(1, '2024-01-01T00:00:00')},
+        {'op': 'add', 'video': make_video(2, '2024-01-02T00:00:00', domain='b.qq.com')},
+        {'op': 'add', 'video': make_video(3, '2024-01-03T00:00:00')},
+        {'op': 'add', 'video': make_video(4, '2024-01-04T00:00:00')},
+        {'op': 'update', 'id': 3, 'updates': {'downloaded': True}},
+    ])
+
+    assert store.query_ids() == [4, 3, 2, 1]
+    assert store.query_ids(domain='a.qq.com') == [4, 3, 1]
+    assert store.query_ids(downloaded=False) == [4, 2, 1]
+    assert store.query_ids(since='2024-01-02', until='2024-01-04') == [3, 2]
+    assert store.query_ids(limit=2, offset=1) == [3, 2]
+    assert store.query_ids(offset=3) == [1]
+    assert store.count() == 4
+    assert store.count(domain='a.qq.com', downloaded=True) == 1
+
+    store.write([{'op': 'clear', 'next_id': 5}])
+    assert store.count() == 0
+    store.close()
+
+    videos, next_id = SqliteStore(str(tmp_path / 'videos.db')).load()
+    assert videos == [] and next_id == 5
+
+
+def test_backends_answer_queries_alike(tmp_path):
+    results = {}
+    for backend, name in DEFAULT_PATHS.items():
+        db = VideoDatabase(str(tmp_path / name), backend=backend)
+        for i in range(5):
+            video = db.add_video(f'https://finder.video.qq.com/{i}.mp4?encfilekey={i}')
+            if i % 2:
+                db.update_video(video['id'], {'downloaded': True})
+        results[backend] = (
+            [v['id'] for v in db.query(downloaded=True)],
+            [v['id'] for v in db.query(limit=2, offset=1)],
+            db.count(domain='finder.video.qq.com', downloaded=False)
+        )
+        db.close()
+    assert results['journal'] == results['sqlite'] == ([4, 2], [4, 3], 3)
\ No newline at end of file
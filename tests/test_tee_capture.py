@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+pytest.importorskip('mitmproxy')
+
+from mitmproxy.test import tflow, tutils
+
+from tee_capture import VideoTee
+
+URL = 'https://finder.video.qq.com/251/20302/stodownload?encfilekey=x&video_id=1'
+DATA = bytes(range(256)) * 40
+
+
+def make_flow(status, headers):
+    flow = tflow.tflow()
+    flow.request.url = URL
+    flow.response = tutils.tresp(status_code=status,
+                                 headers=[(k.encode(), v.encode()) for k, v in headers.items()])
+    return flow
+
+
+def ranged_flow(start, end):
+    return make_flow(206, {'Content-Range': f'bytes {start}-{end - 1}/{len(DATA)}', 'ETag': '"v1"'})
+
+
+def feed(flow, data, chunk=1000):
+    for i in range(0, len(data), chunk):
+        assert flow.response.stream(data[i:i + chunk]) == data[i:i + chunk]
+    flow.response.stream(b'')
+
+
+async def wait_closed(tee):
+    while tee.active:
+        await asyncio.sleep(0.01)
+
+
+def test_full_response_without_size(tmp_path):
+    done = []
+    tee = VideoTee(str(tmp_path), lambda url, headers, info: done.append(info))
+    flow = make_flow(200, {})
+    assert tee.attach(flow, {}, {})
+    feed(flow, DATA)
+    tee.flush()
+
+    info = done[0]
+    assert info['complete'] and info['offset'] == len(DATA)
+    assert info['sha256'] == hashlib.sha256(DATA).hexdigest()
+    with open(info['path'], 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_ranges_continue_after_saved_offset(tmp_path):
+    done = []
+    tee = VideoTee(str(tmp_path), lambda url, headers, info: done.append(info), save_interval=1000)
+
+    async def play():
+        first = ranged_flow(0, 3000)
+        assert tee.attach(first, {}, {'etag': '"v1"', 'total_size': len(DATA)})
+        feed(first, DATA[:3000])
+        await wait_closed(tee)
+        assert len(tee.idle) == 1 and not done
+
+        # 起点不接在已保存部分之后、ETag 变了的响应只转发
+        assert not tee.attach(ranged_flow(5000, len(DATA)), {}, {'etag': '"v1"'})
+        assert not tee.attach(ranged_flow(3000, len(DATA)), {}, {'etag': '"v2"'})
+
+        rest = ranged_flow(3000, len(DATA))
+        assert tee.attach(rest, {}, {'etag': '"v1"', 'total_size': len(DATA)})
+        feed(rest, DATA[3000:])
+        await wait_closed(tee)
+
+    asyncio.run(play())
+    tee.flush()
+    assert not tee.idle
+    info = done[0]
+    assert info['complete'] and info['offset'] == len(DATA)
+    with open(info['path'], 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_next_range_follows_pending_writes(tmp_path):
+    done = []
+    tee = VideoTee(str(tmp_path), lambda url, headers, info: done.append(info))
+    gate = threading.Event()
+    tee.submit(gate.wait)   # 写盘线程还没开始写
+
+    first = ranged_flow(0, 3000)
+    assert tee.attach(first, {}, {'total_size': len(DATA)})
+    feed(first, DATA[:3000])
+    rest = ranged_flow(3000, len(DATA))
+    assert tee.attach(rest, {}, {'total_size': len(DATA)})
+    feed(rest, DATA[3000:])
+    gate.set()
+    tee.flush()
+
+    assert len(done) == 1 and done[0]['complete']
+    with open(done[0]['path'], 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_handed_off_file_is_renamed(tmp_path):
+    done = []
+    tee = VideoTee(str(tmp_path), lambda url, headers, info: done.append(info))
+    for _ in range(2):
+        flow = make_flow(200, {})
+        assert tee.attach(flow, {}, {})
+        feed(flow, DATA)
+        tee.flush()
+    # 同一个视频交出后可以重新写，交出的文件不会被覆盖
+    assert len({info['path'] for info in done}) == 2
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ['tee.lock'] + [os.path.basename(info[k]) for info in done for k in ('path', 'state_path')])
+
+
+def hold_video(directory, ready, release):
+    tee = VideoTee(directory, lambda url, headers, info: None)
+    flow = make_flow(200, {})
+    assert tee.attach(flow, {}, {})
+    ready.set()
+    release.wait(10)
+    flow.response.stream(b'')
+    tee.flush()
+
+
+def test_one_process_writes_a_video(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    ready, release = context.Event(), context.Event()
+    process = context.Process(target=hold_video, args=(str(tmp_path), ready, release))
+    process.start()
+    try:
+        assert ready.wait(30)
+        tee = VideoTee(str(tmp_path), lambda url, headers, info: None)
+        assert not tee.attach(make_flow(200, {}), {}, {})
+        release.set()
+        process.join(10)
+        assert tee.attach(make_flow(200, {}), {}, {})
+    finally:
+        release.set()
+        process.join(10)
+
+
+def test_interrupted_response_is_handed_off_with_saved_offset(tmp_path):
+    done = []
+    tee = VideoTee(str(tmp_path), lambda url, headers, info: done.append(info), idle_timeout=0.05)
+
+    async def play():
+        flow = ranged_flow(0, len(DATA))
+        assert tee.attach(flow, {}, {'total_size': len(DATA)})
+        flow.response.stream(DATA[:4000])
+        tee.abort(flow)
+        while not done:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(play())
+    info = done[0]
+    assert not info['complete'] and info['offset'] == 4000
+    assert os.path.getsize(info['path']) == 4000
+
+
+def test_backlog_limit_stops_teeing(tmp_path):
+    done = []
+    tee = VideoTee(str(tmp_path), lambda url, headers, info: done.append(info), max_pending=100)
+    flow = make_flow(200, {'Content-Length': str(len(DATA))})
+    assert tee.attach(flow, {}, {'total_size': len(DATA)})
+    # 数据照常转发，只是不再保存
+    feed(flow, DATA)
+    tee.flush()
+    assert not done[0]['complete'] and done[0]['offset'] == 0
\ No newline at end of file
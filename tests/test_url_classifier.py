@@ -0,0 +1,29 @@
+from url_classifier import UrlClassifier, extract_host
+
+
+def test_video_hosts_and_patterns():
+    classifier = UrlClassifier()
+    assert classifier.is_video_url('https://finder.video.qq.com/251/20302/stodownload?encfilekey=x&video_id=1')
+    assert classifier.is_video_url('https://a.b.v.qq.com/path/movie.mp4?x=1')
+    assert not classifier.is_video_url('https://finder.video.qq.com/index.html')
+    assert not classifier.is_video_url('https://example.com/movie.mp4')
+    assert not classifier.is_video_url('https://evilv.qq.com/movie.mp4')
+    assert not classifier.is_video_url('https://wxsnsdythumb.tc.qq.com/thumb/x.mp4')
+    assert not classifier.is_video_url('not a url')
+
+
+def test_host_pattern_matches_same_hosts():
+    import re
+    pattern = re.compile(UrlClassifier(hosts=['a.example.com'], suffixes=['v.qq.com']).host_pattern())
+    assert pattern.match('a.example.com:443')
+    assert pattern.match('x.y.v.qq.com:443')
+    assert not pattern.match('b.example.com:443')
+    assert not pattern.match('evilv.qq.com:443')
+
+
+def test_media_type_and_host():
+    classifier = UrlClassifier()
+    assert classifier.is_media_type('video/mp4')
+    assert classifier.is_media_type(None)
+    assert not classifier.is_media_type('text/html; charset=utf-8')
+    assert extract_host('https://user@Finder.Video.QQ.com:8443/x') == 'finder.video.qq.com'
\ No newline at end of file
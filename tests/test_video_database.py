@@ -0,0 +1,123 @@
+import time
+
+from video_database import VideoDatabase
+
+
+def test_batched_writes_are_coalesced(tmp_path):
+    path = str(tmp_path / 'videos.json')
+    db = VideoDatabase(path, durability='batched', commit_window=0.5, commit_max_records=1000)
+    for i in range(50):
+        db.add_video(f'https://finder.video.qq.com/{i}.mp4?encfilekey={i}')
+    db.close()
+
+    stats = db.get_commit_stats()
+    assert stats['writes'] == 50 and stats['pending'] == 0
+    assert stats['commits'] <= 2
+    assert VideoDatabase(path).get_count() == 50
+
+
+def test_max_records_triggers_commit(tmp_path):
+    db = VideoDatabase(str(tmp_path / 'videos.json'), durability='batched',
+                       commit_window=30, commit_max_records=10)
+    for i in range(10):
+        db.add_video(f'https://finder.video.qq.com/{i}.mp4?encfilekey={i}')
+    # 攒够条数就提交，不用等满时间窗口
+    deadline = time.monotonic() + 5
+    while db.get_commit_stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert db.get_commit_stats()['commits'] == 1
+    db.close()
+
+
+def test_failed_commit_is_not_counted(tmp_path):
+    db = VideoDatabase(str(tmp_path / 'videos.json'))
+
+    def fail(ops):
+        raise OSError('disk full')
+
+    write, db.store.write = db.store.write, fail
+    db.add_video('https://finder.video.qq.com/1.mp4?encfilekey=1')
+    stats = db.get_commit_stats()
+    assert stats['writes'] == 1 and stats['commits'] == 0 and stats['coalesced'] == 0
+
+    db.store.write = write
+    db.add_video('https://finder.video.qq.com/2.mp4?encfilekey=2')
+    assert db.get_commit_stats()['commits'] == 1
+    db.close()
+
+def test_same_video_with_new_signature_is_not_added_twice(tmp_path):
+    db = VideoDatabase(str(tmp_path / 'videos.json'))
+    meta = {'total_size': 1000, 'etag': '"a"'}
+    video = db.add_video('https://finder.video.qq.com/v.mp4?encfilekey=abc&token=1&t=100', meta=meta)
+    assert video is not None
+
+    assert db.add_video('https://finder.video.qq.com/v.mp4?encfilekey=abc&token=2&t=200', meta=meta) is None
+    assert db.get_count() == 1
+    # 还没下载的换成新URL
+    assert db.get_by_id(video['id'])['url'].endswith('token=2&t=200')
+    assert db.get_by_url('https://finder.video.qq.com/v.mp4?encfilekey=abc&token=2&t=200')
+
+    # 不同的文件参数是不同的视频
+    assert db.add_video('https://finder.video.qq.com/v.mp4?encfilekey=xyz&token=1', meta=meta) is not None
+    assert db.get_count() == 2
+    db.close()
+
+
+def test_same_canonical_url_with_different_content_is_kept(tmp_path):
+    db = VideoDatabase(str(tmp_path / 'videos.json'))
+    first = db.add_video('https://finder.video.qq.com/v.mp4?encfilekey=abc&t=1',
+                         meta={'total_size': 1000, 'etag': '"a"'})
+    # 只差被忽略的参数，但大小或ETag不同
+    assert db.add_video('https://finder.video.qq.com/v.mp4?encfilekey=abc&t=2',
+                        meta={'total_size': 2000}) is not None
+    assert db.add_video('https://finder.video.qq.com/v.mp4?encfilekey=abc&t=3',
+                        meta={'total_size': 1000, 'etag': '"b"'}) is not None
+    # 大小未知时不能确认
+    assert db.add_video('https://finder.video.qq.com/v.mp4?encfilekey=abc&t=4') is not None
+    assert db.get_count() == 4
+    assert db.get_by_id(first['id'])['url'].endswith('t=1')
+    db.close()
+
+
+def test_downloaded_video_keeps_its_url(tmp_path):
+    db = VideoDatabase(str(tmp_path / 'videos.json'))
+    meta = {'total_size': 1000}
+    video = db.add_video('https://finder.video.qq.com/v.mp4?encfilekey=abc&token=1', meta=meta)
+    db.update_video(video['id'], {'downloaded': True})
+
+    assert db.add_video('https://finder.video.qq.com/v.mp4?encfilekey=abc&token=2', meta=meta) is None
+    assert db.get_by_id(video['id'])['url'].endswith('token=1')
+    db.close()
+
+def test_changes_since(tmp_path):
+    db = VideoDatabase(str(tmp_path / 'videos.json'), change_log_size=5)
+    start = db.changes_since(None)
+    assert start['reset'] and start['count'] == 0
+
+    a = db.add_video('https://finder.video.qq.com/a.mp4?encfilekey=a')
+    version = db.changes_since(start['version'])['version']
+    b = db.add_video('https://finder.video.qq.com/b.mp4?encfilekey=b')
+    db.update_video(a['id'], {'downloaded': True})
+    db.update_video(b['id'], {'file_size': 10})
+
+    feed = db.changes_since(version)
+    assert not feed['reset']
+    assert [v['id'] for v in feed['inserted']] == [b['id']]
+    # 新插入又更新过的只出现在 inserted 中
+    assert [v['id'] for v in feed['updated']] == [a['id']]
+    assert feed['inserted'][0]['file_size'] == 10
+    assert feed['count'] == 2 and feed['downloaded'] == 1
+
+    unchanged = db.changes_since(feed['version'])
+    assert not unchanged['reset'] and not unchanged['inserted'] and not unchanged['updated']
+
+    # 超出变更日志长度
+    for i in range(6):
+        db.update_video(a['id'], {'file_size': i})
+    assert db.changes_since(feed['version'])['reset']
+
+    version = db.changes_since(None)['version']
+    db.clear()
+    feed = db.changes_since(version)
+    assert feed['reset'] and feed['count'] == 0
+    db.close()
\ No newline at end of file
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+URL分类模块 - 判断代理请求是否是视频
+"""
+
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+# 只匹配这些主机名本身
+VIDEO_HOSTS = (
+    'channels.weixin.qq.com',
+    'finder.video.qq.com',
+    'findermp.video.qq.com',
+    'wxsnsdy.tc.qq.com',
+    'wxsnsdythumb.tc.qq.com',
+)
+
+# 这些域名及其所有子域名
+VIDEO_SUFFIXES = (
+    'v.qq.com',
+)
+
+# URL特征
+VIDEO_PATTERNS = (
+    r'\.mp4(\?.*)?$',
+    r'\.m4v(\?.*)?$',
+    r'\.m3u8(\?.*)?$',
+    r'/findersnsvideo/',
+    r'/findermp/',
+    r'video_id=',
+    r'media_id=',
+)
+
+# 缩略图等，URL中出现即排除
+EXCLUDE_WORDS = ('thumb', 'cover', 'avatar')
+
+# 视频响应的 Content-Type（前缀匹配），其他类型（网页、JSON、图片）是误判
+MEDIA_TYPES = (
+    'video/',
+    'audio/',
+    'application/vnd.apple.mpegurl',
+    'application/x-mpegurl',
+    'application/mp4',
+    'application/octet-stream',
+    'binary/octet-stream',
+)
+
+
+class UrlClassifier:
+    """视频URL分类器
+
+    规则在创建时编译一次：主机名先查精确集合，再按标签逐级查后缀集合，
+    结果按主机名缓存在LRU中，非视频域名的请求只需一次哈希查找就能排除；
+    只有视频域名的请求才会用合并后的正则检查URL。
+    """
+
+    def __init__(self, hosts=VIDEO_HOSTS, suffixes=VIDEO_SUFFIXES,
+                 patterns=VIDEO_PATTERNS, excludes=EXCLUDE_WORDS, media_types=MEDIA_TYPES,
+                 cache_size=4096):
+        self.rules = {
+            'hosts': tuple(hosts), 'suffixes': tuple(suffixes), 'patterns': tuple(patterns),
+            'excludes': tuple(excludes), 'media_types': tuple(media_types), 'cache_size': cache_size
+        }   # 创建参数，用于在其他进程中重建
+        self.hosts = frozenset(h.lower() for h in hosts)
+        self.suffixes = frozenset(s.lower().lstrip('.') for s in suffixes)
+        self.pattern = re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE) \
+            if patterns else None
+        self.exclude = re.compile('|'.join(re.escape(w) for w in excludes), re.IGNORECASE) \
+            if excludes else None
+        self.media_types = tuple(t.lower() for t in media_types)
+        self.host_matches = lru_cache(maxsize=cache_size)(self._match_host)
+
+    @property
+    def domains(self):
+        """所有规则中的域名（精确主机名和后缀）"""
+        return sorted(self.hosts | self.suffixes)
+
+    def host_pattern(self, extra_hosts=()):
+        """匹配 "主机名:端口" 的正则（mitmproxy 的 allow_hosts 格式），规则与 host_matches 相同"""
+        exact = sorted(self.hosts | {h.lower() for h in extra_hosts})
+        parts = [re.escape(h) for h in exact]
+        parts += [r'(?:[^.:]+\.)*' + re.escape(s) for s in sorted(self.suffixes)]
+        return r'^(?:' + '|'.join(parts) + r')(?::\d+)?$'
+
+    def _match_host(self, host):
+        """主机名是否属于视频域名（host 已转为小写）"""
+        if host in self.hosts or host in self.suffixes:
+            return True
+        dot = host.find('.')
+        while dot != -1:
+            if host[dot + 1:] in self.suffixes:
+                return True
+            dot = host.find('.', dot + 1)
+        return False
+
+    def is_video_url(self, url):
+        """判断是否是视频URL"""
+        try:
+            host = extract_host(url)
+        except ValueError:
+            return False
+        if not host or not self.host_matches(host):
+            return False
+        if self.pattern is None or not self.pattern.search(url):
+            return False
+        return self.exclude is None or not self.exclude.search(url)
+
+    def is_media_type(self, content_type):
+        """响应的 Content-Type 是否是视频（没有 Content-Type 时无法判断，按是处理）"""
+        content_type = (content_type or '').split(';')[0].strip().lower()
+        return not content_type or content_type.startswith(self.media_types)
+
+    def cache_info(self):
+        """主机名缓存的命中统计"""
+        return self.host_matches.cache_info()
+
+
+def extract_host(url):
+    """取出URL中的主机名（小写，不含端口和用户信息）
+
+    常见的 scheme://host/path 形式直接切片，不完整解析整个URL。
+    """
+    start = url.find('://')
+    if start == -1:
+        return urlsplit(url).hostname
+    start += 3
+    end = len(url)
+    for sep in '/?#':
+        i = url.find(sep, start, end)
+        if i != -1:
+            end = i
+    netloc = url[start:end]
+    if '@' in netloc or '[' in netloc:
+        return urlsplit(url).hostname
+    colon = netloc.find(':')
+    if colon != -1:
+        netloc = netloc[:colon]
+    return netloc.lower()
+
+
+default_classifier = UrlClassifier()
\ No newline at end of file
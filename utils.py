@@ -1,141 +1,167 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-工具函数模块
-"""
-
-import re
-import hashlib
-from datetime import datetime
-from urllib.parse import urlparse, unquote
-
-
-def format_size(size):
-    """格式化文件大小"""
-    if size == 0:
-        return '未知'
-    units = ['B', 'KB', 'MB', 'GB', 'TB']
-    unit_index = 0
-    size = float(size)
-    while size >= 1024 and unit_index < len(units) - 1:
-        size /= 1024
-        unit_index += 1
-    return f"{size:.2f} {units[unit_index]}"
-
-
-def format_speed(speed):
-    """格式化速度"""
-    if speed == 0:
-        return '0 B/s'
-    return f"{format_size(speed)}/s"
-
-
-def extract_filename(url):
-    """从URL提取文件名"""
-    try:
-        # 尝试从URL路径提取
-        parsed = urlparse(url)
-        path = unquote(parsed.path)
-        
-        # 匹配视频文件
-        match = re.search(r'/([^/]+\.(?:mp4|m4v|m3u8|ts))(?:\?|$)', path)
-        if match:
-            return sanitize_filename(match.group(1))
-        
-        # 使用时间戳
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
-        return f"video_{timestamp}_{url_hash}.mp4"
-        
-    except Exception as e:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        return f"video_{timestamp}.mp4"
-
-
-def sanitize_filename(filename):
-    """清理文件名中的非法字符"""
-    # Windows 非法字符
-    illegal_chars = r'[<>:"/\\|?*]'
-    filename = re.sub(illegal_chars, '_', filename)
-    
-    # 限制长度
-    if len(filename) > 200:
-        name, ext = filename.rsplit('.', 1) if '.' in filename else (filename, '')
-        filename = name[:190] + ('.' + ext if ext else '')
-    
-    return filename
-
-
-def is_video_url(url):
-    """判断是否是视频URL"""
-    # 域名特征
-    weixin_domains = [
-        'channels.weixin.qq.com',
-        'finder.video.qq.com',
-        'findermp.video.qq.com',
-        'wxsnsdy.tc.qq.com',
-        'wxsnsdythumb.tc.qq.com',
-        'v.qq.com'
-    ]
-    
-    # URL特征
-    video_patterns = [
-        r'\.mp4(\?.*)?$',
-        r'\.m4v(\?.*)?$',
-        r'\.m3u8(\?.*)?$',
-        r'/findersnsvideo/',
-        r'/findermp/',
-        r'video_id=',
-        r'media_id='
-    ]
-    
-    # 检查域名
-    try:
-        domain = urlparse(url).hostname
-        if any(d in domain for d in weixin_domains):
-            # 检查URL模式
-            if any(re.search(p, url, re.IGNORECASE) for p in video_patterns):
-                # 排除缩略图
-                if not any(x in url.lower() for x in ['thumb', 'cover', 'avatar']):
-                    return True
-    except:
-        pass
-    
-    return False
-
-
-def extract_cover_url(video_url):
-    """尝试从视频URL提取封面URL"""
-    cover_patterns = [
-        # 替换路径
-        lambda u: u.replace('/findersnsvideo/', '/findersnscover/'),
-        lambda u: u.replace('/video/', '/cover/'),
-        # 替换扩展名
-        lambda u: re.sub(r'\.mp4(\?|$)', r'_thumb.jpg\1', u),
-        lambda u: re.sub(r'\.mp4(\?|$)', r'.jpg\1', u),
-    ]
-    
-    for pattern in cover_patterns:
-        try:
-            cover_url = pattern(video_url)
-            if cover_url != video_url:
-                return cover_url
-        except:
-            continue
-    
-    return None
-
-
-def format_time(seconds):
-    """格式化时间"""
-    if seconds < 60:
-        return f"{int(seconds)}秒"
-    elif seconds < 3600:
-        minutes = int(seconds / 60)
-        secs = int(seconds % 60)
-        return f"{minutes}分{secs}秒"
-    else:
-        hours = int(seconds / 3600)
-        minutes = int((seconds % 3600) / 60)
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+工具函数模块
+"""
+
+import re
+import hashlib
+from datetime import datetime
+from urllib.parse import urlparse, unquote, parse_qsl, urlencode, urlunparse
+from url_classifier import default_classifier
+
+# 签名、过期时间等每次请求都会变的参数，不影响内容（所有主机）
+VOLATILE_PARAMS = {
+    'token', 'sign', 'signature', 'sig', 'expires', 'expire', 'x-expires',
+    'nonce', 'auth_key', 'authkey'
+}
+VOLATILE_PREFIXES = ('x-amz-', 'x-oss-', 'x-cos-')
+
+# 只对这些主机（及其子域名）忽略的参数，例如视频号CDN每次播放都会变的会话、统计参数。
+# 其他网站上 t、web 之类的参数可能区分不同的视频，不能忽略；需要时在这里按主机添加。
+HOST_VOLATILE_PARAMS = {
+    'qq.com': {
+        't', 'ts', 'timestamp', 'upid', 'uzid', 'taskid', 'basedata',
+        'extg', 'svrbypass', 'web', 'sessionid'
+    },
+}
+
+
+def format_size(size):
+    """格式化文件大小"""
+    if size == 0:
+        return '未知'
+    units = ['B', 'KB', 'MB', 'GB', 'TB']
+    unit_index = 0
+    size = float(size)
+    while size >= 1024 and unit_index < len(units) - 1:
+        size /= 1024
+        unit_index += 1
+    return f"{size:.2f} {units[unit_index]}"
+
+
+def format_speed(speed):
+    """格式化速度"""
+    if speed == 0:
+        return '0 B/s'
+    return f"{format_size(speed)}/s"
+
+
+def extract_filename(url):
+    """从URL提取文件名"""
+    try:
+        # 尝试从URL路径提取
+        parsed = urlparse(url)
+        path = unquote(parsed.path)
+
+        # 匹配视频文件
+        match = re.search(r'/([^/]+\.(?:mp4|m4v|m3u8|ts))(?:\?|$)', path)
+        if match:
+            return sanitize_filename(match.group(1))
+
+        # 使用时间戳
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
+        return f"video_{timestamp}_{url_hash}.mp4"
+
+    except Exception as e:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f"video_{timestamp}.mp4"
+
+
+def sanitize_filename(filename):
+    """清理文件名中的非法字符"""
+    # Windows 非法字符
+    illegal_chars = r'[<>:"/\\|?*]'
+    filename = re.sub(illegal_chars, '_', filename)
+
+    # 限制长度
+    if len(filename) > 200:
+        name, ext = filename.rsplit('.', 1) if '.' in filename else (filename, '')
+        filename = name[:190] + ('.' + ext if ext else '')
+
+    return filename
+
+
+def is_video_url(url):
+    """判断是否是视频URL（使用默认规则的 UrlClassifier）"""
+    return default_classifier.is_video_url(url)
+
+
+def volatile_params(host):
+    """主机的易变参数：通用的签名参数 + HOST_VOLATILE_PARAMS 中匹配的主机的参数"""
+    host = (host or '').lower()
+    params = VOLATILE_PARAMS
+    for suffix, extra in HOST_VOLATILE_PARAMS.items():
+        if host == suffix or host.endswith('.' + suffix):
+            params = params | extra
+    return params
+
+
+def canonicalize_url(url):
+    """规范化URL：去掉签名等易变参数，主机名小写，参数排序
+
+    同一个视频多次捕获时URL只差签名参数，规范化后相同。
+    """
+    try:
+        parsed = urlparse(url)
+        volatile = volatile_params(parsed.hostname)
+        params = sorted(
+            (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+            if k.lower() not in volatile and not k.lower().startswith(VOLATILE_PREFIXES)
+        )
+        return urlunparse((
+            parsed.scheme.lower(),
+            (parsed.hostname or '') + (f':{parsed.port}' if parsed.port else ''),
+            parsed.path,
+            '',
+            urlencode(params),
+            ''
+        ))
+    except:
+        return url
+
+
+def is_hls_url(url):
+    """判断是否是HLS播放列表"""
+    try:
+        return urlparse(url).path.lower().endswith('.m3u8')
+    except:
+        return False
+
+
+def extract_cover_url(video_url):
+    """尝试从视频URL提取封面URL"""
+    cover_patterns = [
+        # 替换路径
+        lambda u: u.replace('/findersnsvideo/', '/findersnscover/'),
+        lambda u: u.replace('/video/', '/cover/'),
+        # 替换扩展名
+        lambda u: re.sub(r'\.mp4(\?|$)', r'_thumb.jpg\1', u),
+        lambda u: re.sub(r'\.mp4(\?|$)', r'.jpg\1', u),
+    ]
+
+    for pattern in cover_patterns:
+        try:
+            cover_url = pattern(video_url)
+            if cover_url != video_url:
+                return cover_url
+        except:
+            continue
+
+    return None
+
+
+def format_time(seconds):
+    """格式化时间"""
+    if seconds < 60:
+        return f"{int(seconds)}秒"
+    elif seconds < 3600:
+        minutes = int(seconds / 60)
+        secs = int(seconds % 60)
+        return f"{minutes}分{secs}秒"
+    else:
+        hours = int(seconds / 3600)
+        minutes = int((seconds % 3600) / 60)
         return f"{hours}小时{minutes}分"
\ No newline at end of file
@@ -1,115 +1,411 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-视频数据库模块
-"""
-
-import json
-import os
-from datetime import datetime
-from threading import Lock
-from utils import extract_filename, extract_cover_url
-
-
-class VideoDatabase:
-    def __init__(self, db_path='videos.json'):
-        self.db_path = db_path
-        self.videos = []
-        self.lock = Lock()
-        self.load()
-    
-    def load(self):
-        """加载数据库"""
-        with self.lock:
-            if os.path.exists(self.db_path):
-                try:
-                    with open(self.db_path, 'r', encoding='utf-8') as f:
-                        self.videos = json.load(f)
-                except Exception as e:
-                    print(f"加载数据库失败: {e}")
-                    self.videos = []
-    
-    def save(self):
-        """保存数据库"""
-        with self.lock:
-            try:
-                with open(self.db_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.videos, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                print(f"保存数据库失败: {e}")
-    
-    def add_video(self, url, headers=None):
-        """添加视频"""
-        with self.lock:
-            # 检查是否已存在
-            if any(v['url'] == url for v in self.videos):
-                return None
-            
-            video_id = len(self.videos) + 1
-            filename = extract_filename(url)
-            cover_url = extract_cover_url(url)
-            
-            video = {
-                'id': video_id,
-                'url': url,
-                'filename': filename,
-                'cover_url': cover_url,
-                'capture_time': datetime.now().isoformat(),
-                'domain': self._extract_domain(url),
-                'referer': headers.get('Referer', '') if headers else '',
-                'user_agent': headers.get('User-Agent', '') if headers else '',
-                'downloaded': False,
-                'cover_downloaded': False,
-                'download_path': None,
-                'file_size': 0
-            }
-            
-            self.videos.append(video)
-            self.save()
-            return video
-    
-    def update_video(self, video_id, updates):
-        """更新视频信息"""
-        with self.lock:
-            for video in self.videos:
-                if video['id'] == video_id:
-                    video.update(updates)
-                    self.save()
-                    return True
-            return False
-    
-    def get_all(self):
-        """获取所有视频"""
-        with self.lock:
-            return sorted(self.videos, key=lambda x: x['capture_time'], reverse=True)
-    
-    def get_by_id(self, video_id):
-        """根据ID获取视频"""
-        with self.lock:
-            return next((v for v in self.videos if v['id'] == video_id), None)
-    
-    def clear(self):
-        """清空数据库"""
-        with self.lock:
-            self.videos = []
-            self.save()
-    
-    def get_count(self):
-        """获取视频数量"""
-        with self.lock:
-            return len(self.videos)
-    
-    def get_downloaded_count(self):
-        """获取已下载数量"""
-        with self.lock:
-            return sum(1 for v in self.videos if v.get('downloaded'))
-    
-    @staticmethod
-    def _extract_domain(url):
-        """提取域名"""
-        try:
-            from urllib.parse import urlparse
-            return urlparse(url).hostname
-        except:
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+视频数据库模块
+"""
+
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime
+import logging
+import time
+from threading import Condition, Lock, Thread
+from utils import extract_filename, extract_cover_url, canonicalize_url
+from media_index import same_file
+from storage import create_store
+
+logger = logging.getLogger(__name__)
+
+# 抓包时从响应头记录的字段（见 proxy_server.response_metadata），下载时用来省掉探测请求
+RESPONSE_FIELDS = ('status_code', 'content_type', 'total_size', 'etag', 'last_modified', 'accept_ranges')
+
+
+class VideoDatabase:
+    def __init__(self, db_path='videos.json', backend='journal', compact_threshold=1000,
+                 durability='per_write', commit_window=0.2, commit_max_records=100,
+                 change_log_size=1000):
+        self.db_path = db_path
+        self.videos = []        # 按 capture_time 升序排列
+        self.by_url = {}        # {url: video}
+        self.by_key = {}        # {规范化URL: video}，同一视频的不同签名URL
+        self.by_id = {}         # {video_id: video}
+        self.next_id = 1        # 单调递增，清空后也不复用
+        self.downloaded_total = 0
+        self.lock = Lock()
+
+        # 变更记录: 每次变更版本号加一，界面按版本号增量刷新
+        self.version = 0
+        self.changes = deque(maxlen=change_log_size)  # (version, 'insert'/'update'/'clear', video_id)
+        self.store = create_store(backend, db_path, self._snapshot,
+                                  compact_threshold=compact_threshold)
+
+        # 组提交: per_write 每次变更立即落盘；batched 在时间窗口内合并成一次写入
+        if durability not in ('per_write', 'batched'):
+            raise ValueError(f"未知的持久化模式: {durability}")
+        self.durability = durability
+        self.commit_window = commit_window
+        self.commit_max_records = commit_max_records
+        self.pending = []
+        self.commit_cond = Condition(self.lock)
+        self.commit_lock = Lock()       # 保证批次按顺序写入
+        self.closed = False
+        self.write_count = 0            # 变更次数
+        self.committed_count = 0        # 已落盘的变更数
+        self.commit_count = 0           # 实际落盘次数
+
+        self.load()
+
+        self.commit_thread = None
+        if durability == 'batched':
+            self.commit_thread = Thread(target=self._commit_loop, daemon=True)
+            self.commit_thread.start()
+
+    def load(self):
+        """加载数据库（回放快照 + 日志）"""
+        with self.lock:
+            try:
+                videos, self.next_id = self.store.load()
+            except Exception as e:
+                logger.error(f"加载数据库失败: {e}")
+                videos = []
+            self._rebuild_index(videos)
+
+    def save(self):
+        """保存数据库（把日志压缩成快照）"""
+        try:
+            self.store.compact()
+        except Exception as e:
+            logger.error(f"保存数据库失败: {e}")
+
+    def flush(self):
+        """立即提交所有待写入的变更"""
+        with self.commit_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            self._commit(batch)
+
+    def close(self):
+        """关闭数据库"""
+        with self.lock:
+            self.closed = True
+            self.commit_cond.notify_all()
+        if self.commit_thread:
+            self.commit_thread.join()
+        self.flush()
+        self.store.close()
+
+    def get_commit_stats(self):
+        """获取组提交统计"""
+        with self.lock:
+            return {
+                'durability': self.durability,
+                'writes': self.write_count,
+                'commits': self.commit_count,
+                'coalesced': self.committed_count - self.commit_count,
+                'pending': len(self.pending)
+            }
+
+    def _write(self, op):
+        """记录一条变更（调用方持有锁）"""
+        self.write_count += 1
+        if self.durability == 'per_write':
+            self._commit([op])
+            return
+
+        self.pending.append(op)
+        if len(self.pending) == 1 or len(self.pending) >= self.commit_max_records:
+            self.commit_cond.notify()
+
+    def _commit(self, batch):
+        """把一批变更写入存储并落盘"""
+        if not batch:
+            return
+        try:
+            self.store.write(batch)
+            self.store.flush()
+        except Exception as e:
+            logger.error(f"保存数据库失败: {e}")
+            return
+        self.committed_count += len(batch)
+        self.commit_count += 1
+
+    def _commit_loop(self):
+        """后台组提交线程"""
+        while True:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.commit_cond.wait()
+                if self.closed:
+                    return
+                # 第一条变更到达后再等一个窗口，期间的变更合并提交
+                deadline = time.monotonic() + self.commit_window
+                while len(self.pending) < self.commit_max_records and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.commit_cond.wait(remaining)
+            self.flush()
+
+    def _snapshot(self):
+        """获取当前全部记录的副本（供压缩使用）"""
+        with self.lock:
+            return [dict(v) for v in self.videos], self.next_id
+
+    def _rebuild_index(self, videos):
+        """重建内存索引（调用方持有锁）"""
+        self.videos = sorted(videos, key=lambda x: x['capture_time'])
+        self.by_url = {v['url']: v for v in self.videos}
+        self.by_key = {canonicalize_url(v['url']): v for v in self.videos}
+        self.by_id = {v['id']: v for v in self.videos}
+        self.downloaded_total = sum(1 for v in self.videos if v.get('downloaded'))
+        if self.videos:
+            self.next_id = max(self.next_id, max(self.by_id) + 1)
+
+    def _record_change(self, kind, video_id=None):
+        """记录一次变更（调用方持有锁）"""
+        self.version += 1
+        self.changes.append((self.version, kind, video_id))
+
+    def changes_since(self, version):
+        """获取 version 之后的变更
+
+        返回 {'version', 'reset', 'inserted', 'updated', 'count', 'downloaded'}，
+        inserted/updated 为记录的副本（按捕获时间升序）。
+        reset 为True表示变更记录已不完整（超出日志长度或清空过），需要重新读取全部记录。
+        """
+        with self.lock:
+            result = {
+                'version': self.version,
+                'reset': False,
+                'inserted': [],
+                'updated': [],
+                'count': len(self.videos),
+                'downloaded': self.downloaded_total
+            }
+            if version == self.version:
+                return result
+            if version is None or version > self.version or \
+                    not self.changes or self.changes[0][0] > version + 1:
+                result['reset'] = True
+                return result
+
+            inserted, updated = set(), set()
+            for change_version, kind, video_id in reversed(self.changes):
+                if change_version <= version:
+                    break
+                if kind == 'clear':
+                    result['reset'] = True
+                    return result
+                if kind == 'insert':
+                    inserted.add(video_id)
+                else:
+                    updated.add(video_id)
+
+            key = lambda x: x['capture_time']
+            result['inserted'] = sorted(
+                (dict(self.by_id[i]) for i in inserted if i in self.by_id), key=key
+            )
+            result['updated'] = sorted(
+                (dict(self.by_id[i]) for i in updated - inserted if i in self.by_id), key=key
+            )
+            return result
+
+    def add_video(self, url, headers=None, meta=None):
+        """添加视频（meta 为抓包时记录的响应信息）"""
+        with self.lock:
+            # 检查是否已存在
+            if url in self.by_url:
+                return None
+
+            # 同一个视频只是签名参数不同：规范化URL相同，而且响应的大小/ETag一致
+            key = canonicalize_url(url)
+            existing = self.by_key.get(key)
+            if existing and self._same_capture(existing, meta):
+                if not existing.get('downloaded'):
+                    # 还没下载的换成新URL，旧签名可能已经过期
+                    self._refresh_url(existing, url, headers, meta)
+                return None
+
+            video_id = self.next_id
+            self.next_id += 1
+            filename = extract_filename(url)
+            cover_url = extract_cover_url(url)
+
+            video = {
+                'id': video_id,
+                'url': url,
+                'filename': filename,
+                'cover_url': cover_url,
+                'capture_time': datetime.now().isoformat(),
+                'domain': self._extract_domain(url),
+                'referer': headers.get('Referer', '') if headers else '',
+                'user_agent': headers.get('User-Agent', '') if headers else '',
+                'downloaded': False,
+                'cover_downloaded': False,
+                'download_path': None,
+                'file_size': 0
+            }
+            video.update({field: (meta or {}).get(field) for field in RESPONSE_FIELDS})
+
+            # 捕获时间基本递增，insort 通常直接落在末尾
+            insort(self.videos, video, key=lambda x: x['capture_time'])
+            self.by_url[url] = video
+            self.by_key[key] = video
+            self.by_id[video_id] = video
+            self._write({'op': 'add', 'video': dict(video)})
+            self._record_change('insert', video_id)
+            return video
+
+    @staticmethod
+    def _same_capture(video, meta):
+        """新捕获与已有记录是不是同一个文件（规则与 MediaIndex 相同，大小未知时不能确认）"""
+        meta = meta or {}
+        return same_file(meta.get('total_size'), meta.get('etag'), video.get('total_size'), video.get('etag'))
+
+    def _refresh_url(self, video, url, headers, meta=None):
+        """更新视频的URL、请求头和响应信息（调用方持有锁）"""
+        updates = {'url': url}
+        if headers:
+            updates['referer'] = headers.get('Referer', '')
+            updates['user_agent'] = headers.get('User-Agent', '')
+        if meta:
+            updates.update({field: meta.get(field) for field in RESPONSE_FIELDS})
+        self._reindex_url(video, url)
+        video.update(updates)
+        self._write({'op': 'update', 'id': video['id'], 'updates': updates})
+        self._record_change('update', video['id'])
+
+    def _reindex_url(self, video, url):
+        """视频换成新URL时更新 by_url/by_key 索引（调用方持有锁）"""
+        if self.by_url.get(video['url']) is video:
+            del self.by_url[video['url']]
+        old_key = canonicalize_url(video['url'])
+        if self.by_key.get(old_key) is video:
+            del self.by_key[old_key]
+        self.by_url[url] = video
+        self.by_key[canonicalize_url(url)] = video
+
+    def update_video(self, video_id, updates):
+        """更新视频信息
+
+        更新 url 时同时更新URL索引；新URL（或规范化后）已属于其他视频时不更新，返回False。
+        """
+        with self.lock:
+            video = self.by_id.get(video_id)
+            if not video:
+                return False
+            url = updates.get('url')
+            if url is not None and url != video['url']:
+                other = self.by_url.get(url) or self.by_key.get(canonicalize_url(url))
+                if other is not None and other is not video:
+                    logger.warning(f"⚠️ URL已属于视频 {other['id']}，不更新视频 {video_id}")
+                    return False
+                self._reindex_url(video, url)
+            if 'downloaded' in updates:
+                self.downloaded_total += bool(updates['downloaded']) - bool(video.get('downloaded'))
+            video.update(updates)
+            self._write({'op': 'update', 'id': video_id, 'updates': dict(updates)})
+            self._record_change('update', video_id)
+            return True
+
+    def get_all(self):
+        """获取所有视频（按捕获时间倒序）"""
+        with self.lock:
+            return self.videos[::-1]
+
+    def query(self, domain=None, downloaded=None, since=None, until=None, limit=None, offset=0):
+        """按域名/下载状态/时间范围查询视频（按捕获时间倒序，支持分页）"""
+        since, until = self._time_bound(since), self._time_bound(until)
+
+        # 存储引擎支持查询时下推到索引（先提交待写入的变更）
+        if hasattr(self.store, 'query_ids'):
+            self.flush()
+            ids = self.store.query_ids(domain, downloaded, since, until, limit, offset)
+            with self.lock:
+                return [self.by_id[i] for i in ids if i in self.by_id]
+
+        with self.lock:
+            results = []
+            for video in self._iter_range(since, until):
+                if domain is not None and video['domain'] != domain:
+                    continue
+                if downloaded is not None and bool(video.get('downloaded')) != bool(downloaded):
+                    continue
+                if offset:
+                    offset -= 1
+                    continue
+                results.append(video)
+                if limit is not None and len(results) >= limit:
+                    break
+            return results
+
+    def count(self, domain=None, downloaded=None, since=None, until=None):
+        """按条件统计数量"""
+        since, until = self._time_bound(since), self._time_bound(until)
+
+        if hasattr(self.store, 'count'):
+            self.flush()
+            return self.store.count(domain, downloaded, since, until)
+
+        with self.lock:
+            return sum(
+                1 for video in self._iter_range(since, until)
+                if (domain is None or video['domain'] == domain)
+                and (downloaded is None or bool(video.get('downloaded')) == bool(downloaded))
+            )
+
+    def _iter_range(self, since, until):
+        """按时间范围倒序遍历（调用方持有锁）"""
+        key = lambda x: x['capture_time']
+        lo = bisect_left(self.videos, since, key=key) if since is not None else 0
+        hi = bisect_left(self.videos, until, key=key) if until is not None else len(self.videos)
+        for i in range(hi - 1, lo - 1, -1):
+            yield self.videos[i]
+
+    @staticmethod
+    def _time_bound(value):
+        """时间条件统一为ISO字符串"""
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def get_by_id(self, video_id):
+        """根据ID获取视频"""
+        with self.lock:
+            return self.by_id.get(video_id)
+
+    def get_by_url(self, url):
+        """根据URL获取视频（签名参数不同的同一视频也能找到）"""
+        with self.lock:
+            return self.by_url.get(url) or self.by_key.get(canonicalize_url(url))
+
+    def clear(self):
+        """清空数据库"""
+        with self.lock:
+            self.videos = []
+            self.by_url = {}
+            self.by_key = {}
+            self.by_id = {}
+            self.downloaded_total = 0
+            self._write({'op': 'clear', 'next_id': self.next_id})
+            self._record_change('clear')
+
+    def get_count(self):
+        """获取视频数量"""
+        with self.lock:
+            return len(self.videos)
+
+    def get_downloaded_count(self):
+        """获取已下载数量"""
+        with self.lock:
+            return self.downloaded_total
+
+    @staticmethod
+    def _extract_domain(url):
+        """提取域名"""
+        try:
+            from urllib.parse import urlparse
+            return urlparse(url).hostname
+        except:
             return 'unknown'
\ No newline at end of file
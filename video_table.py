@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+视频列表模块 - 表格模型和绘制进度条、按钮的委托
+"""
+
+from datetime import datetime
+from PyQt5.QtWidgets import (
+    QApplication, QStyle, QStyledItemDelegate, QStyleOptionButton, QStyleOptionProgressBar
+)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QEvent, QModelIndex, QRect, QSize, pyqtSignal
+
+COLUMNS = ['ID', '文件名', '域名', '捕获时间', '状态', '进度', '操作']
+COL_STATUS = 4
+COL_PROGRESS = 5
+COL_ACTIONS = 6
+
+VIDEO_ROLE = Qt.UserRole + 1       # 整条视频记录
+PROGRESS_ROLE = Qt.UserRole + 2    # 进度百分比
+CAN_DOWNLOAD_ROLE = Qt.UserRole + 3
+
+STATUS_TEXT = {
+    'downloading': '⬇️ 下载中',
+    'completed': '✅ 已完成',
+    'failed': '❌ 失败',
+    'cancelled': '⏹️ 已取消',
+    'paused': '⏸️ 已暂停',
+    'pending': '⏸️ 等待中'
+}
+
+
+def progress_text(info):
+    """进度条上显示的文字"""
+    text = f"{info['progress']}%"
+    if info['status'] == 'downloading':
+        text += f" - {info['speed_text']}"
+        if info.get('eta_text'):
+            text += f" - 剩余{info['eta_text']}"
+    return text
+
+
+def format_capture_time(value):
+    """捕获时间显示格式"""
+    try:
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return value or ''
+
+
+class VideoTableModel(QAbstractTableModel):
+    """视频列表模型
+
+    视图只向模型请求可见行的数据，几千行也不会创建任何控件；
+    下载进度只对变化的那一行发出 dataChanged。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.videos = []    # 按捕获时间倒序
+        self.rows = {}      # {video_id: row}
+        self.infos = {}     # {video_id: 下载任务的 get_info()}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.videos)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        video = self.videos[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return str(video['id'])
+            if column == 1:
+                return video['filename']
+            if column == 2:
+                return video['domain']
+            if column == 3:
+                return format_capture_time(video['capture_time'])
+            if column == COL_STATUS:
+                return self._status_text(video)
+            if column == COL_PROGRESS:
+                info = self.infos.get(video['id'])
+                if info and info['status'] == 'downloading':
+                    return progress_text(info)
+                return f"{self._progress(video)}%"
+            return None
+        if role == PROGRESS_ROLE:
+            return self._progress(video)
+        if role == CAN_DOWNLOAD_ROLE:
+            info = self.infos.get(video['id'])
+            return not info or info['status'] != 'downloading'
+        if role == VIDEO_ROLE:
+            return video
+        return None
+
+    def set_videos(self, videos, infos):
+        """替换全部数据（infos 为已有下载任务的 {video_id: get_info()}）"""
+        self.beginResetModel()
+        self.videos = list(videos)
+        self.rows = {video['id']: row for row, video in enumerate(self.videos)}
+        self.infos = dict(infos)
+        self.endResetModel()
+
+    def insert_videos(self, videos):
+        """在顶部插入新捕获的视频（videos 按捕获时间升序），比现有记录旧时返回False"""
+        videos = [video for video in videos if video['id'] not in self.rows]
+        if not videos:
+            return True
+        if self.videos and videos[0]['capture_time'] < self.videos[0]['capture_time']:
+            return False
+
+        self.beginInsertRows(QModelIndex(), 0, len(videos) - 1)
+        self.videos[0:0] = videos[::-1]
+        self.rows = {video['id']: row for row, video in enumerate(self.videos)}
+        self.endInsertRows()
+        return True
+
+    def update_videos(self, videos):
+        """更新已有的记录，只刷新这些行"""
+        for video in videos:
+            row = self.rows.get(video['id'])
+            if row is not None:
+                self.videos[row] = video
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+
+    def update_progress(self, video_id, info):
+        """下载进度事件：只刷新这一行的状态、进度和按钮"""
+        self.infos[video_id] = info
+        row = self.rows.get(video_id)
+        if row is not None:
+            self.dataChanged.emit(self.index(row, COL_STATUS), self.index(row, COL_ACTIONS))
+
+    def video_at(self, row):
+        """获取某一行的视频记录"""
+        return self.videos[row]
+
+    def _status_text(self, video):
+        """状态列文字"""
+        info = self.infos.get(video['id'])
+        if info:
+            return STATUS_TEXT.get(info['status'], STATUS_TEXT['pending'])
+        if video.get('downloaded'):
+            return STATUS_TEXT['completed']
+        return '📭 未下载'
+
+    def _progress(self, video):
+        """进度百分比"""
+        info = self.infos.get(video['id'])
+        if info and info['status'] == 'downloading':
+            return info['progress']
+        if video.get('downloaded') or (info and info['status'] == 'completed'):
+            return 100
+        return 0
+
+
+def _style(option):
+    """绘制用的样式"""
+    return option.widget.style() if option.widget else QApplication.style()
+
+
+class ProgressDelegate(QStyledItemDelegate):
+    """直接绘制进度条，不为每一行创建 QProgressBar"""
+
+    def paint(self, painter, option, index):
+        bar = QStyleOptionProgressBar()
+        bar.rect = option.rect.adjusted(5, 5, -5, -5)
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = index.data(PROGRESS_ROLE) or 0
+        bar.text = index.data(Qt.DisplayRole) or ''
+        bar.textVisible = True
+        bar.textAlignment = Qt.AlignCenter
+        bar.state = option.state
+        _style(option).drawControl(QStyle.CE_ProgressBar, bar, painter)
+
+    def sizeHint(self, option, index):
+        return QSize(150, 28)
+
+
+class ActionDelegate(QStyledItemDelegate):
+    """绘制操作按钮并处理点击，clicked(行, 操作名)"""
+
+    clicked = pyqtSignal(int, str)
+
+    ACTIONS = (('download', '⬇️ 下载'), ('copy', '📋'))
+
+    def paint(self, painter, option, index):
+        can_download = index.data(CAN_DOWNLOAD_ROLE)
+        style = _style(option)
+        for (name, text), rect in zip(self.ACTIONS, self._button_rects(option.rect)):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = text
+            button.state = QStyle.State_Raised
+            if name != 'download' or can_download:
+                button.state |= QStyle.State_Enabled
+            style.drawControl(QStyle.CE_PushButton, button, painter)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            for (name, _), rect in zip(self.ACTIONS, self._button_rects(option.rect)):
+                if rect.contains(event.pos()):
+                    if name != 'download' or index.data(CAN_DOWNLOAD_ROLE):
+                        self.clicked.emit(index.row(), name)
+                    return True
+        return super().editorEvent(event, model, option, index)
+
+    def sizeHint(self, option, index):
+        return QSize(130, 28)
+
+    @staticmethod
+    def _button_rects(rect):
+        """下载按钮占2/3宽度，复制按钮占1/3"""
+        rect = rect.adjusted(2, 2, -2, -2)
+        split = rect.width() * 2 // 3
+        return (
+            QRect(rect.left(), rect.top(), split - 2, rect.height()),
+            QRect(rect.left() + split, rect.top(), rect.width() - split, rect.height())
+        )
\ No newline at end of file